@@ -1,4 +1,4 @@
-import { callMLService } from '../utils/mlHelper.js';
+import { callMLService, getMLBudgetMs } from '../utils/mlHelper.js';
 import Recommendation from '../models/Recommendation.js';
 import Career from '../models/Career.js';
 import User from '../models/User.js';
@@ -316,6 +316,7 @@ export const generateMLEnhancedRecommendations = async (req, res, next) => {
         const mlResult = await callMLService('enhance_recommendations', {
           user: user.toObject(),
           recommendations: ruleBasedRecommendations.slice(0, 20), // Top 20 for ML processing
+          budget_ms: getMLBudgetMs(),
         });
 
         if (mlResult.success) {
@@ -332,6 +333,7 @@ export const generateMLEnhancedRecommendations = async (req, res, next) => {
             original_count: ruleBasedRecommendations.length,
             enhanced_count: enhancedRecommendations.length,
             ml_enhanced: mlEnhanced,
+            ml_stages: mlResult.stages,
           },
           ip: req.ip,
           userAgent: req.headers['user-agent'],
@@ -360,6 +362,7 @@ export const generateMLEnhancedRecommendations = async (req, res, next) => {
         recommendations: enhancedRecommendations.slice(0, 10).map((rec) => ({
           career: rec.id,
           match: rec.ml_enhanced_score || rec.match,
+          ruleMatch: rec.match,
           reasons: [...(rec.reasons || []), ...(rec.ml_reasons || [])],
           mlEnhanced: !!rec.ml_enhanced_score,
           improvementSuggestions: rec.improvement_suggestions || [],
@@ -468,6 +471,7 @@ export const updateMLEnhancedRecommendations = async (req, res, next) => {
       const mlResult = await callMLService('enhance_recommendations', {
         user: user.toObject(),
         recommendations: ruleBasedRecommendations.slice(0, 20),
+        budget_ms: getMLBudgetMs(),
       });
 
       if (mlResult.success) {
@@ -497,6 +501,7 @@ export const updateMLEnhancedRecommendations = async (req, res, next) => {
       .map((rec) => ({
         career: rec.id,
         match: rec.ml_enhanced_score || rec.match,
+        ruleMatch: rec.match,
         reasons: [...(rec.reasons || []), ...(rec.ml_reasons || [])],
         mlEnhanced: !!rec.ml_enhanced_score,
         improvementSuggestions: rec.improvement_suggestions || [],
@@ -648,7 +653,7 @@ export const getCareerTrends = async (req, res, next) => {
 // ML System health check
 export const getMLSystemHealth = async (req, res, next) => {
   try {
-    const healthResult = await callMLService('health_check');
+    const healthResult = await callMLService('health_check', null, ['--deep']);
     res.status(200).json({
       success: true,
       ...healthResult,
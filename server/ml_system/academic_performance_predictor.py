@@ -1,27 +1,124 @@
 import numpy as np
-import pandas as pd
-from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
-from sklearn.linear_model import LinearRegression
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.metrics import mean_squared_error, r2_score
-import joblib
 import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait
 from datetime import datetime
 import logging
 
+from ml_cache import LRUCache
+from ml_scoring import rule_match
+from model_artifacts import ArtifactReader, ArtifactWriter, artifact_exists
+from tree_inference import FlatTreeEnsemble
+
+# pandas, sklearn and joblib are imported where they are used: serving a saved
+# model only needs numpy
+
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Feature column -> KCSE subject name, in model input order after mean_points
+SUBJECT_FEATURES = [
+    ('mathematics', 'mathematics'),
+    ('english', 'english'),
+    ('kiswahili', 'kiswahili'),
+    ('physics', 'physics'),
+    ('chemistry', 'chemistry'),
+    ('biology', 'biology'),
+    ('history', 'history & government'),
+    ('geography', 'geography'),
+    ('business', 'business studies'),
+    ('computer', 'computer studies')
+]
+FEATURE_COLUMNS = ['mean_points'] + [column for column, _ in SUBJECT_FEATURES]
+DEFAULT_MEAN_POINTS = 6.0
+
+# Candidate estimators, cheapest first so a tight time budget still yields a model
+CANDIDATE_MODELS = ('linear_regression', 'random_forest', 'gradient_boosting')
+
+# Training data shared with the fitting processes, set once per worker
+_training_data = None
+
+def _make_candidate(model_name):
+    """Unfitted estimator for a candidate model name"""
+    from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+    from sklearn.linear_model import LinearRegression
+    
+    if model_name == 'random_forest':
+        return RandomForestRegressor(n_estimators=100, random_state=42)
+    if model_name == 'gradient_boosting':
+        # Stop adding stages once 10 in a row do not improve a 10% validation split
+        return GradientBoostingRegressor(
+            n_estimators=500, n_iter_no_change=10, validation_fraction=0.1, random_state=42
+        )
+    return LinearRegression()
+
+def _init_training_worker(features, target, weights):
+    global _training_data
+    _training_data = (features, target, weights)
+
+def _fit_candidate(model_name, train_index, test_index):
+    """Fit one candidate on rows of the shared training data
+    
+    With a test_index this is a CV fold and returns (None, r2, seconds); without one
+    it is the final fit on all rows and returns (model, None, seconds).
+    """
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.metrics import r2_score
+    
+    features, target, weights = _training_data
+    started = time.perf_counter()
+    
+    if train_index is None:
+        X_train, y_train, w_train = features, target, weights
+    else:
+        X_train, y_train = features[train_index], target[train_index]
+        w_train = None if weights is None else weights[train_index]
+    
+    scaler = StandardScaler().fit(X_train, sample_weight=w_train)
+    model = _make_candidate(model_name).fit(scaler.transform(X_train), y_train, sample_weight=w_train)
+    fit_seconds = time.perf_counter() - started
+    
+    if test_index is None:
+        return model, None, fit_seconds
+    
+    y_pred = model.predict(scaler.transform(features[test_index]))
+    w_test = None if weights is None else weights[test_index]
+    return None, float(r2_score(target[test_index], y_pred, sample_weight=w_test)), fit_seconds
+
+def mean_points_of(kcse_results):
+    """KCSE mean points, defaulting to a C grade when missing or stored as null"""
+    mean_points = kcse_results.get('meanPoints')
+    return DEFAULT_MEAN_POINTS if mean_points is None else mean_points
+
 class AcademicPerformancePredictor:
-    def __init__(self, model_path="./models"):
+    def __init__(self, model_path="./models", auto_load=True, compiled_dtype='float64', compiled_max_rows=512,
+                 prediction_cache_size=50000, prediction_cache_ttl=None, cache_precision=2,
+                 n_jobs=None, cv_folds=5, training_time_budget=None):
         self.model_path = model_path
+        self.artifact_dir = os.path.join(model_path, 'academic_performance')
+        self.auto_load = auto_load
+        self.compiled_dtype = compiled_dtype
+        # Above this many rows sklearn's per-tree traversal beats the compiled evaluator
+        self.compiled_max_rows = compiled_max_rows
+        self.model_version = None
+        self.prediction_cache = LRUCache(maxsize=prediction_cache_size, ttl=prediction_cache_ttl)
+        self.cache_precision = cache_precision
         self.models = {}
+        self.compiled_models = {}
         self.scalers = {}
+        self.scaler_arrays = {}
         self.label_encoders = {}
+        self.best_model_name = None
+        self.training_report = {}
         self.is_trained = False
         
+        # Training: worker processes (None = all cores), CV folds and wall-clock budget in seconds
+        self.n_jobs = n_jobs
+        self.cv_folds = cv_folds
+        self.training_time_budget = training_time_budget
+        
         # Setup logging
         self.logger = logging.getLogger('AcademicPredictor')
         
@@ -36,61 +133,134 @@ class AcademicPerformancePredictor:
     
     def prepare_data(self, recommendations_data):
         """Prepare training data from recommendations"""
+        self.begin_data()
+        self.add_recommendations(recommendations_data)
+        return self.finish_data()
+    
+    def begin_data(self, initial_capacity=1024):
+        """Start collecting training data; recommendations are then added in chunks"""
+        self.logger.info("Preparing academic performance data...")
+        
+        # One feature row per student (grade points fit in uint8), expanded to pairs at the end
+        self._student_count = 0
+        self._student_user_ids = []
+        self._mean_points = np.empty(initial_capacity, dtype=np.float64)
+        self._subject_points = np.empty((initial_capacity, len(SUBJECT_FEATURES)), dtype=np.uint8)
+        self._mean_points_integral = True
+        
+        self._pair_students = []
+        self._pair_career_ids = []
+        self._pair_matches = []
+        self._matches_integral = True
+    
+    def _ensure_student_capacity(self, needed):
+        capacity = len(self._mean_points)
+        if needed <= capacity:
+            return
+        
+        while capacity < needed:
+            capacity *= 2
+        
+        mean_points = np.empty(capacity, dtype=np.float64)
+        mean_points[:self._student_count] = self._mean_points[:self._student_count]
+        subject_points = np.empty((capacity, len(SUBJECT_FEATURES)), dtype=np.uint8)
+        subject_points[:self._student_count] = self._subject_points[:self._student_count]
+        self._mean_points, self._subject_points = mean_points, subject_points
+    
+    def add_recommendations(self, recommendations_data):
+        """Add a chunk of recommendation documents to the training data being prepared"""
         try:
-            self.logger.info("Preparing academic performance data...")
-            
-            training_records = []
+            pair_students = []
+            pair_matches = []
             
             for rec_data in recommendations_data:
-                user_id = str(rec_data.get('user', ''))
                 kcse_results = rec_data.get('kcseResults', {})
                 
                 if not kcse_results or 'subjects' not in kcse_results:
                     continue
                 
-                # Extract academic features
-                subjects = kcse_results.get('subjects', [])
-                mean_grade = kcse_results.get('meanGrade', 'C')
-                mean_points = kcse_results.get('meanPoints', 6.0)
+                recommendations = rec_data.get('recommendations', [])
+                if not recommendations:
+                    continue
+                
+                # Extract academic features once per student
+                mean_points = mean_points_of(kcse_results)
                 
-                # Calculate subject-specific features
                 subject_points = {}
-                for subject in subjects:
+                for subject in kcse_results.get('subjects', []):
                     subject_name = subject.get('subject', '')
                     grade = subject.get('grade', 'C')
-                    points = self.grade_points.get(grade, 6)
-                    subject_points[subject_name.lower()] = points
+                    subject_points[subject_name.lower()] = self.grade_points.get(grade, 6)
+                
+                student_idx = self._student_count
+                self._ensure_student_capacity(student_idx + 1)
+                self._student_count += 1
+                self._student_user_ids.append(str(rec_data.get('user', '')))
+                
+                self._mean_points_integral &= isinstance(mean_points, int)
+                self._mean_points[student_idx] = mean_points
+                self._subject_points[student_idx] = [
+                    subject_points.get(subject_name, 6) for _, subject_name in SUBJECT_FEATURES
+                ]
                 
                 # Process each career recommendation
-                for rec in rec_data.get('recommendations', []):
-                    career_id = str(rec.get('career', ''))
-                    match_score = rec.get('match', 50)
+                for rec in recommendations:
+                    match_score = rule_match(rec, default=50)
+                    self._matches_integral &= isinstance(match_score, int)
                     
-                    # Create feature vector
-                    features = {
-                        'user_id': user_id,
-                        'career_id': career_id,
-                        'mean_points': mean_points,
-                        'mathematics': subject_points.get('mathematics', 6),
-                        'english': subject_points.get('english', 6),
-                        'kiswahili': subject_points.get('kiswahili', 6),
-                        'physics': subject_points.get('physics', 6),
-                        'chemistry': subject_points.get('chemistry', 6),
-                        'biology': subject_points.get('biology', 6),
-                        'history': subject_points.get('history & government', 6),
-                        'geography': subject_points.get('geography', 6),
-                        'business': subject_points.get('business studies', 6),
-                        'computer': subject_points.get('computer studies', 6),
-                        'match_score': match_score
-                    }
-                    
-                    training_records.append(features)
+                    pair_students.append(student_idx)
+                    pair_matches.append(match_score)
+                    self._pair_career_ids.append(str(rec.get('career', '')))
+            
+            if pair_students:
+                self._pair_students.append(np.array(pair_students, dtype=np.int64))
+                self._pair_matches.append(np.array(pair_matches, dtype=np.float64))
+            return True
             
-            if not training_records:
+        except Exception as e:
+            self.logger.error(f"Error preparing data: {str(e)}")
+            return False
+    
+    def finish_data(self, deduplicate=True):
+        """Build the training frame from the collected students
+        
+        Identical (profile, match score) rows are collapsed into one row whose count is
+        in 'sample_weight'; deduplicate=False keeps one row per (student, career) pair.
+        """
+        try:
+            if not self._pair_students:
                 self.logger.warning("No training records found")
                 return None
             
-            df = pd.DataFrame(training_records)
+            students = np.concatenate(self._pair_students)
+            matches = np.concatenate(self._pair_matches)
+            mean_points = self._mean_points[:self._student_count]
+            subject_points = self._subject_points[:self._student_count]
+            
+            if deduplicate:
+                columns = self._weighted_columns(students, matches, mean_points, subject_points)
+                self.begin_data(initial_capacity=1)
+                
+                import pandas as pd
+                
+                df = pd.DataFrame(columns)
+                self.logger.info(f"Prepared {len(df)} distinct training rows from {len(students)} records")
+                return df
+            
+            columns = {
+                'user_id': np.array(self._student_user_ids, dtype=object)[students],
+                'career_id': np.array(self._pair_career_ids, dtype=object),
+                'mean_points': mean_points[students].astype(np.int64) if self._mean_points_integral else mean_points[students]
+            }
+            for feature_idx, (column, _) in enumerate(SUBJECT_FEATURES):
+                columns[column] = subject_points[students, feature_idx]
+            columns['match_score'] = matches.astype(np.int64) if self._matches_integral else matches
+            
+            self.begin_data(initial_capacity=1)
+            
+            import pandas as pd
+            
+            df = pd.DataFrame(columns)
             self.logger.info(f"Prepared {len(df)} training records")
             return df
             
@@ -98,120 +268,317 @@ class AcademicPerformancePredictor:
             self.logger.error(f"Error preparing data: {str(e)}")
             return None
     
-    def train_models(self, training_data):
-        """Train academic performance prediction models"""
+    def _weighted_columns(self, students, matches, mean_points, subject_points):
+        """Collapse (student, career) pairs with the same profile and match score into counted rows"""
+        # Students with the same mean points and grades share a profile id
+        profiles = np.column_stack([mean_points, subject_points])
+        profiles, profile_ids = np.unique(profiles, axis=0, return_inverse=True)
+        
+        pairs = np.column_stack([profile_ids.reshape(-1)[students], matches])
+        pairs, counts = np.unique(pairs, axis=0, return_counts=True)
+        pair_profiles = profiles[pairs[:, 0].astype(np.int64)]
+        
+        columns = {
+            'mean_points': pair_profiles[:, 0].astype(np.int64) if self._mean_points_integral else pair_profiles[:, 0]
+        }
+        for feature_idx, (column, _) in enumerate(SUBJECT_FEATURES):
+            columns[column] = pair_profiles[:, feature_idx + 1].astype(np.uint8)
+        columns['match_score'] = pairs[:, 1].astype(np.int64) if self._matches_integral else pairs[:, 1]
+        columns['sample_weight'] = counts.astype(np.int64)
+        return columns
+    
+    def train_models(self, training_data, n_jobs=None, time_budget=None):
+        """Train the candidate models with k-fold CV in a process pool and keep the best on mean CV R²
+        
+        Every candidate is also fitted on all rows. Fits not started within the time
+        budget are cancelled; fits already running are allowed to finish.
+        """
         try:
+            from sklearn.preprocessing import StandardScaler
+            from sklearn.model_selection import KFold
+            
             self.logger.info("Training academic performance models...")
+            started = time.monotonic()
             
             if training_data is None or training_data.empty:
                 self.logger.warning("No training data available")
                 return False
             
             # Prepare features and target
-            feature_columns = [
-                'mean_points', 'mathematics', 'english', 'kiswahili',
-                'physics', 'chemistry', 'biology', 'history',
-                'geography', 'business', 'computer'
-            ]
-            
-            X = training_data[feature_columns].fillna(6.0)  # Fill missing with average grade
-            y = training_data['match_score']
-            
-            # Split data
-            X_train, X_test, y_train, y_test = train_test_split(
-                X, y, test_size=0.2, random_state=42
-            )
-            
-            # Scale features
-            self.scalers['features'] = StandardScaler()
-            X_train_scaled = self.scalers['features'].fit_transform(X_train)
-            X_test_scaled = self.scalers['features'].transform(X_test)
+            X = training_data[FEATURE_COLUMNS].fillna(6.0).to_numpy(dtype=np.float64)  # Fill missing with average grade
+            y = training_data['match_score'].to_numpy(dtype=np.float64)
+            # Duplicate rows collapsed by finish_data count as many times as they occurred
+            weights = training_data['sample_weight'].to_numpy(dtype=np.float64) if 'sample_weight' in training_data else None
+            
+            time_budget = time_budget if time_budget is not None else self.training_time_budget
+            deadline = started + time_budget if time_budget else None
+            
+            folds = min(self.cv_folds, len(X))
+            splits = list(KFold(n_splits=folds, shuffle=True, random_state=42).split(X)) if folds >= 2 else []
+            tasks = []
+            for model_name in CANDIDATE_MODELS:
+                tasks.append((model_name, None, None))
+                tasks.extend((model_name, train_index, test_index) for train_index, test_index in splits)
+            
+            n_jobs = self._resolve_n_jobs(n_jobs if n_jobs is not None else self.n_jobs, len(tasks))
+            results = self._run_training_tasks(tasks, X, y, weights, n_jobs, deadline)
+            
+            # Start from empty collections; loaded models may be read-only lazy mappings
+            self.models = {}
+            self.compiled_models = {}
+            self.scalers = {}
+            
+            report = {}
+            for task_index, (model_name, _, test_index) in enumerate(tasks):
+                if task_index not in results:
+                    continue
+                model, score, fit_seconds = results[task_index]
+                entry = report.setdefault(model_name, {'cv_scores': [], 'cv_fit_seconds': 0.0, 'fit_seconds': None})
+                if test_index is None:
+                    self.models[model_name] = model
+                    entry['fit_seconds'] = round(fit_seconds, 3)
+                else:
+                    entry['cv_scores'].append(score)
+                    entry['cv_fit_seconds'] = round(entry['cv_fit_seconds'] + fit_seconds, 3)
             
-            # Train multiple models
-            models_to_train = {
-                'random_forest': RandomForestRegressor(n_estimators=100, random_state=42),
-                'gradient_boosting': GradientBoostingRegressor(n_estimators=100, random_state=42),
-                'linear_regression': LinearRegression()
-            }
+            if not self.models:
+                self.logger.error("No model finished training within the time budget")
+                return False
             
             best_model = None
             best_score = -float('inf')
-            
-            for model_name, model in models_to_train.items():
-                # Train model
-                model.fit(X_train_scaled, y_train)
-                
-                # Evaluate
-                y_pred = model.predict(X_test_scaled)
-                r2 = r2_score(y_test, y_pred)
+            for model_name, entry in report.items():
+                scores = [score for score in entry['cv_scores'] if not np.isnan(score)]
+                entry['cv_mean'] = float(np.mean(scores)) if scores else None
+                entry['cv_std'] = float(np.std(scores)) if scores else None
                 
-                self.models[model_name] = model
-                self.logger.info(f"{model_name} R² score: {r2:.3f}")
+                model = self.models.get(model_name)
+                stages = f", {model.n_estimators_} stages" if hasattr(model, 'n_estimators_') else ''
+                if entry['cv_mean'] is None:
+                    self.logger.info(f"{model_name}: no CV score, fit {entry['fit_seconds']}s{stages}")
+                else:
+                    self.logger.info(
+                        f"{model_name} CV R² score: {entry['cv_mean']:.3f} ± {entry['cv_std']:.3f} "
+                        f"over {len(scores)} folds, folds {entry['cv_fit_seconds']}s, fit {entry['fit_seconds']}s{stages}"
+                    )
                 
-                if r2 > best_score:
-                    best_score = r2
+                if model is not None and entry['cv_mean'] is not None and entry['cv_mean'] > best_score:
+                    best_score = entry['cv_mean']
                     best_model = model_name
             
-            self.logger.info(f"Best model: {best_model} with R² score: {best_score:.3f}")
+            # Without any CV score, fall back to the model predictions always used
+            self.best_model_name = best_model
+            best_model = self.prediction_model_name()
+            
+            # The candidates scale their own copies; this is the one stored for serving
+            self.scalers['features'] = StandardScaler().fit(X, sample_weight=weights)
+            self.scaler_arrays = self._standard_scaler_arrays(self.scalers)
+            
+            elapsed = time.monotonic() - started
+            self.training_report = {
+                'best_model': best_model,
+                'cv_folds': len(splits),
+                'n_jobs': n_jobs,
+                'rows': len(X),
+                'records': int(weights.sum()) if weights is not None else len(X),
+                'elapsed_seconds': round(elapsed, 3),
+                'budget_exhausted': len(results) < len(tasks),
+                'candidates': report
+            }
+            
+            if self.best_model_name is None:
+                self.logger.info(f"Best model: {best_model} without CV scores ({elapsed:.1f}s, {n_jobs} jobs)")
+            else:
+                self.logger.info(f"Best model: {best_model} with R² score: {best_score:.3f} ({elapsed:.1f}s, {n_jobs} jobs)")
             self.is_trained = True
+            self.export_compiled_models()
+            self._set_model_version(f"unsaved-{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
             return True
             
         except Exception as e:
             self.logger.error(f"Error training models: {str(e)}")
             return False
     
-    def predict_career_match(self, kcse_results, career_id):
-        """Predict career match score based on KCSE results"""
+    @staticmethod
+    def _resolve_n_jobs(n_jobs, n_tasks):
+        """Number of fitting processes: None or a non-positive value means all cores"""
+        if n_jobs is None or n_jobs <= 0:
+            n_jobs = os.cpu_count() or 1
+        return max(1, min(n_jobs, n_tasks))
+    
+    def _run_training_tasks(self, tasks, features, target, weights, n_jobs, deadline):
+        """Run (model_name, train_index, test_index) fits; returns {task index: result} of those that finished"""
+        results = {}
+        
+        # Daemon processes (ML server workers) may not start a pool of their own
+        if n_jobs == 1 or multiprocessing.current_process().daemon:
+            _init_training_worker(features, target, weights)
+            try:
+                for task_index, task in enumerate(tasks):
+                    if deadline is not None and time.monotonic() >= deadline:
+                        self.logger.warning(f"Training time budget reached, skipped {len(tasks) - task_index} fits")
+                        break
+                    results[task_index] = _fit_candidate(*task)
+            finally:
+                _init_training_worker(None, None, None)
+            return results
+        
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_training_worker,
+                                 initargs=(features, target, weights)) as executor:
+            futures = {executor.submit(_fit_candidate, *task): task_index for task_index, task in enumerate(tasks)}
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            _, pending = wait(futures, timeout=timeout)
+            
+            cancelled = [future for future in pending if future.cancel()]
+            if cancelled:
+                self.logger.warning(f"Training time budget reached, cancelled {len(cancelled)} fits")
+        
+        for future, task_index in futures.items():
+            if future.cancelled():
+                continue
+            try:
+                results[task_index] = future.result()
+            except Exception as e:
+                self.logger.error(f"Error fitting {tasks[task_index][0]}: {str(e)}")
+        return results
+    
+    def prediction_model_name(self):
+        """Name of the model used for predictions: the best on CV, else the random forest"""
+        if self.best_model_name in self.models:
+            return self.best_model_name
+        return 'random_forest' if 'random_forest' in self.models else next(iter(self.models))
+    
+    def export_compiled_models(self):
+        """Compile the prediction model into flat arrays so serving does not need sklearn's predict"""
+        self.compiled_models = {}
+        model_name = self.prediction_model_name()
+        try:
+            self.compiled_models[model_name] = FlatTreeEnsemble.from_sklearn(
+                self.models[model_name], dtype=self.compiled_dtype
+            )
+            self.logger.info(f"Compiled {model_name} into flat tree arrays ({self.compiled_dtype})")
+        except ValueError as e:
+            # Not a tree ensemble; sklearn's predict is used as is
+            self.logger.info(f"Not compiling {model_name}: {str(e)}")
+        return self.compiled_models
+    
+    def feature_row(self, kcse_results):
+        """Build the model input row (FEATURE_COLUMNS order) for one student's KCSE results"""
+        subject_points = {}
+        for subject in kcse_results.get('subjects', []):
+            subject_name = subject.get('subject', '').lower()
+            grade = subject.get('grade', 'C')
+            subject_points[subject_name] = self.grade_points.get(grade, 6)
+        
+        return [mean_points_of(kcse_results)] + [
+            subject_points.get(subject_name, 6) for _, subject_name in SUBJECT_FEATURES
+        ]
+    
+    def predict_batch(self, kcse_results_list, career_ids, cache_only=False):
+        """Predict match scores for every student × career pair with one scaler transform and one predict call
+        
+        Returns an array of shape (len(kcse_results_list), len(career_ids)), or None without trained models.
+        With cache_only, profiles that are not cached get NaN instead of running the model. A student
+        whose results cannot be turned into features also gets NaN rather than failing the batch.
+        """
         try:
-            if not self.is_trained:
+            if not self.is_trained and self.auto_load:
                 self.load_models()
             
             if not self.models:
                 return None
             
-            # Extract features from KCSE results
-            subjects = kcse_results.get('subjects', [])
-            mean_points = kcse_results.get('meanPoints', 6.0)
-            
-            subject_points = {}
-            for subject in subjects:
-                subject_name = subject.get('subject', '').lower()
-                grade = subject.get('grade', 'C')
-                points = self.grade_points.get(grade, 6)
-                subject_points[subject_name] = points
-            
-            # Create feature vector
-            features = np.array([[
-                mean_points,
-                subject_points.get('mathematics', 6),
-                subject_points.get('english', 6),
-                subject_points.get('kiswahili', 6),
-                subject_points.get('physics', 6),
-                subject_points.get('chemistry', 6),
-                subject_points.get('biology', 6),
-                subject_points.get('history & government', 6),
-                subject_points.get('geography', 6),
-                subject_points.get('business studies', 6),
-                subject_points.get('computer studies', 6)
-            ]])
-            
-            # Scale features
-            if 'features' in self.scalers:
-                features_scaled = self.scalers['features'].transform(features)
-            else:
-                features_scaled = features
-            
-            # Use the best available model
-            model_name = 'random_forest' if 'random_forest' in self.models else list(self.models.keys())[0]
-            model = self.models[model_name]
-            
-            prediction = model.predict(features_scaled)[0]
-            return max(0, min(100, prediction))  # Clamp between 0 and 100
+            results = np.full(len(kcse_results_list), np.nan)
+            features, valid = [], []
+            for idx, kcse_results in enumerate(kcse_results_list):
+                try:
+                    features.append(np.asarray(self.feature_row(kcse_results), dtype=np.float64))
+                    valid.append(idx)
+                except (AttributeError, TypeError, ValueError) as e:
+                    self.logger.warning(f"Skipping malformed KCSE results: {str(e)}")
+            
+            if not valid or len(career_ids) == 0:
+                return np.repeat(results[:, np.newaxis], len(career_ids), axis=1)
+            
+            # Quantise so equal profiles share one cache entry; predictions are always
+            # made from the quantised row, so a cache hit returns exactly what a miss would
+            features = np.round(np.vstack(features), self.cache_precision)
+            unique_rows, inverse = np.unique(features, axis=0, return_inverse=True)
+            
+            keys = [(self.model_version, tuple(row)) for row in unique_rows.tolist()]
+            predictions = np.empty(len(unique_rows))
+            missing = []
+            for row_idx, key in enumerate(keys):
+                cached = self.prediction_cache.get(key)
+                if cached is None:
+                    missing.append(row_idx)
+                else:
+                    predictions[row_idx] = cached
+            
+            if missing and cache_only:
+                predictions[missing] = np.nan
+            elif missing:
+                predictions[missing] = self._predict_rows(unique_rows[missing])
+                for row_idx in missing:
+                    self.prediction_cache.set(keys[row_idx], float(predictions[row_idx]))
+            
+            # The career is not a model input, so each student's score is shared by all careers
+            results[valid] = predictions[inverse.reshape(-1)]
+            return np.repeat(results[:, np.newaxis], len(career_ids), axis=1)
             
         except Exception as e:
-            self.logger.error(f"Error predicting career match: {str(e)}")
+            self.logger.error(f"Error predicting career matches: {str(e)}")
             return None
     
+    @staticmethod
+    def _standard_scaler_arrays(scalers):
+        """(mean, scale) arrays of fitted StandardScalers, so scaling needs no sklearn"""
+        arrays = {}
+        for name, scaler in scalers.items():
+            if getattr(scaler, 'with_mean', False) and getattr(scaler, 'with_std', False):
+                arrays[name] = (np.asarray(scaler.mean_, dtype=np.float64), np.asarray(scaler.scale_, dtype=np.float64))
+        return arrays
+    
+    def _predict_rows(self, features):
+        """Run the scaler and the prediction model over raw feature rows"""
+        # Scale features; the same arithmetic as StandardScaler.transform
+        if 'features' in self.scaler_arrays:
+            mean, scale = self.scaler_arrays['features']
+            features_scaled = (features - mean) / scale
+        elif 'features' in self.scalers:
+            features_scaled = self.scalers['features'].transform(features)
+        else:
+            features_scaled = features
+        
+        # Use the best available model, compiled when possible and the batch is small enough
+        model_name = self.prediction_model_name()
+        compiled = self.compiled_models.get(model_name)
+        if compiled is not None and (model_name not in self.models or len(features_scaled) <= self.compiled_max_rows):
+            predictions = compiled.predict(features_scaled)
+        else:
+            predictions = self.models[model_name].predict(features_scaled)
+        
+        return np.clip(predictions, 0, 100)
+    
+    def _set_model_version(self, version):
+        """Record the version of the loaded models; cached predictions of other versions are dropped"""
+        if version != self.model_version:
+            self.prediction_cache.clear()
+        self.model_version = version
+    
+    def cache_stats(self):
+        """Prediction cache counters, tagged with the model version they apply to"""
+        stats = self.prediction_cache.stats()
+        stats['model_version'] = self.model_version
+        return stats
+    
+    def predict_career_match(self, kcse_results, career_id):
+        """Predict career match score based on KCSE results"""
+        predictions = self.predict_batch([kcse_results], [career_id])
+        if predictions is None or np.isnan(predictions[0, 0]):
+            return None
+        return float(predictions[0, 0])
+    
     def predict_success_probability(self, user_data, career_data):
         """Predict success probability for a user-career combination"""
         try:
@@ -263,8 +630,7 @@ class AcademicPerformancePredictor:
                         )
             
             # General suggestions
-            mean_points = kcse_results.get('meanPoints', 6.0)
-            if mean_points < 8:
+            if mean_points_of(kcse_results) < 8:
                 suggestions.append("Focus on improving your overall academic performance")
             
             return suggestions[:3]  # Return top 3 suggestions
@@ -274,42 +640,95 @@ class AcademicPerformancePredictor:
             return []
     
     def save_models(self):
-        """Save trained models"""
+        """Save trained models as a new artifact version, one file per estimator"""
         try:
-            model_data = {
-                'models': self.models,
-                'scalers': self.scalers,
-                'label_encoders': self.label_encoders,
-                'is_trained': self.is_trained,
-                'grade_points': self.grade_points
-            }
-            
-            model_file = os.path.join(self.model_path, 'academic_performance_models.pkl')
-            joblib.dump(model_data, model_file)
+            writer = ArtifactWriter(self.artifact_dir, 'academic_performance')
+            for name, model in self.models.items():
+                writer.add_estimator(f"model.{name}", model)
+            for name, scaler in self.scalers.items():
+                writer.add_estimator(f"scaler.{name}", scaler)
+            for name, encoder in self.label_encoders.items():
+                writer.add_estimator(f"label_encoder.{name}", encoder)
+            
+            for name, (mean, scale) in self.scaler_arrays.items():
+                writer.add_array(f"scaler_arrays.{name}.mean", mean)
+                writer.add_array(f"scaler_arrays.{name}.scale", scale)
+            
+            compiled_params = {}
+            for name, compiled in self.compiled_models.items():
+                arrays, compiled_params[name] = compiled.to_arrays()
+                for key, array in arrays.items():
+                    writer.add_array(f"compiled.{name}.{key}", array)
+            
+            writer.set_metadata(
+                is_trained=self.is_trained,
+                grade_points=self.grade_points,
+                feature_columns=FEATURE_COLUMNS,
+                scaler_arrays=list(self.scaler_arrays),
+                compiled_models=compiled_params,
+                best_model=self.best_model_name,
+                training_report=self.training_report
+            )
+            version = writer.commit()
+            self._set_model_version(version)
             
-            self.logger.info(f"Models saved to {model_file}")
+            self.logger.info(f"Models saved to {self.artifact_dir} (version {version})")
             return True
             
         except Exception as e:
             self.logger.error(f"Error saving models: {str(e)}")
             return False
     
-    def load_models(self):
-        """Load trained models"""
+    def load_models(self, model_file=None, artifact=None):
+        """Load trained models from an artifact version, or from a legacy pickle path or open file"""
         try:
-            model_file = os.path.join(self.model_path, 'academic_performance_models.pkl')
+            if artifact is None and model_file is None and artifact_exists(self.artifact_dir):
+                artifact = ArtifactReader.open_current(self.artifact_dir)
+            
+            if artifact is not None:
+                # Estimators are only read from disk when a prediction needs them
+                self.models = artifact.estimators('model')
+                self.scalers = artifact.estimators('scaler')
+                self.label_encoders = artifact.estimators('label_encoder')
+                self.scaler_arrays = {
+                    name: (artifact.array(f"scaler_arrays.{name}.mean"), artifact.array(f"scaler_arrays.{name}.scale"))
+                    for name in artifact.metadata.get('scaler_arrays', [])
+                }
+                self.compiled_models = {
+                    name: FlatTreeEnsemble.from_arrays(
+                        {key: artifact.array(f"compiled.{name}.{key}") for key in FlatTreeEnsemble.ARRAYS},
+                        params
+                    )
+                    for name, params in artifact.metadata.get('compiled_models', {}).items()
+                }
+                self.is_trained = artifact.metadata.get('is_trained', False)
+                self.grade_points = artifact.metadata.get('grade_points', self.grade_points)
+                self.best_model_name = artifact.metadata.get('best_model')
+                self.training_report = artifact.metadata.get('training_report', {})
+                self._set_model_version(artifact.version)
+                
+                self.logger.info(f"Models loaded successfully (version {artifact.version})")
+                return True
+            
+            model_file = model_file or os.path.join(self.model_path, 'academic_performance_models.pkl')
             
-            if not os.path.exists(model_file):
+            if isinstance(model_file, str) and not os.path.exists(model_file):
                 self.logger.warning("Model file not found")
                 return False
             
+            import joblib
             model_data = joblib.load(model_file)
             
             self.models = model_data.get('models', {})
+            self.compiled_models = {}
             self.scalers = model_data.get('scalers', {})
+            self.scaler_arrays = self._standard_scaler_arrays(self.scalers)
             self.label_encoders = model_data.get('label_encoders', {})
             self.is_trained = model_data.get('is_trained', False)
             self.grade_points = model_data.get('grade_points', self.grade_points)
+            self.best_model_name = None
+            self.training_report = {}
+            self._set_model_version(f"legacy-{datetime.now().strftime('%Y%m%d%H%M%S%f')}")
             
             self.logger.info("Models loaded successfully")
             return True
@@ -1,25 +1,48 @@
 import os
-import pickle
 import logging
+import threading
 import numpy as np
-import pandas as pd
-from sklearn.metrics.pairwise import cosine_similarity
-from sklearn.decomposition import NMF
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_squared_error
-import joblib
+from scipy import sparse
+
+# sklearn and joblib are imported where they are used, so serving a loaded
+# model does not pay for them
+from ml_cache import LRUCache
+from ml_scoring import rule_match
+from similarity_search import create_search_index, normalize_rows, top_k
+from model_artifacts import ArtifactReader, ArtifactWriter, artifact_exists
+
+# How each row of the similar-careers table was ranked
+SIMILARITY_SOURCES = ('collaborative', 'content')
 
 class CollaborativeFilteringModel:
-    def __init__(self, model_path='./models'):
+    def __init__(self, model_path='./models', n_neighbours=50, block_size=256, search_backend='exact',
+                 fold_in_cache_size=10000, fold_in_ttl=3600, auto_load=True,
+                 similar_careers_size=20, min_career_interactions=5):
         self.model_path = model_path
+        self.artifact_dir = os.path.join(model_path, 'collaborative_filtering')
+        self.auto_load = auto_load
+        self.n_neighbours = n_neighbours
+        self.block_size = block_size
+        self.search_backend = search_backend
         self.user_item_matrix = None
         self.item_similarity_matrix = None
-        self.user_similarity_matrix = None
+        self.user_neighbours = None
+        self.user_neighbour_similarities = None
+        self.similar_careers_size = similar_careers_size
+        self.min_career_interactions = min_career_interactions
+        self.similar_career_indices = None
+        self.similar_career_scores = None
+        self.similar_career_sources = None
+        self.career_content = []
+        self._nmf_lock = threading.Lock()
         self.nmf_model = None
         self.career_features = None
         self.user_features = None
         self.career_mapping = {}
+        self.career_ids = np.array([], dtype=object)
         self.user_mapping = {}
+        self.user_ids = np.array([], dtype=object)
+        self.fold_in_cache = LRUCache(maxsize=fold_in_cache_size, ttl=fold_in_ttl)
         self.is_trained = False
         
         # Setup logging
@@ -28,47 +51,84 @@ class CollaborativeFilteringModel:
         # Ensure model directory exists
         os.makedirs(model_path, exist_ok=True)
     
+    @property
+    def nmf_model(self):
+        """NMF estimator; a loaded artifact only reads it when a user has to be folded in"""
+        if self._nmf_model is None and self._nmf_source is not None:
+            with self._nmf_lock:
+                if self._nmf_model is None and self._nmf_source is not None:
+                    self._nmf_model = self._nmf_source.estimator('nmf_model')
+                    self._nmf_source = None
+        return self._nmf_model
+    
+    @nmf_model.setter
+    def nmf_model(self, nmf_model):
+        self._nmf_model = nmf_model
+        self._nmf_source = None
+    
     def prepare_data(self, recommendations_data, careers_data):
         """Prepare data for collaborative filtering"""
+        self.begin_data(careers_data)
+        return self.add_recommendations(recommendations_data) and self.finish_data()
+    
+    def begin_data(self, careers_data):
+        """Start a new user-item matrix; recommendations are then added in chunks"""
+        self.logger.info("Preparing data for collaborative filtering...")
+        
+        # Create career mapping
+        self.career_mapping = {str(career['_id']): idx for idx, career in enumerate(careers_data)}
+        self.career_ids = self._index_ids(self.career_mapping)
+        self.career_content = [self._content_tokens(career) for career in careers_data]
+        
+        # Users get a provisional index in arrival order until the matrix is built
+        self._pending_users = {}
+        self._pending_interactions = []
+    
+    def add_recommendations(self, recommendations_data):
+        """Add a chunk of recommendation documents to the matrix being prepared"""
         try:
-            self.logger.info("Preparing data for collaborative filtering...")
-            
-            # Create career mapping
-            self.career_mapping = {str(career['_id']): idx for idx, career in enumerate(careers_data)}
-            career_id_to_title = {str(career['_id']): career.get('title', 'Unknown') for career in careers_data}
+            users, interaction_users, interaction_careers, interaction_ratings = \
+                self._collect_interactions(recommendations_data)
             
-            # Prepare user-item interactions
-            interactions = []
-            users = set()
+            for user_id in users:
+                self._pending_users.setdefault(user_id, len(self._pending_users))
             
-            for rec_data in recommendations_data:
-                user_id = str(rec_data.get('user', ''))
-                users.add(user_id)
-                
-                for rec in rec_data.get('recommendations', []):
-                    career_id = str(rec.get('career', ''))
-                    match_score = rec.get('match', 0)
-                    
-                    if career_id in self.career_mapping:
-                        interactions.append({
-                            'user_id': user_id,
-                            'career_id': career_id,
-                            'rating': match_score / 100.0  # Normalize to 0-1
-                        })
+            self._pending_interactions.append((
+                np.array([self._pending_users[user_id] for user_id in interaction_users], dtype=np.int64),
+                np.array(interaction_careers, dtype=np.int64),
+                np.array(interaction_ratings, dtype=np.float32)
+            ))
+            return True
             
+        except Exception as e:
+            self.logger.error(f"Error preparing data: {str(e)}")
+            return False
+    
+    def finish_data(self):
+        """Build the sparse user-item matrix from the added recommendations"""
+        try:
             # Create user mapping
-            self.user_mapping = {user_id: idx for idx, user_id in enumerate(sorted(users))}
+            self.user_mapping = {user_id: idx for idx, user_id in enumerate(sorted(self._pending_users))}
+            self.user_ids = self._index_ids(self.user_mapping)
+            
+            provisional_to_final = np.empty(len(self._pending_users), dtype=np.int64)
+            for user_id, provisional_idx in self._pending_users.items():
+                provisional_to_final[provisional_idx] = self.user_mapping[user_id]
             
-            # Create user-item matrix
+            # Create sparse user-item matrix
             n_users = len(self.user_mapping)
             n_careers = len(self.career_mapping)
             
-            self.user_item_matrix = np.zeros((n_users, n_careers))
+            if self._pending_interactions:
+                rows, cols, ratings = (np.concatenate(parts) for parts in zip(*self._pending_interactions))
+            else:
+                rows, cols, ratings = np.array([], dtype=np.int64), np.array([], dtype=np.int64), np.array([], dtype=np.float32)
             
-            for interaction in interactions:
-                user_idx = self.user_mapping[interaction['user_id']]
-                career_idx = self.career_mapping[interaction['career_id']]
-                self.user_item_matrix[user_idx, career_idx] = interaction['rating']
+            self.user_item_matrix = self._build_interaction_matrix(
+                provisional_to_final[rows], cols, ratings, (n_users, n_careers)
+            )
+            self._pending_users = {}
+            self._pending_interactions = []
             
             self.logger.info(f"Prepared matrix with {n_users} users and {n_careers} careers")
             return True
@@ -77,6 +137,58 @@ class CollaborativeFilteringModel:
             self.logger.error(f"Error preparing data: {str(e)}")
             return False
     
+    def _collect_interactions(self, recommendations_data):
+        """Extract (user, career index, rating) triples from recommendation documents"""
+        interaction_users = []
+        interaction_careers = []
+        interaction_ratings = []
+        users = set()
+        
+        for rec_data in recommendations_data:
+            user_id = str(rec_data.get('user', ''))
+            users.add(user_id)
+            
+            for rec in rec_data.get('recommendations', []):
+                career_id = str(rec.get('career', ''))
+                match_score = rule_match(rec)
+                
+                if career_id in self.career_mapping:
+                    interaction_users.append(user_id)
+                    interaction_careers.append(self.career_mapping[career_id])
+                    interaction_ratings.append(match_score / 100.0)  # Normalize to 0-1
+        
+        return users, interaction_users, interaction_careers, interaction_ratings
+    
+    @staticmethod
+    def _build_interaction_matrix(rows, cols, ratings, shape):
+        """Build a CSR matrix where a repeated (user, career) pair keeps its last rating"""
+        if len(rows):
+            keys = rows * shape[1] + cols
+            _, last_reversed = np.unique(keys[::-1], return_index=True)
+            keep = len(keys) - 1 - last_reversed
+            rows, cols, ratings = rows[keep], cols[keep], ratings[keep]
+        
+        matrix = sparse.csr_matrix((ratings, (rows, cols)), shape=shape, dtype=np.float32)
+        matrix.eliminate_zeros()
+        return matrix
+    
+    @staticmethod
+    def _content_tokens(career):
+        """Lower-cased key subjects and category of a career, for content-based similarity"""
+        tokens = sorted({str(subject).strip().lower() for subject in career.get('keySubjects') or [] if str(subject).strip()})
+        category = str(career.get('category') or '').strip().lower()
+        if category:
+            tokens.append(f"category:{category}")
+        return tokens
+    
+    @staticmethod
+    def _index_ids(mapping):
+        """Build the index -> id lookup array for a mapping"""
+        ids = np.empty(len(mapping), dtype=object)
+        for item_id, item_idx in mapping.items():
+            ids[item_idx] = item_id
+        return ids
+    
     def train_user_based_cf(self):
         """Train user-based collaborative filtering"""
         try:
@@ -86,8 +198,7 @@ class CollaborativeFilteringModel:
                 self.logger.error("No user-item matrix available")
                 return False
             
-            # Calculate user similarity matrix
-            self.user_similarity_matrix = cosine_similarity(self.user_item_matrix)
+            self.compute_user_neighbours()
             
             self.logger.info("User-based CF model trained successfully")
             return True
@@ -96,6 +207,27 @@ class CollaborativeFilteringModel:
             self.logger.error(f"Error training user-based CF: {str(e)}")
             return False
     
+    def compute_user_neighbours(self, user_indices=None):
+        """Store each user's top-K most similar users, searched in blocks of rows"""
+        n_users = self.user_item_matrix.shape[0]
+        n_neighbours = max(0, min(self.n_neighbours, n_users - 1))
+        
+        if user_indices is None:
+            user_indices = np.arange(n_users)
+            self.user_neighbours = np.zeros((n_users, n_neighbours), dtype=np.int32)
+            self.user_neighbour_similarities = np.zeros((n_users, n_neighbours), dtype=np.float32)
+        
+        if n_neighbours == 0:
+            return True
+        
+        # Cosine similarity of the rating rows; a user is never their own neighbour
+        index = create_search_index(self.search_backend).build(self.user_item_matrix)
+        for start in range(0, len(user_indices), self.block_size):
+            block = np.asarray(user_indices[start:start + self.block_size])
+            self.user_neighbours[block], self.user_neighbour_similarities[block] = index.query_rows(block, n_neighbours)
+        
+        return True
+    
     def train_item_based_cf(self):
         """Train item-based collaborative filtering"""
         try:
@@ -105,8 +237,10 @@ class CollaborativeFilteringModel:
                 self.logger.error("No user-item matrix available")
                 return False
             
+            from sklearn.metrics.pairwise import cosine_similarity
+            
             # Calculate item similarity matrix
-            self.item_similarity_matrix = cosine_similarity(self.user_item_matrix.T)
+            self.item_similarity_matrix = cosine_similarity(self.user_item_matrix.T).astype(np.float32)
             
             self.logger.info("Item-based CF model trained successfully")
             return True
@@ -124,6 +258,8 @@ class CollaborativeFilteringModel:
                 self.logger.error("No user-item matrix available")
                 return False
             
+            from sklearn.decomposition import NMF
+            
             # Use NMF for matrix factorization
             n_components = min(10, min(self.user_item_matrix.shape) - 1)
             if n_components < 1:
@@ -140,140 +276,594 @@ class CollaborativeFilteringModel:
             self.logger.error(f"Error training matrix factorization: {str(e)}")
             return False
     
-    def get_user_recommendations(self, user_id, n_recommendations=10):
+    def content_similarity(self):
+        """Cosine similarity between careers over their key-subject and category tokens"""
+        n_careers = len(self.career_mapping)
+        if len(self.career_content) != n_careers:
+            return np.zeros((n_careers, n_careers), dtype=np.float32)
+        
+        vocabulary = {}
+        rows, cols = [], []
+        for career_idx, tokens in enumerate(self.career_content):
+            for token in tokens:
+                rows.append(career_idx)
+                cols.append(vocabulary.setdefault(token, len(vocabulary)))
+        
+        features = sparse.csr_matrix(
+            (np.ones(len(rows), dtype=np.float32), (rows, cols)),
+            shape=(n_careers, max(len(vocabulary), 1))
+        )
+        norms = np.sqrt(np.asarray(features.sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        features = sparse.diags(1.0 / norms) @ features
+        return (features @ features.T).toarray().astype(np.float32)
+    
+    def build_similar_careers(self):
+        """Precompute the most similar careers of every career
+        
+        Careers with at least min_career_interactions users are ranked by item-based
+        similarity; the rest fall back to their key subjects and category.
+        """
+        try:
+            n_careers = len(self.career_mapping)
+            size = min(self.similar_careers_size, max(n_careers - 1, 0))
+            
+            if self.item_similarity_matrix is not None:
+                similarities = np.array(self.item_similarity_matrix, dtype=np.float32)
+            else:
+                similarities = np.zeros((n_careers, n_careers), dtype=np.float32)
+            
+            if self.user_item_matrix is not None:
+                interactions = self.user_item_matrix.getnnz(axis=0)
+            else:
+                interactions = np.zeros(n_careers, dtype=np.int64)
+            use_content = interactions < self.min_career_interactions
+            if use_content.any():
+                similarities[use_content] = self.content_similarity()[use_content]
+            
+            np.fill_diagonal(similarities, -np.inf)
+            order = np.argsort(-similarities, axis=1, kind='stable')[:, :size]
+            
+            self.similar_career_indices = order.astype(np.int32)
+            self.similar_career_scores = np.take_along_axis(similarities, order, axis=1)
+            self.similar_career_sources = use_content.astype(np.uint8)
+            
+            self.logger.info(
+                f"Precomputed {size} similar careers for {n_careers} careers "
+                f"({int(use_content.sum())} content-based)"
+            )
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error building similar careers: {str(e)}")
+            return False
+    
+    def apply_updates(self, recommendations_data):
+        """Patch a trained model with the complete recommendation history of changed users"""
+        try:
+            self.logger.info("Applying incremental collaborative filtering update...")
+            
+            if self.user_item_matrix is None or self.user_neighbours is None:
+                self.logger.error("No trained model to update")
+                return False
+            
+            users, interaction_users, interaction_careers, interaction_ratings = \
+                self._collect_interactions(recommendations_data)
+            if not users:
+                return True
+            
+            # New users are appended after the existing rows
+            n_old = self.user_item_matrix.shape[0]
+            for user_id in sorted(users - set(self.user_mapping)):
+                self.user_mapping[user_id] = len(self.user_mapping)
+            self.user_ids = self._index_ids(self.user_mapping)
+            n_users, n_careers = len(self.user_mapping), len(self.career_mapping)
+            affected = np.array(sorted(self.user_mapping[user_id] for user_id in users), dtype=np.int64)
+            
+            # Replace the affected rows of the interaction matrix
+            matrix = sparse.vstack([
+                self.user_item_matrix,
+                sparse.csr_matrix((n_users - n_old, n_careers), dtype=np.float32)
+            ]).tocsr()
+            keep = np.ones(n_users, dtype=np.float32)
+            keep[affected] = 0
+            patch = self._build_interaction_matrix(
+                np.array([self.user_mapping[user_id] for user_id in interaction_users], dtype=np.int64),
+                np.array(interaction_careers, dtype=np.int64),
+                np.array(interaction_ratings, dtype=np.float32),
+                (n_users, n_careers)
+            )
+            self.user_item_matrix = (sparse.diags(keep) @ matrix + patch).tocsr()
+            self.user_item_matrix.eliminate_zeros()
+            
+            self._update_user_neighbours(affected, n_old)
+            
+            if self.item_similarity_matrix is not None:
+                from sklearn.metrics.pairwise import cosine_similarity
+                self.item_similarity_matrix = cosine_similarity(self.user_item_matrix.T).astype(np.float32)
+            if self.similar_career_indices is not None:
+                self.build_similar_careers()
+            
+            # Refresh the NMF factors of the changed users against the fixed career factors
+            if self.nmf_model is not None and self.user_features is not None:
+                user_features = np.zeros((n_users, self.user_features.shape[1]), dtype=self.user_features.dtype)
+                user_features[:n_old] = self.user_features
+                user_features[affected] = self.nmf_model.transform(self.user_item_matrix[affected])
+                self.user_features = user_features
+            
+            for user_id in users:
+                self.fold_in_cache.pop(user_id)
+            
+            self.logger.info(f"Updated {len(affected)} users ({n_users - n_old} new)")
+            return True
+            
+        except Exception as e:
+            self.logger.error(f"Error applying incremental update: {str(e)}")
+            return False
+    
+    def _update_user_neighbours(self, affected, n_old):
+        """Recompute neighbour lists of changed users and merge them into everyone else's"""
+        n_users = self.user_item_matrix.shape[0]
+        n_neighbours = max(0, min(self.n_neighbours, n_users - 1))
+        
+        # Width can grow while the user base is still smaller than n_neighbours
+        neighbours = np.zeros((n_users, n_neighbours), dtype=np.int32)
+        similarities = np.full((n_users, n_neighbours), -np.inf, dtype=np.float32)
+        width = min(self.user_neighbours.shape[1], n_neighbours)
+        neighbours[:n_old, :width] = self.user_neighbours[:, :width]
+        similarities[:n_old, :width] = self.user_neighbour_similarities[:, :width]
+        self.user_neighbours, self.user_neighbour_similarities = neighbours, similarities
+        
+        if n_neighbours == 0:
+            return
+        
+        self.compute_user_neighbours(affected)
+        
+        normalized = normalize_rows(self.user_item_matrix)
+        affected_vectors = normalized[affected].T
+        is_affected = np.zeros(n_users, dtype=bool)
+        is_affected[affected] = True
+        unaffected = np.flatnonzero(~is_affected)
+        
+        for start in range(0, len(unaffected), self.block_size):
+            block = unaffected[start:start + self.block_size]
+            fresh = (normalized[block] @ affected_vectors).toarray()
+            
+            # Stale similarities to changed users are replaced by the fresh ones
+            current = self.user_neighbours[block]
+            current_similarities = np.where(is_affected[current], -np.inf, self.user_neighbour_similarities[block])
+            
+            candidates = np.hstack([current, np.broadcast_to(affected, (len(block), len(affected)))])
+            candidate_similarities = np.hstack([current_similarities, fresh])
+            
+            top = np.argpartition(-candidate_similarities, n_neighbours - 1, axis=1)[:, :n_neighbours]
+            top_candidates = np.take_along_axis(candidates, top, axis=1)
+            top_similarities = np.take_along_axis(candidate_similarities, top, axis=1)
+            
+            order = np.lexsort((top_candidates, -top_similarities), axis=1)
+            self.user_neighbours[block] = np.take_along_axis(top_candidates, order, axis=1)
+            self.user_neighbour_similarities[block] = np.take_along_axis(top_similarities, order, axis=1)
+        
+        # Slots that could not be filled stay empty with zero similarity
+        self.user_neighbour_similarities[np.isneginf(self.user_neighbour_similarities)] = 0
+    
+    def _interaction_row(self, interactions):
+        """Build a 1 x n_careers rating row from a career_id -> rating mapping"""
+        known = [(self.career_mapping[career_id], rating)
+                 for career_id, rating in interactions.items() if career_id in self.career_mapping]
+        cols = np.array([career_idx for career_idx, _ in known], dtype=np.int64)
+        ratings = np.array([rating for _, rating in known], dtype=np.float32)
+        return self._build_interaction_matrix(
+            np.zeros(len(cols), dtype=np.int64), cols, ratings, (1, len(self.career_mapping))
+        )
+    
+    def fold_in_user(self, user_id, interactions):
+        """Project a user outside the training set onto the NMF factors, caching the result"""
+        if self.nmf_model is None or not interactions:
+            return None
+        
+        fingerprint = hash(frozenset(interactions.items()))
+        cached = self.fold_in_cache.get(user_id)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+        
+        row = self._interaction_row(interactions)
+        if row.nnz == 0:
+            return None
+        
+        user_vector = self.nmf_model.transform(row)[0]
+        self.fold_in_cache.set(user_id, (fingerprint, user_vector))
+        return user_vector
+    
+    def fold_in_scores(self, user_id, interactions):
+        """Reconstructed ratings of every career for a folded-in user"""
+        user_vector = self.fold_in_user(user_id, interactions)
+        if user_vector is None:
+            return None
+        return user_vector @ self.career_features
+    
+    def _format_recommendations(self, career_indices, scores):
+        recommendations = []
+        for career_idx in career_indices:
+            score = float(scores[career_idx])
+            recommendations.append({
+                'career_id': self.career_ids[career_idx],
+                'ml_enhanced_score': min(1.0, score),
+                'confidence': min(100, score * 100)
+            })
+        return recommendations
+    
+    def get_user_recommendations(self, user_id, n_recommendations=10, method='vectorized', interactions=None):
         """Get recommendations for a specific user"""
         try:
-            if not self.is_trained:
+            if not self.is_trained and self.auto_load:
                 self.load_model()
             
             if user_id not in self.user_mapping:
-                # Return empty recommendations for unknown users
-                return []
+                # Unknown users are folded into the NMF factors when we know their ratings
+                scores = self.fold_in_scores(user_id, interactions) if interactions else None
+                if scores is None:
+                    return []
+                
+                candidates = np.flatnonzero(self._fold_in_scored(scores, interactions))
+                candidates, _ = top_k(candidates, scores[candidates], n_recommendations)
+                return self._format_recommendations(candidates, scores)
             
             user_idx = self.user_mapping[user_id]
             
-            # Get user's current ratings
-            user_ratings = self.user_item_matrix[user_idx]
+            if method == 'reference':
+                return self._reference_user_recommendations(user_idx, n_recommendations)
             
-            # Find similar users
-            user_similarities = self.user_similarity_matrix[user_idx]
-            similar_users = np.argsort(user_similarities)[::-1][1:6]  # Top 5 similar users
+            scores, scored, first_neighbour = self._neighbour_scores(user_idx)
+            candidates = np.flatnonzero(scored)
             
-            # Generate recommendations based on similar users
-            recommendations = []
-            career_scores = {}
+            # Partial top-k selection: keep everything tied with the k-th score
+            if len(candidates) > n_recommendations:
+                candidate_scores = scores[candidates]
+                kth = np.partition(candidate_scores, -n_recommendations)[-n_recommendations]
+                candidates = candidates[candidate_scores >= kth]
             
-            for similar_user_idx in similar_users:
-                similarity_score = user_similarities[similar_user_idx]
-                similar_user_ratings = self.user_item_matrix[similar_user_idx]
-                
-                for career_idx, rating in enumerate(similar_user_ratings):
-                    if rating > 0 and user_ratings[career_idx] == 0:  # User hasn't rated this career
-                        career_id = list(self.career_mapping.keys())[career_idx]
-                        if career_id not in career_scores:
-                            career_scores[career_id] = 0
-                        career_scores[career_id] += similarity_score * rating
-            
-            # Sort and return top recommendations
-            sorted_careers = sorted(career_scores.items(), key=lambda x: x[1], reverse=True)
-            
-            for career_id, score in sorted_careers[:n_recommendations]:
-                recommendations.append({
-                    'career_id': career_id,
-                    'ml_enhanced_score': min(1.0, score),
-                    'confidence': min(100, score * 100)
-                })
+            # Order by score, breaking ties in the order neighbours were visited
+            encounter = first_neighbour[candidates] * len(self.career_ids) + candidates
+            order = np.lexsort((encounter, -scores[candidates]))[:n_recommendations]
+            candidates = candidates[order]
             
-            return recommendations
+            return self._format_recommendations(candidates, scores)
             
         except Exception as e:
             self.logger.error(f"Error getting user recommendations: {str(e)}")
             return []
     
+    def _reference_user_recommendations(self, user_idx, n_recommendations):
+        """Loop-based neighbour scoring, kept as the reference for parity checks"""
+        # Get user's current ratings
+        user_ratings = self.user_item_matrix[user_idx].toarray().ravel()
+        
+        # Find similar users
+        similar_users = self.user_neighbours[user_idx][:5]  # Top 5 similar users
+        user_similarities = self.user_neighbour_similarities[user_idx][:5]
+        
+        # Generate recommendations based on similar users
+        recommendations = []
+        career_scores = {}
+        
+        for similar_user_idx, similarity_score in zip(similar_users, user_similarities.astype(np.float64)):
+            similar_user_ratings = self.user_item_matrix[similar_user_idx].toarray().ravel().astype(np.float64)
+            
+            for career_idx, rating in enumerate(similar_user_ratings):
+                if rating > 0 and user_ratings[career_idx] == 0:  # User hasn't rated this career
+                    career_id = list(self.career_mapping.keys())[career_idx]
+                    if career_id not in career_scores:
+                        career_scores[career_id] = 0
+                    career_scores[career_id] += similarity_score * rating
+        
+        # Sort and return top recommendations
+        sorted_careers = sorted(career_scores.items(), key=lambda x: x[1], reverse=True)
+        
+        for career_id, score in sorted_careers[:n_recommendations]:
+            recommendations.append({
+                'career_id': career_id,
+                'ml_enhanced_score': min(1.0, score),
+                'confidence': min(100, score * 100)
+            })
+        
+        return recommendations
+    
+    def _neighbour_scores(self, user_idx, n_neighbours=5, exclude_rated=True):
+        """Score every career for a user from the ratings of their most similar users"""
+        similar_users = self.user_neighbours[user_idx][:n_neighbours]
+        similarities = self.user_neighbour_similarities[user_idx][:n_neighbours].astype(np.float64)
+        
+        neighbour_ratings = self.user_item_matrix[similar_users].toarray().astype(np.float64)
+        scores = similarities @ neighbour_ratings
+        
+        # Only careers a neighbour rated (and, by default, the user hasn't rated) get a score
+        rated_by_neighbour = neighbour_ratings > 0
+        scored = rated_by_neighbour.any(axis=0)
+        if exclude_rated:
+            scored &= self.user_item_matrix[user_idx].toarray().ravel() == 0
+        first_neighbour = rated_by_neighbour.argmax(axis=0)
+        return scores, scored, first_neighbour
+    
+    def score_careers(self, user_id, career_ids, interactions=None, exclude_rated=True):
+        """Score a set of candidate careers for a user in one pass
+        
+        With exclude_rated=False careers the user already rated are scored too, for callers
+        that rank the user's own candidates.
+        """
+        try:
+            if not self.is_trained and self.auto_load:
+                self.load_model()
+            
+            if user_id in self.user_mapping:
+                scores, scored, _ = self._neighbour_scores(self.user_mapping[user_id], exclude_rated=exclude_rated)
+            else:
+                # Unknown users get reconstructed ratings from the NMF fold-in
+                scores = self.fold_in_scores(user_id, interactions) if interactions else None
+                if scores is None:
+                    return {}
+                scored = self._fold_in_scored(scores, interactions, exclude_rated)
+            
+            career_scores = {}
+            for career_id in career_ids:
+                career_idx = self.career_mapping.get(career_id)
+                if career_idx is not None and scored[career_idx]:
+                    career_scores[career_id] = min(1.0, float(scores[career_idx]))
+            
+            return career_scores
+            
+        except Exception as e:
+            self.logger.error(f"Error scoring careers: {str(e)}")
+            return {}
+    
+    def score_careers_batch(self, user_ids, career_id_lists, interactions_list, exclude_rated=True):
+        """score_careers for several users at once
+        
+        Known users are scored from one gather of their neighbours' ratings; unknown users
+        are folded into the NMF factors with a single transform call.
+        """
+        try:
+            if not self.is_trained and self.auto_load:
+                self.load_model()
+            
+            results = [{} for _ in user_ids]
+            if self.user_item_matrix is None:
+                return results
+            
+            scores = {}
+            known = [idx for idx, user_id in enumerate(user_ids) if user_id in self.user_mapping]
+            if known:
+                user_indices = np.array([self.user_mapping[user_ids[idx]] for idx in known], dtype=np.int64)
+                known_scores, known_scored = self._neighbour_scores_batch(user_indices, exclude_rated=exclude_rated)
+                for row, idx in enumerate(known):
+                    scores[idx] = (known_scores[row], known_scored[row])
+            
+            unknown = [idx for idx, user_id in enumerate(user_ids)
+                       if user_id not in self.user_mapping and interactions_list[idx]]
+            user_vectors = self._fold_in_users(
+                [user_ids[idx] for idx in unknown], [interactions_list[idx] for idx in unknown]
+            ) if unknown else []
+            for idx, user_vector in zip(unknown, user_vectors):
+                if user_vector is not None:
+                    user_scores = user_vector @ self.career_features
+                    scores[idx] = (user_scores, self._fold_in_scored(user_scores, interactions_list[idx], exclude_rated))
+            
+            for idx, (user_scores, scored) in scores.items():
+                for career_id in career_id_lists[idx]:
+                    career_idx = self.career_mapping.get(career_id)
+                    if career_idx is not None and scored[career_idx]:
+                        results[idx][career_id] = min(1.0, float(user_scores[career_idx]))
+            
+            return results
+            
+        except Exception as e:
+            self.logger.error(f"Error scoring careers: {str(e)}")
+            return [{} for _ in user_ids]
+    
+    def _neighbour_scores_batch(self, user_indices, n_neighbours=5, exclude_rated=True):
+        """_neighbour_scores for a batch of users: (scores, scored), one row per user"""
+        similar_users = self.user_neighbours[user_indices][:, :n_neighbours]
+        similarities = self.user_neighbour_similarities[user_indices][:, :n_neighbours].astype(np.float64)
+        
+        neighbour_ratings = self.user_item_matrix[similar_users.ravel()].toarray().astype(np.float64)
+        neighbour_ratings = neighbour_ratings.reshape(len(user_indices), similar_users.shape[1], -1)
+        scores = np.matmul(similarities[:, None, :], neighbour_ratings)[:, 0, :]
+        
+        scored = (neighbour_ratings > 0).any(axis=1)
+        if exclude_rated:
+            scored &= self.user_item_matrix[user_indices].toarray() == 0
+        return scores, scored
+    
+    def _fold_in_scored(self, scores, interactions, exclude_rated=True):
+        """Which careers get a fold-in score; like known users, rated careers are left out by default"""
+        scored = scores > 0
+        if exclude_rated:
+            scored[self._interaction_row(interactions).indices] = False
+        return scored
+    
+    def _fold_in_users(self, user_ids, interactions_list):
+        """fold_in_user for several users, transforming all cache misses in one call"""
+        vectors = [None] * len(user_ids)
+        if not user_ids:
+            return vectors
+        
+        misses, rows, cols, ratings = [], [], [], []
+        for idx, (user_id, interactions) in enumerate(zip(user_ids, interactions_list)):
+            fingerprint = hash(frozenset(interactions.items()))
+            cached = self.fold_in_cache.get(user_id)
+            if cached is not None and cached[0] == fingerprint:
+                vectors[idx] = cached[1]
+                continue
+            
+            known = [(self.career_mapping[career_id], rating)
+                     for career_id, rating in interactions.items() if career_id in self.career_mapping]
+            if not known:
+                continue
+            for career_idx, rating in known:
+                rows.append(len(misses))
+                cols.append(career_idx)
+                ratings.append(rating)
+            misses.append((idx, user_id, fingerprint))
+        
+        # Reading nmf_model loads the estimator, so only do it when something has to be transformed
+        if misses and self.nmf_model is not None:
+            matrix = self._build_interaction_matrix(
+                np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64),
+                np.array(ratings, dtype=np.float32), (len(misses), len(self.career_mapping))
+            )
+            transformed = self.nmf_model.transform(matrix)
+            for row, (idx, user_id, fingerprint) in enumerate(misses):
+                if matrix.indptr[row + 1] == matrix.indptr[row]:
+                    continue
+                vectors[idx] = transformed[row]
+                self.fold_in_cache.set(user_id, (fingerprint, transformed[row]))
+        
+        return vectors
+    
     def get_similar_careers(self, career_id, n_similar=5):
         """Get careers similar to the given career"""
         try:
-            if not self.is_trained:
+            if not self.is_trained and self.auto_load:
                 self.load_model()
             
             if career_id not in self.career_mapping:
                 return []
             
             career_idx = self.career_mapping[career_id]
-            
-            if self.item_similarity_matrix is not None:
+            source = 'collaborative'
+            
+            if self.similar_career_indices is not None and \
+                    self.similar_career_indices.shape[1] >= min(n_similar, len(self.career_mapping) - 1):
+                # Precomputed at training time
+                similar_indices = self.similar_career_indices[career_idx, :n_similar]
+                scores = self.similar_career_scores[career_idx, :n_similar]
+                source = SIMILARITY_SOURCES[self.similar_career_sources[career_idx]]
+            elif self.item_similarity_matrix is not None:
                 # Use item-based similarity
                 similarities = self.item_similarity_matrix[career_idx]
-                similar_indices = np.argsort(similarities)[::-1][1:n_similar+1]
-                
-                similar_careers = []
-                for idx in similar_indices:
-                    similar_career_id = list(self.career_mapping.keys())[idx]
-                    similarity_score = similarities[idx]
-                    
-                    similar_careers.append({
-                        'career_id': similar_career_id,
-                        'similarity_score': float(similarity_score)
-                    })
-                
-                return similar_careers
+                candidates = np.flatnonzero(np.arange(len(similarities)) != career_idx)
+                similar_indices, scores = top_k(candidates, similarities[candidates], n_similar)
+            else:
+                return []
             
-            return []
+            similar_careers = []
+            for idx, similarity_score in zip(similar_indices, scores):
+                similar_careers.append({
+                    'career_id': self.career_ids[idx],
+                    'similarity_score': float(similarity_score),
+                    'source': source
+                })
+            
+            return similar_careers
             
         except Exception as e:
             self.logger.error(f"Error getting similar careers: {str(e)}")
             return []
     
     def save_model(self):
-        """Save the trained model"""
+        """Save the trained model as a new artifact version of memory-mappable arrays"""
         try:
-            model_data = {
-                'user_item_matrix': self.user_item_matrix,
-                'item_similarity_matrix': self.item_similarity_matrix,
-                'user_similarity_matrix': self.user_similarity_matrix,
-                'nmf_model': self.nmf_model,
-                'career_features': self.career_features,
-                'user_features': self.user_features,
-                'career_mapping': self.career_mapping,
-                'user_mapping': self.user_mapping,
-                'is_trained': True
-            }
-            
-            model_file = os.path.join(self.model_path, 'collaborative_filtering_model.pkl')
-            joblib.dump(model_data, model_file)
+            writer = ArtifactWriter(self.artifact_dir, 'collaborative_filtering')
+            
+            if self.user_item_matrix is not None:
+                writer.add_sparse('user_item_matrix', self.user_item_matrix)
+            for name in ('item_similarity_matrix', 'user_neighbours', 'user_neighbour_similarities',
+                         'career_features', 'user_features', 'similar_career_indices',
+                         'similar_career_scores', 'similar_career_sources'):
+                value = getattr(self, name)
+                if value is not None:
+                    writer.add_array(name, value)
+            
+            # User ids can run into the millions, so they live in an array rather than the manifest
+            writer.add_array('user_ids', np.array(self.user_ids.tolist(), dtype=str))
+            if self.nmf_model is not None:
+                writer.add_estimator('nmf_model', self.nmf_model)
+            writer.set_metadata(
+                career_ids=self.career_ids.tolist(),
+                career_content=self.career_content,
+                is_trained=True
+            )
+            version = writer.commit()
             
             self.is_trained = True
-            self.logger.info(f"Model saved to {model_file}")
+            self.logger.info(f"Model saved to {self.artifact_dir} (version {version})")
             return True
             
         except Exception as e:
             self.logger.error(f"Error saving model: {str(e)}")
             return False
     
-    def load_model(self):
-        """Load the trained model"""
+    def load_model(self, model_file=None, artifact=None):
+        """Load the trained model from an artifact version, or from a legacy pickle path or open file"""
         try:
-            model_file = os.path.join(self.model_path, 'collaborative_filtering_model.pkl')
+            if artifact is None and model_file is None and artifact_exists(self.artifact_dir):
+                artifact = ArtifactReader.open_current(self.artifact_dir)
+            
+            if artifact is not None:
+                return self._load_artifact(artifact)
             
-            if not os.path.exists(model_file):
+            model_file = model_file or os.path.join(self.model_path, 'collaborative_filtering_model.pkl')
+            
+            if isinstance(model_file, str) and not os.path.exists(model_file):
                 self.logger.warning("Model file not found")
                 return False
             
+            import joblib
             model_data = joblib.load(model_file)
             
             self.user_item_matrix = model_data.get('user_item_matrix')
             self.item_similarity_matrix = model_data.get('item_similarity_matrix')
-            self.user_similarity_matrix = model_data.get('user_similarity_matrix')
+            self.user_neighbours = model_data.get('user_neighbours')
+            self.user_neighbour_similarities = model_data.get('user_neighbour_similarities')
             self.nmf_model = model_data.get('nmf_model')
             self.career_features = model_data.get('career_features')
             self.user_features = model_data.get('user_features')
+            self.similar_career_indices = None
+            self.similar_career_scores = None
+            self.similar_career_sources = None
+            self.career_content = []
             self.career_mapping = model_data.get('career_mapping', {})
+            self.career_ids = self._index_ids(self.career_mapping)
             self.user_mapping = model_data.get('user_mapping', {})
+            self.user_ids = self._index_ids(self.user_mapping)
             self.is_trained = model_data.get('is_trained', False)
             
+            # Models saved before the sparse format carry a dense matrix
+            if self.user_item_matrix is not None and not sparse.issparse(self.user_item_matrix):
+                self.user_item_matrix = sparse.csr_matrix(self.user_item_matrix, dtype=np.float32)
+            if self.user_item_matrix is not None and self.user_neighbours is None:
+                self.compute_user_neighbours()
+            
             self.logger.info("Model loaded successfully")
             return True
             
         except Exception as e:
             self.logger.error(f"Error loading model: {str(e)}")
             return False
+    
+    def _load_artifact(self, artifact):
+        """Map the artifact's arrays read-only; pages are shared with other processes through the OS cache"""
+        self.user_item_matrix = artifact.sparse('user_item_matrix')
+        self.item_similarity_matrix = artifact.array('item_similarity_matrix')
+        self.user_neighbours = artifact.array('user_neighbours')
+        self.user_neighbour_similarities = artifact.array('user_neighbour_similarities')
+        self.career_features = artifact.array('career_features')
+        self.user_features = artifact.array('user_features')
+        self.similar_career_indices = artifact.array('similar_career_indices')
+        self.similar_career_scores = artifact.array('similar_career_scores')
+        self.similar_career_sources = artifact.array('similar_career_sources')
+        self.career_content = artifact.metadata.get('career_content', [])
+        self.nmf_model = None
+        if artifact.has('nmf_model'):
+            self._nmf_source = artifact
+        
+        career_ids = artifact.metadata.get('career_ids', [])
+        self.career_mapping = {career_id: idx for idx, career_id in enumerate(career_ids)}
+        self.career_ids = self._index_ids(self.career_mapping)
+        user_ids = artifact.array('user_ids')
+        self.user_mapping = {user_id: idx for idx, user_id in enumerate(user_ids.tolist())}
+        self.user_ids = self._index_ids(self.user_mapping)
+        self.is_trained = artifact.metadata.get('is_trained', False)
+        
+        self.logger.info(f"Model loaded successfully (version {artifact.version})")
+        return True
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Micro-batching of concurrent enhance_recommendations requests for the ML server
+"""
+import time
+import logging
+import threading
+from concurrent.futures import Future
+
+BATCH_SIZE_BOUNDS = (1, 2, 4, 8, 16, 32, 64)
+WAIT_MS_BOUNDS = (0.5, 1, 2, 5, 10, 20, 50)
+
+
+class Histogram:
+    """Fixed-bucket histogram; each bucket counts observations up to its bound"""
+
+    def __init__(self, bounds):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = len(self.bounds)
+        for i, bound in enumerate(self.bounds):
+            if value <= bound:
+                index = i
+                break
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def snapshot(self):
+        labels = [f"<={bound}" for bound in self.bounds] + [f">{self.bounds[-1]}"]
+        return {
+            'buckets': dict(zip(labels, self.counts)),
+            'count': self.count,
+            'mean': round(self.total / self.count, 3) if self.count else 0.0,
+            'max': round(self.max, 3)
+        }
+
+
+class MicroBatcher:
+    """Coalesce enhance_recommendations requests that arrive within a short window into one batch command
+
+    A batch is dispatched when it holds max_size requests or window_ms after its first request
+    arrived, whichever comes first. Each caller gets a future with its own result.
+    """
+
+    def __init__(self, dispatcher, window_ms=2.0, max_size=32):
+        self.dispatcher = dispatcher
+        self.window = window_ms / 1000.0
+        self.max_size = max_size
+        self.logger = logging.getLogger('MicroBatcher')
+
+        self._condition = threading.Condition()
+        self._items = []
+        self._closed = False
+        self.batches = 0
+        self.batch_sizes = Histogram(BATCH_SIZE_BOUNDS)
+        self.wait_ms = Histogram(WAIT_MS_BOUNDS)
+
+        self._thread = threading.Thread(target=self._run, name='MicroBatcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, input_data):
+        """Queue one enhance_recommendations payload and return a future for its result"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('Batcher is shut down')
+            self._items.append((input_data, future, time.perf_counter()))
+            if len(self._items) == 1 or len(self._items) >= self.max_size:
+                self._condition.notify()
+        return future
+
+    def _next_batch(self):
+        """Block until a batch is ready; returns [] once shut down and drained"""
+        with self._condition:
+            while not self._items and not self._closed:
+                self._condition.wait()
+            if not self._items:
+                return []
+
+            deadline = self._items[0][2] + self.window
+            while len(self._items) < self.max_size and not self._closed:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._items[:self.max_size]
+            del self._items[:self.max_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                break
+            try:
+                self._dispatch(batch)
+            except Exception as e:
+                self.logger.error(f"Error dispatching batch: {str(e)}")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def _dispatch(self, batch):
+        dispatched_at = time.perf_counter()
+        with self._condition:
+            self.batches += 1
+            self.batch_sizes.observe(len(batch))
+            for _, _, queued_at in batch:
+                self.wait_ms.observe((dispatched_at - queued_at) * 1000.0)
+
+        requests = [
+            {
+                'user': data.get('user', {}),
+                'recommendations': data.get('recommendations', []),
+                'deadline': data.get('deadline')
+            }
+            for data, _, _ in batch
+        ]
+        futures = [future for _, future, _ in batch]
+
+        def fan_out(done):
+            try:
+                response = done.result()
+                results = response.get('results') if isinstance(response, dict) else None
+                if results is None or len(results) != len(futures):
+                    raise RuntimeError((response or {}).get('error', 'Malformed batch response'))
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+                return
+
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+        # A pool rejection (PoolOverloaded) surfaces here and is passed to every caller by _run
+        self.dispatcher.submit('enhance_recommendations_batch', {'requests': requests}, []).add_done_callback(fan_out)
+
+    def stats(self):
+        with self._condition:
+            return {
+                'window_ms': round(self.window * 1000.0, 3),
+                'max_size': self.max_size,
+                'batches': self.batches,
+                'queued': len(self._items),
+                'batch_size': self.batch_sizes.snapshot(),
+                'wait_ms': self.wait_ms.snapshot()
+            }
+
+    def shutdown(self):
+        """Dispatch whatever is still queued and stop the batching thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
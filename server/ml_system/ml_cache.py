@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Bounded in-process caches for the ML system, with an optional on-disk tier
+"""
+import os
+import json
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with an optional time-to-live per entry"""
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key, default=None):
+        """Return the cached value, or default if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store a value, evicting the least recently used entries beyond maxsize"""
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        """Report size and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+class DiskCache:
+    """JSON values stored one file per key under a directory, shared by worker processes and restarts
+
+    Keys must be safe file names (for example hex digests). Each namespace (a model version) is a
+    subdirectory, and clear(keep=...) removes the others. With max_entries, the oldest files
+    beyond it are pruned by modification time across all namespaces.
+    """
+
+    def __init__(self, directory, ttl=None, max_entries=None):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Pruning walks the whole directory, so it runs once per tenth of max_entries writes
+        self.prune_every = max(1, max_entries // 10) if max_entries else None
+        self._writes_since_prune = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.errors = 0
+
+    def _path(self, namespace, key):
+        return os.path.join(self.directory, namespace, key[:2], f"{key}.json")
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def get(self, namespace, key, default=None):
+        path = self._path(namespace, key)
+        try:
+            if self.ttl and os.path.getmtime(path) + self.ttl <= time.time():
+                os.remove(path)
+                self._count('expirations')
+                self._count('misses')
+                return default
+            with open(path) as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            self._count('misses')
+            return default
+        except (OSError, ValueError):
+            self._count('errors')
+            self._count('misses')
+            return default
+
+        self._count('hits')
+        return value
+
+    def set(self, namespace, key, value):
+        """Write the value next to its final name and rename it, so readers never see a partial file"""
+        path = self._path(namespace, key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(temp_path, 'w') as f:
+                json.dump(value, f)
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError):
+            self._count('errors')
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+
+        with self._lock:
+            self.writes += 1
+            self._writes_since_prune += 1
+            prune = self.prune_every is not None and self._writes_since_prune >= self.prune_every
+            if prune:
+                self._writes_since_prune = 0
+        if prune:
+            self.prune()
+
+    def _entries(self):
+        """(mtime, path) of every cached file"""
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    entries.append((os.path.getmtime(path), path))
+                except OSError:
+                    # Removed by another process meanwhile
+                    continue
+        return entries
+
+    def prune(self):
+        """Remove expired files, then the oldest ones beyond max_entries; returns how many were removed"""
+        entries = sorted(self._entries())
+        now = time.time()
+        expired = [path for mtime, path in entries if self.ttl and mtime + self.ttl <= now]
+        live = [path for mtime, path in entries if not (self.ttl and mtime + self.ttl <= now)]
+        evicted = live[:len(live) - self.max_entries] if self.max_entries and len(live) > self.max_entries else []
+
+        removed = 0
+        for counter, paths in (('expirations', expired), ('evictions', evicted)):
+            for path in paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+                self._count(counter)
+        return removed
+
+    def clear(self, keep=None):
+        """Remove every namespace except keep"""
+        if not os.path.isdir(self.directory):
+            return
+        for namespace in os.listdir(self.directory):
+            if namespace != keep:
+                shutil.rmtree(os.path.join(self.directory, namespace), ignore_errors=True)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'directory': self.directory,
+                'ttl': self.ttl,
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'writes': self.writes,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'errors': self.errors,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
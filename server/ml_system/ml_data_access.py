@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Shared MongoDB access for the ML service: one pooled client per process and a small thread
+pool that runs the blocking pymongo calls off the request path
+"""
+import os
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_MONGODB_URI = 'mongodb://localhost:27017/career_recommender'
+
+
+def client_options():
+    """Connection pool size and timeouts for the shared client"""
+    return {
+        'maxPoolSize': int(os.getenv('ML_MONGO_MAX_POOL_SIZE', '10')),
+        'minPoolSize': int(os.getenv('ML_MONGO_MIN_POOL_SIZE', '0')),
+        'maxIdleTimeMS': int(os.getenv('ML_MONGO_MAX_IDLE_TIME_MS', '300000')),
+        'serverSelectionTimeoutMS': int(os.getenv('ML_MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000')),
+        'connectTimeoutMS': int(os.getenv('ML_MONGO_CONNECT_TIMEOUT_MS', '5000')),
+        'socketTimeoutMS': int(os.getenv('ML_MONGO_SOCKET_TIMEOUT_MS', '30000'))
+    }
+
+
+_client = None
+_client_uri = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+
+def get_client(uri=None):
+    """The process-wide MongoClient, created and pinged on first use; None if MongoDB is unreachable
+
+    A client inherited across fork() is never reused: the child builds its own pool.
+    """
+    global _client, _client_uri, _client_pid
+    from pymongo import MongoClient, uri_parser
+
+    logger = logging.getLogger('MLDataAccess')
+    uri = uri or os.getenv('MONGODB_URI', DEFAULT_MONGODB_URI)
+
+    with _client_lock:
+        if _client is not None and _client_uri == uri and _client_pid == os.getpid():
+            return _client
+
+        # Options given in the URI take precedence over the environment defaults
+        uri_options = {name.lower() for name in uri_parser.parse_uri(uri)['options']}
+        options = {name: value for name, value in client_options().items() if name.lower() not in uri_options}
+        client = MongoClient(uri, **options)
+        try:
+            client.admin.command('ping')
+        except Exception as e:
+            logger.error(f"Failed to connect to MongoDB: {str(e)}")
+            client.close()
+            return None
+
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client, _client_uri, _client_pid = client, uri, os.getpid()
+        logger.info("Connected to MongoDB successfully")
+        return _client
+
+
+class DataAccess:
+    """Run blocking database work off the request path
+
+    submit() returns a concurrent.futures.Future. get_db is called on the pool thread, so a
+    first connection attempt never blocks the caller either.
+    """
+
+    def __init__(self, get_db, max_workers=None):
+        self.get_db = get_db
+        self.max_workers = max_workers or int(os.getenv('ML_DB_WORKERS', '4'))
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Created on first use so a forked worker never inherits a pool without threads
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='MLDataAccess')
+            return self._executor
+
+    def submit(self, fn, *args, **kwargs):
+        return self.executor.submit(fn, *args, **kwargs)
+
+    # Blocking reads, for callers already off the request path
+
+    def ping_database(self):
+        """Whether the database answers a ping"""
+        db = self.get_db()
+        if db is None:
+            return False
+        try:
+            db.client.admin.command('ping')
+            return True
+        except Exception:
+            return False
+
+    def fetch_changed_documents(self, query, batch_size=None):
+        """Cursor over _id, user and updatedAt of the recommendation documents matching query
+
+        Documents are fetched batch_size at a time while the caller iterates.
+        """
+        db = self.get_db()
+        if db is None:
+            return iter(())
+        return db.recommendations.find(query, {'user': 1, 'updatedAt': 1}, batch_size=batch_size or 0)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
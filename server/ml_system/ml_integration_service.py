@@ -1,25 +1,76 @@
 #!/usr/bin/env python3
+import time
+STARTED_AT = time.perf_counter()
+
 import sys
 import json
+import math
+import hashlib
+import threading
 import os
 from datetime import datetime
 import logging
-from pymongo import MongoClient
 from dotenv import load_dotenv
 
-# Import our ML models
-from collaborative_filtering_model import CollaborativeFilteringModel
-from academic_performance_predictor import AcademicPerformancePredictor
+# pymongo and the ML models are imported on first use, so lightweight commands
+# such as health_check never pay for sklearn or a database connection
+from ml_cache import LRUCache, DiskCache
+from model_registry import ModelRegistry
+from ml_scoring import RESCORE_FIELDS, combine_scores
 
 # Load environment variables
 load_dotenv()
 
+# Only the fields the models read are pulled from MongoDB for training. The models learn from
+# ruleMatch where rescore_all has stored one, not from their own blended match
+RECOMMENDATION_TRAINING_FIELDS = {
+    'user': 1,
+    'updatedAt': 1,
+    'kcseResults.meanGrade': 1,
+    'kcseResults.meanPoints': 1,
+    'kcseResults.subjects.subject': 1,
+    'kcseResults.subjects.grade': 1,
+    'recommendations.career': 1,
+    'recommendations.match': 1,
+    'recommendations.ruleMatch': 1
+}
+CAREER_TRAINING_FIELDS = {'title': 1, 'category': 1, 'keySubjects': 1}
+TRAINING_BATCH_SIZE = int(os.getenv('ML_TRAINING_BATCH_SIZE', '5000'))
+RESCORE_BATCH_SIZE = int(os.getenv('ML_RESCORE_BATCH_SIZE', '1000'))
+RESPONSE_CACHE_SIZE = int(os.getenv('ML_RESPONSE_CACHE_SIZE', '10000'))
+RESPONSE_CACHE_TTL = float(os.getenv('ML_RESPONSE_CACHE_TTL', '3600')) or None
+RESPONSE_CACHE_DIR = os.getenv('ML_RESPONSE_CACHE_DIR') or None
+RESPONSE_CACHE_DIR_MAX_ENTRIES = int(os.getenv('ML_RESPONSE_CACHE_DIR_MAX_ENTRIES', '100000')) or None
+# Fields of a recommendation the ML enhancement depends on; the rest is copied through
+ENHANCED_FIELDS = ('ml_enhanced_score', 'improvement_suggestions', 'ml_reasons')
+# Resolved next to this file so the npm scripts work from any working directory
+MODEL_PATH = os.getenv('ML_MODEL_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# Modules reported by --profile-startup when they have been imported
+HEAVY_MODULES = ('numpy', 'scipy', 'pandas', 'sklearn', 'joblib', 'pymongo')
+
 class MLIntegrationService:
     def __init__(self):
         self.setup_logging()
-        self.connect_to_database()
-        self.cf_model = CollaborativeFilteringModel()
-        self.ap_model = AcademicPerformancePredictor()
+        # The database is connected on first access of self.db
+        self._client = None
+        self._db = None
+        self._db_attempted = False
+        self._data_access = None
+        # Only one training or re-scoring run at a time per process
+        self._training_lock = threading.Lock()
+        # Training works on its own model instances, created on first use; requests read the registry's snapshot
+        self._cf_model = None
+        self._ap_model = None
+        self.registry = ModelRegistry(MODEL_PATH, self.create_cf_model, self.create_ap_model)
+        # Moving average seconds per enhancement stage, used to keep within request budgets
+        self.stage_costs = {}
+        # Complete enhance_recommendations results per model version
+        self.response_cache = LRUCache(maxsize=RESPONSE_CACHE_SIZE, ttl=RESPONSE_CACHE_TTL)
+        self.response_disk_cache = DiskCache(
+            RESPONSE_CACHE_DIR, ttl=RESPONSE_CACHE_TTL, max_entries=RESPONSE_CACHE_DIR_MAX_ENTRIES
+        ) if RESPONSE_CACHE_DIR else None
+        self._response_cache_version = None
         
     def setup_logging(self):
         """Setup logging configuration"""
@@ -29,73 +80,202 @@ class MLIntegrationService:
         )
         self.logger = logging.getLogger('MLIntegrationService')
     
+    @property
+    def db(self):
+        if not self._db_attempted:
+            self.connect_to_database()
+        return self._db
+    
+    @property
+    def client(self):
+        if not self._db_attempted:
+            self.connect_to_database()
+        return self._client
+    
+    @property
+    def cf_model(self):
+        """Collaborative filtering model that training fills in"""
+        if self._cf_model is None:
+            self._cf_model = self.create_cf_model()
+        return self._cf_model
+    
+    @cf_model.setter
+    def cf_model(self, model):
+        self._cf_model = model
+    
+    @property
+    def ap_model(self):
+        """Academic performance predictor that training fills in"""
+        if self._ap_model is None:
+            self._ap_model = self.create_ap_model()
+        return self._ap_model
+    
+    @ap_model.setter
+    def ap_model(self, model):
+        self._ap_model = model
+    
+    @property
+    def data_access(self):
+        """Thread pool for database work that must not block request handling"""
+        if self._data_access is None:
+            from ml_data_access import DataAccess
+            
+            self._data_access = DataAccess(lambda: self.db)
+        return self._data_access
+    
+    def reset_database_connection(self):
+        """Forget the current connection; the next database access reconnects"""
+        self._client = None
+        self._db = None
+        self._db_attempted = False
+        # Threads do not survive fork(), so a copied pool would never run anything
+        self._data_access = None
+    
     def connect_to_database(self):
-        """Connect to MongoDB database"""
+        """Connect to MongoDB through the process-wide pooled client"""
+        self._db_attempted = True
         try:
-            mongodb_uri = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/career_recommender')
-            self.client = MongoClient(mongodb_uri)
-            self.db = self.client.get_default_database()
+            from ml_data_access import get_client
             
-            # Test connection
-            self.client.admin.command('ping')
-            self.logger.info("Connected to MongoDB successfully")
+            # Pinged once when the shared client is created, not per service instance
+            self._client = get_client()
+            self._db = self._client.get_default_database() if self._client is not None else None
             
         except Exception as e:
             self.logger.error(f"Failed to connect to MongoDB: {str(e)}")
-            self.client = None
-            self.db = None
+            self._client = None
+            self._db = None
+    
+    # The registry decides when models are read from disk, so instances never load themselves
+    def create_cf_model(self):
+        from collaborative_filtering_model import CollaborativeFilteringModel
+        
+        return CollaborativeFilteringModel(
+            model_path=MODEL_PATH,
+            search_backend=os.getenv('ML_SIMILARITY_BACKEND', 'exact'),
+            auto_load=False
+        )
+    
+    def create_ap_model(self):
+        from academic_performance_predictor import AcademicPerformancePredictor
+        
+        return AcademicPerformancePredictor(
+            model_path=MODEL_PATH,
+            auto_load=False,
+            compiled_dtype=os.getenv('ML_COMPILED_TREE_DTYPE', 'float64'),
+            compiled_max_rows=int(os.getenv('ML_COMPILED_MAX_ROWS', '512')),
+            prediction_cache_size=int(os.getenv('ML_PREDICTION_CACHE_SIZE', '50000')),
+            prediction_cache_ttl=float(os.getenv('ML_PREDICTION_CACHE_TTL', '0')) or None,
+            n_jobs=int(os.getenv('ML_TRAINING_JOBS', '0')) or None,
+            cv_folds=int(os.getenv('ML_CV_FOLDS', '5')),
+            training_time_budget=float(os.getenv('ML_TRAINING_TIME_BUDGET', '0')) or None
+        )
+    
+    def cache_stats(self):
+        """Hit/miss counters of the in-process model caches, without loading any models"""
+        models = self.registry.peek()
+        if models is None:
+            return {}
+        stats = {
+            'academic_predictions': models.ap_model.cache_stats(),
+            'fold_in': models.cf_model.fold_in_cache.stats(),
+            'responses': self.response_cache.stats()
+        }
+        if self.response_disk_cache is not None:
+            stats['responses_disk'] = self.response_disk_cache.stats()
+        return stats
+    
+    def ensure_models_loaded(self):
+        """Return the current model snapshot, loading the models on first use"""
+        return self.registry.current()
     
-    def load_data_from_db(self):
-        """Load data from MongoDB for training"""
+    def stream_recommendations(self, query=None, batch_size=None):
+        """Stream projected recommendation documents from MongoDB in chunks"""
+        batch_size = batch_size or TRAINING_BATCH_SIZE
+        cursor = self.db.recommendations.find(
+            query or {}, RECOMMENDATION_TRAINING_FIELDS, batch_size=batch_size
+        )
+        
+        chunk = []
+        for rec_data in cursor:
+            chunk.append(rec_data)
+            if len(chunk) >= batch_size:
+                yield chunk
+                chunk = []
+        
+        if chunk:
+            yield chunk
+    
+    def load_careers_from_db(self):
+        """Load the career catalogue with only the fields the models use"""
+        careers_data = list(self.db.careers.find({}, CAREER_TRAINING_FIELDS))
+        self.logger.info(f"Loaded {len(careers_data)} career records")
+        return careers_data
+    
+    def train_models(self):
+        """Train all ML models"""
         try:
-            # Fix the database check issue
+            self.logger.info("Starting ML model training...")
+            
+            # Fresh instances, so models still serving requests are never mutated
+            self.cf_model = self.create_cf_model()
+            self.ap_model = self.create_ap_model()
+            
             if self.db is None:
                 self.logger.error("No database connection available")
-                return None, None
-            
-            # Load recommendations data
-            recommendations_data = list(self.db.recommendations.find())
-            self.logger.info(f"Loaded {len(recommendations_data)} recommendation records")
+                self.logger.warning("Insufficient data for training, creating dummy models")
+                return self.create_dummy_models()
             
-            # Load careers data
-            careers_data = list(self.db.careers.find())
-            self.logger.info(f"Loaded {len(careers_data)} career records")
+            careers_data = self.load_careers_from_db()
+            if not careers_data:
+                self.logger.warning("Insufficient data for training, creating dummy models")
+                return self.create_dummy_models()
             
-            return recommendations_data, careers_data
+            # Feed both models from a single pass over the recommendations
+            self.cf_model.begin_data(careers_data)
+            self.ap_model.begin_data()
             
-        except Exception as e:
-            self.logger.error(f"Error loading data from database: {str(e)}")
-            return None, None
-    
-    def train_models(self):
-        """Train all ML models"""
-        try:
-            self.logger.info("Starting ML model training...")
+            record_count = 0
+            high_water_mark = None
+            for chunk in self.stream_recommendations():
+                for rec_data in chunk:
+                    high_water_mark = self._advance_high_water_mark(high_water_mark, rec_data)
+                record_count += len(chunk)
+                
+                self.cf_model.add_recommendations(chunk)
+                self.ap_model.add_recommendations(chunk)
             
-            # Load data
-            recommendations_data, careers_data = self.load_data_from_db()
+            self.logger.info(f"Loaded {record_count} recommendation records")
             
-            if not recommendations_data or not careers_data:
+            if record_count == 0:
                 self.logger.warning("Insufficient data for training, creating dummy models")
                 return self.create_dummy_models()
             
             # Train collaborative filtering model
             self.logger.info("Training collaborative filtering model...")
-            if self.cf_model.prepare_data(recommendations_data, careers_data):
+            if self.cf_model.finish_data():
                 self.cf_model.train_user_based_cf()
                 self.cf_model.train_item_based_cf()
                 self.cf_model.train_matrix_factorization()
+                self.cf_model.build_similar_careers()
                 self.cf_model.save_model()
+                self.registry.publish(cf_model=self.cf_model)
+                self.save_training_state({
+                    'high_water_mark': high_water_mark,
+                    'mode': 'full',
+                    'trained_at': datetime.now().isoformat()
+                })
                 self.logger.info("Collaborative filtering model trained successfully")
             else:
                 self.logger.warning("Failed to train collaborative filtering model")
             
             # Train academic performance predictor
             self.logger.info("Training academic performance predictor...")
-            training_data = self.ap_model.prepare_data(recommendations_data)
+            training_data = self.ap_model.finish_data()
             if training_data is not None and not training_data.empty:
                 self.ap_model.train_models(training_data)
                 self.ap_model.save_models()
+                self.registry.publish(ap_model=self.ap_model)
                 self.logger.info("Academic performance predictor trained successfully")
             else:
                 self.logger.warning("Failed to train academic performance predictor")
@@ -114,6 +294,284 @@ class MLIntegrationService:
                 'timestamp': datetime.now().isoformat()
             }
     
+    def train_models_incremental(self):
+        """Update the collaborative filtering model with recommendations changed since the last training"""
+        try:
+            self.logger.info("Starting incremental ML model training...")
+            
+            state = self.load_training_state()
+            high_water_mark = state.get('high_water_mark')
+            self.cf_model = self.create_cf_model()
+            
+            if not high_water_mark or not self.cf_model.load_model():
+                self.logger.info("No previous training state, running full training")
+                return self.train_models()
+            
+            if self.db is None:
+                self.logger.error("No database connection available")
+                return {
+                    'success': False,
+                    'error': 'No database connection available',
+                    'timestamp': datetime.now().isoformat()
+                }
+            
+            # Added or removed careers change the matrix columns, which only a full training can do
+            career_ids = {str(career_id) for career_id in self.db.careers.distinct('_id')}
+            if career_ids != set(self.cf_model.career_mapping):
+                self.logger.info("Career catalogue changed, running full training")
+                return self.train_models()
+            
+            changed_users = set()
+            for rec_data in self.data_access.fetch_changed_documents(
+                self._changed_since_query(high_water_mark), batch_size=TRAINING_BATCH_SIZE
+            ):
+                changed_users.add(rec_data.get('user'))
+                high_water_mark = self._advance_high_water_mark(high_water_mark, rec_data)
+            
+            if not changed_users:
+                return {
+                    'success': True,
+                    'message': 'No new recommendation data since last training',
+                    'updated_users': 0,
+                    'timestamp': datetime.now().isoformat()
+                }
+            
+            # A user's row is built from all of their recommendation documents
+            user_documents = self.db.recommendations.find(
+                {'user': {'$in': list(changed_users)}}, RECOMMENDATION_TRAINING_FIELDS,
+                batch_size=TRAINING_BATCH_SIZE
+            ).sort('_id', 1)
+            
+            if not self.cf_model.apply_updates(user_documents):
+                raise RuntimeError('Failed to apply incremental update to collaborative filtering model')
+            
+            self.cf_model.save_model()
+            self.registry.publish(cf_model=self.cf_model)
+            self.save_training_state({
+                'high_water_mark': high_water_mark,
+                'mode': 'incremental',
+                'trained_at': datetime.now().isoformat()
+            })
+            
+            return {
+                'success': True,
+                'message': 'Models updated incrementally',
+                'updated_users': len(changed_users),
+                'timestamp': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error in incremental training: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    def rescore_all(self, resume=False, n_jobs=None, batch_size=None):
+        """Re-score every stored recommendation with the current models and write the blended score back
+        
+        The new score replaces match (and is kept in mlScore); the rule-based input is stored in
+        ruleMatch so a later run blends from it again instead of from an already blended match.
+        
+        Documents are streamed in _id order and scored in a process pool. Each chunk is
+        written with one unordered bulk_write, then the checkpoint records the last _id,
+        so an interrupted run can continue with resume=True.
+        """
+        try:
+            from pymongo import UpdateOne
+            from ml_scoring import score_chunks
+            
+            if self.db is None:
+                self.logger.error("No database connection available")
+                return {
+                    'success': False,
+                    'error': 'No database connection available',
+                    'timestamp': datetime.now().isoformat()
+                }
+            
+            models = self.ensure_models_loaded()
+            batch_size = batch_size or RESCORE_BATCH_SIZE
+            if n_jobs is None or n_jobs <= 0:
+                n_jobs = os.cpu_count() or 1
+            
+            checkpoint = self.load_rescore_checkpoint() if resume else {}
+            if checkpoint.get('completed'):
+                checkpoint = {}
+            if checkpoint and checkpoint.get('model_version') != models.version:
+                self.logger.info("Models changed since the checkpoint, re-scoring from the start")
+                checkpoint = {}
+            
+            query = {}
+            if checkpoint.get('last_id'):
+                query = {'_id': {'$gt': self._parse_document_id(checkpoint['last_id'])}}
+                self.logger.info(f"Resuming re-scoring after {checkpoint['last_id']}")
+            
+            processed = checkpoint.get('processed', 0)
+            updated = checkpoint.get('updated', 0)
+            conflicts = checkpoint.get('conflicts', 0)
+            started = datetime.now()
+            run_processed = 0
+            
+            cursor = self.db.recommendations.find(query, RESCORE_FIELDS, batch_size=batch_size).sort('_id', 1)
+            chunks = self._chunked(cursor, batch_size)
+            
+            for chunk, updates in score_chunks(models, chunks, n_jobs):
+                # Skip documents the student changed since they were read; positions may have moved
+                operations = [
+                    UpdateOne(
+                        {'_id': doc_id, 'updatedAt': updated_at},
+                        {'$set': self._rescore_fields(scores)}
+                    )
+                    for doc_id, updated_at, scores in updates
+                ]
+                if operations:
+                    result = self.db.recommendations.bulk_write(operations, ordered=False)
+                    updated += result.modified_count
+                    conflicts += len(operations) - result.matched_count
+                
+                processed += len(chunk)
+                run_processed += len(chunk)
+                elapsed = (datetime.now() - started).total_seconds()
+                self.save_rescore_checkpoint({
+                    'last_id': str(chunk[-1]['_id']),
+                    'model_version': models.version,
+                    'processed': processed,
+                    'updated': updated,
+                    'conflicts': conflicts,
+                    'updated_at': datetime.now().isoformat()
+                })
+                self.logger.info(
+                    f"Re-scored {processed} documents ({run_processed / max(elapsed, 1e-9):.0f}/s), "
+                    f"{updated} updated, {conflicts} changed meanwhile"
+                )
+            
+            elapsed = (datetime.now() - started).total_seconds()
+            self.save_rescore_checkpoint({
+                'model_version': models.version,
+                'processed': processed,
+                'updated': updated,
+                'conflicts': conflicts,
+                'completed': True,
+                'updated_at': datetime.now().isoformat()
+            })
+            
+            return {
+                'success': True,
+                'message': 'Recommendations re-scored',
+                'processed': processed,
+                'updated': updated,
+                'conflicts': conflicts,
+                'resumed': bool(checkpoint),
+                'elapsed_seconds': round(elapsed, 3),
+                'documents_per_second': round(run_processed / max(elapsed, 1e-9), 1),
+                'model_version': models.version,
+                'timestamp': datetime.now().isoformat()
+            }
+            
+        except Exception as e:
+            self.logger.error(f"Error re-scoring recommendations: {str(e)}")
+            return {
+                'success': False,
+                'error': str(e),
+                'timestamp': datetime.now().isoformat()
+            }
+    
+    @staticmethod
+    def _rescore_fields(scores):
+        fields = {}
+        for position, score, original in scores:
+            fields[f"recommendations.{position}.match"] = score
+            fields[f"recommendations.{position}.mlScore"] = score
+            fields[f"recommendations.{position}.ruleMatch"] = original
+        return fields
+    
+    @staticmethod
+    def _chunked(cursor, batch_size):
+        chunk = []
+        for document in cursor:
+            chunk.append(document)
+            if len(chunk) >= batch_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+    
+    def rescore_checkpoint_file(self):
+        return os.path.join(MODEL_PATH, 'rescore_checkpoint.json')
+    
+    def load_rescore_checkpoint(self):
+        try:
+            with open(self.rescore_checkpoint_file()) as checkpoint_file:
+                return json.load(checkpoint_file)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_rescore_checkpoint(self, checkpoint):
+        """Persist re-scoring progress atomically"""
+        checkpoint_file = self.rescore_checkpoint_file()
+        temp_file = f"{checkpoint_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(temp_file, checkpoint_file)
+    
+    def training_state_file(self):
+        return os.path.join(MODEL_PATH, 'training_state.json')
+    
+    def load_training_state(self):
+        """Load the persisted training high-water mark"""
+        try:
+            with open(self.training_state_file()) as state_file:
+                return json.load(state_file)
+        except (OSError, ValueError):
+            return {}
+    
+    def save_training_state(self, state):
+        """Persist the training high-water mark atomically"""
+        state_file = self.training_state_file()
+        temp_file = f"{state_file}.tmp"
+        with open(temp_file, 'w') as f:
+            json.dump(state, f)
+        os.replace(temp_file, state_file)
+    
+    @staticmethod
+    def _advance_high_water_mark(high_water_mark, rec_data):
+        """Return the later of the mark and the document's (updatedAt, _id)"""
+        updated_at = rec_data.get('updatedAt')
+        candidate = {
+            'updatedAt': updated_at.isoformat() if isinstance(updated_at, datetime) else None,
+            '_id': str(rec_data.get('_id', ''))
+        }
+        
+        if high_water_mark is None:
+            return candidate
+        
+        def sort_key(mark):
+            return (mark['updatedAt'] or '', mark['_id'])
+        
+        return candidate if sort_key(candidate) > sort_key(high_water_mark) else high_water_mark
+    
+    @staticmethod
+    def _parse_document_id(document_id):
+        """Turn a stored _id string back into an ObjectId where it is one"""
+        from bson import ObjectId
+        
+        return ObjectId(document_id) if ObjectId.is_valid(document_id) else document_id
+    
+    @staticmethod
+    def _changed_since_query(high_water_mark):
+        """Mongo filter for recommendation documents after the high-water mark"""
+        last_id = MLIntegrationService._parse_document_id(high_water_mark['_id'])
+        
+        if not high_water_mark.get('updatedAt'):
+            return {'_id': {'$gt': last_id}}
+        
+        updated_at = datetime.fromisoformat(high_water_mark['updatedAt'])
+        return {'$or': [
+            {'updatedAt': {'$gt': updated_at}},
+            {'updatedAt': updated_at, '_id': {'$gt': last_id}}
+        ]}
+    
     def create_dummy_models(self):
         """Create dummy models when no training data is available"""
         try:
@@ -164,7 +622,9 @@ class MLIntegrationService:
             # Train with dummy data
             if self.cf_model.prepare_data(dummy_recommendations, dummy_careers):
                 self.cf_model.train_user_based_cf()
+                self.cf_model.build_similar_careers()
                 self.cf_model.save_model()
+                self.registry.publish(cf_model=self.cf_model)
             
             return {
                 'success': True,
@@ -180,69 +640,147 @@ class MLIntegrationService:
                 'timestamp': datetime.now().isoformat()
             }
     
-    def enhance_recommendations(self, user_data, recommendations):
+    def enhance_recommendations(self, user_data, recommendations, deadline=None):
         """Enhance recommendations using ML models"""
+        return self.enhance_recommendations_batch([(user_data, recommendations, deadline)])[0]
+    
+    def enhance_recommendations_batch(self, requests):
+        """Enhance several students' recommendations with one CF and one academic prediction pass
+        
+        requests is a list of (user_data, recommendations, deadline); deadline is a time.monotonic()
+        value or None. Requests whose deadline leaves no room for a stage skip it; academic scores then
+        come from the prediction cache only. Returns one result per request.
+        """
         try:
-            self.logger.info("Enhancing recommendations with ML...")
+            # Pin one model version for the whole batch
+            models = self.ensure_models_loaded()
             
-            # Load models if not already loaded
-            self.cf_model.load_model()
-            self.ap_model.load_models()
+            keys = [self._response_cache_key(models, user_data, recommendations) for user_data, recommendations, _ in requests]
+            results = [
+                self._cached_response(models, key, recommendations)
+                for key, (_, recommendations, _) in zip(keys, requests)
+            ]
+        except Exception as e:
+            self.logger.error(f"Error enhancing recommendations: {str(e)}")
+            return self._enhancement_failed(requests, e)
+        
+        misses = [idx for idx, result in enumerate(results) if result is None]
+        if misses:
+            computed = self._enhance_batch(models, [requests[idx] for idx in misses])
+            for idx, result in zip(misses, computed):
+                results[idx] = result
+                # Results missing a stage are not cached, so the next visit gets the full answer
+                if result.get('success') and not result.get('partial'):
+                    self._store_response(models, keys[idx], requests[idx][1], result)
+        
+        return results
+    
+    def _enhance_batch(self, models, requests):
+        """Run the enhancement stages for requests that were not answered from the cache"""
+        try:
+            self.logger.info(f"Enhancing recommendations with ML ({len(requests)} requests)...")
+            
+            deadlines = [deadline for _, _, deadline in requests]
+            stages = [
+                {'collaborative_filtering': 'skipped', 'academic_prediction': 'unavailable'}
+                for _ in requests
+            ]
+            
+            # Score every candidate career of every student against similar users in one pass
+            cf_scores = [{} for _ in requests]
+            cf_rows = self._within_budget('collaborative_filtering', deadlines)
+            if cf_rows:
+                started = time.monotonic()
+                user_ids = [str(requests[idx][0].get('_id', 'unknown')) for idx in cf_rows]
+                candidate_lists = [[str(rec.get('id', '')) for rec in requests[idx][1]] for idx in cf_rows]
+                interactions = [
+                    {career_id: rec.get('match', 0) / 100.0 for career_id, rec in zip(candidate_ids, requests[idx][1])}
+                    for candidate_ids, idx in zip(candidate_lists, cf_rows)
+                ]
+                # The candidates are the list being ranked, so they are scored even though they
+                # also stand in for a new student's ratings
+                scores = models.cf_model.score_careers_batch(user_ids, candidate_lists, interactions,
+                                                             exclude_rated=False)
+                self._record_stage('collaborative_filtering', time.monotonic() - started)
+                for idx, user_scores in zip(cf_rows, scores):
+                    cf_scores[idx] = user_scores
+                    stages[idx]['collaborative_filtering'] = 'computed'
+            
+            # Academic predictions do not depend on the career: one batch row per student.
+            # Requests out of budget still get a prediction that is already cached.
+            with_kcse = [idx for idx, (user_data, _, _) in enumerate(requests) if 'kcseResults' in user_data]
+            ap_rows = set(self._within_budget('academic_prediction', [deadlines[idx] for idx in with_kcse]))
+            ap_scores = {}
+            for cache_only in (False, True):
+                rows = [idx for row, idx in enumerate(with_kcse) if (row in ap_rows) != cache_only]
+                if not rows:
+                    continue
+                
+                started = time.monotonic()
+                predictions = models.ap_model.predict_batch(
+                    [requests[idx][0]['kcseResults'] for idx in rows], [''], cache_only=cache_only
+                )
+                if not cache_only:
+                    self._record_stage('academic_prediction', time.monotonic() - started)
+                if predictions is None:
+                    continue
+                
+                for row, idx in enumerate(rows):
+                    score = float(predictions[row, 0])
+                    if math.isnan(score):
+                        stages[idx]['academic_prediction'] = 'skipped'
+                    else:
+                        ap_scores[idx] = score
+                        stages[idx]['academic_prediction'] = 'cached' if cache_only else 'computed'
             
+        except Exception as e:
+            self.logger.error(f"Error enhancing recommendations: {str(e)}")
+            return self._enhancement_failed(requests, e)
+        
+        return [
+            self._enhance_one(models, user_data, recommendations, cf_scores[idx], ap_scores.get(idx),
+                              stages[idx], deadline)
+            for idx, (user_data, recommendations, deadline) in enumerate(requests)
+        ]
+    
+    def _enhance_one(self, models, user_data, recommendations, cf_scores, ap_score, stages, deadline):
+        """Blend one student's precomputed ML scores into their recommendations"""
+        try:
             enhanced_recommendations = []
             
+            # Suggestions are the last stage: only worth computing while the budget lasts
+            with_suggestions = 'kcseResults' in user_data
+            if with_suggestions:
+                with_suggestions = bool(self._within_budget('improvement_suggestions', [deadline]))
+                stages['improvement_suggestions'] = 'computed' if with_suggestions else 'skipped'
+            else:
+                stages['improvement_suggestions'] = 'unavailable'
+            started = time.monotonic()
+            
             for rec in recommendations:
                 enhanced_rec = rec.copy()
                 
                 # Get ML-enhanced score from collaborative filtering
-                user_id = user_data.get('_id', 'unknown')
-                cf_recommendations = self.cf_model.get_user_recommendations(str(user_id), 20)
-                
-                # Find if this career is in CF recommendations
                 career_id = str(rec.get('id', ''))
-                cf_score = None
-                
-                for cf_rec in cf_recommendations:
-                    if cf_rec['career_id'] == career_id:
-                        cf_score = cf_rec['ml_enhanced_score']
-                        break
+                cf_score = cf_scores.get(career_id)
                 
-                # Get academic performance prediction and improvement suggestions
-                ap_score = None
+                # Get improvement suggestions
                 improvement_suggestions = []
-
-                if 'kcseResults' in user_data:
-                    ap_score = self.ap_model.predict_career_match(
-                        user_data['kcseResults'], 
-                        career_id
-                    )
-                    
-                    # Get improvement suggestions
+                
+                if with_suggestions:
                     career_data = {
                         '_id': career_id,
                         'title': rec.get('title', 'Unknown Career'),
                         'keySubjects': rec.get('keySubjects', [])
                     }
-                    improvement_suggestions = self.ap_model.get_improvement_suggestions(
+                    improvement_suggestions = models.ap_model.get_improvement_suggestions(
                         user_data, 
                         career_data
                     )
-                else:
-                    ap_score = None
                 
                 # Combine scores
                 original_score = rec.get('match', 0)
-                final_score = original_score
-                
-                if cf_score is not None:
-                    # Weight: 60% original, 40% collaborative filtering
-                    final_score = 0.6 * original_score + 0.4 * (cf_score * 100)
-                
-                if ap_score is not None:
-                    # Further adjust with academic performance prediction
-                    final_score = 0.7 * final_score + 0.3 * ap_score
-                
-                enhanced_rec['ml_enhanced_score'] = min(100, max(0, final_score))
+                enhanced_rec['ml_enhanced_score'] = combine_scores(original_score, cf_score, ap_score)
                 enhanced_rec['improvement_suggestions'] = improvement_suggestions  # Add this line
                 enhanced_rec['ml_reasons'] = []
                 
@@ -258,13 +796,19 @@ class MLIntegrationService:
                 
                 enhanced_recommendations.append(enhanced_rec)
             
+            if with_suggestions:
+                self._record_stage('improvement_suggestions', time.monotonic() - started)
+            
             # Sort by enhanced score
             enhanced_recommendations.sort(key=lambda x: x.get('ml_enhanced_score', 0), reverse=True)
             
             return {
                 'success': True,
                 'enhanced_recommendations': enhanced_recommendations,
-                'ml_enhanced': True,
+                'ml_enhanced': stages['collaborative_filtering'] == 'computed' or ap_score is not None,
+                'stages': stages,
+                'partial': 'skipped' in stages.values(),
+                'model_version': models.version,
                 'timestamp': datetime.now().isoformat()
             }
             
@@ -277,15 +821,124 @@ class MLIntegrationService:
                 'error': str(e)
             }
     
+    @staticmethod
+    def _enhancement_failed(requests, error):
+        return [{
+            'success': False,
+            'enhanced_recommendations': recommendations,
+            'ml_enhanced': False,
+            'error': str(error)
+        } for _, recommendations, _ in requests]
+    
+    @staticmethod
+    def _response_cache_key(models, user_data, recommendations):
+        """Hash of everything an enhancement result depends on, including the model version"""
+        payload = json.dumps(
+            [models.version, str(user_data.get('_id', 'unknown')), user_data.get('kcseResults'),
+             [MLIntegrationService._candidate_key(rec) for rec in recommendations]],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def _candidate_key(rec):
+        """The fields of a recommendation that its ML scores, reasons and suggestions depend on"""
+        return json.dumps(
+            [str(rec.get('id', '')), rec.get('match', 0), rec.get('title'), rec.get('keySubjects', [])],
+            default=str
+        )
+    
+    def _check_response_cache_version(self, models):
+        """Drop cached responses of older models once a new version is serving"""
+        if models.version != self._response_cache_version:
+            self.response_cache.clear()
+            # Also on the first request, for files an earlier run left behind
+            if self.response_disk_cache is not None:
+                self.response_disk_cache.clear(keep=models.version)
+            self._response_cache_version = models.version
+    
+    def _cached_response(self, models, key, recommendations):
+        """Rebuild a cached result on top of the recommendations as sent, or None on a miss"""
+        self._check_response_cache_version(models)
+        
+        entry = self.response_cache.get(key)
+        if entry is None and self.response_disk_cache is not None:
+            entry = self.response_disk_cache.get(models.version, key)
+            if entry is not None:
+                self.response_cache.set(key, entry)
+        if entry is None:
+            return None
+        
+        enhanced_recommendations = [
+            dict(rec, **fields) for rec, fields in zip(recommendations, entry['enhanced_fields'])
+        ]
+        enhanced_recommendations.sort(key=lambda x: x.get('ml_enhanced_score', 0), reverse=True)
+        return {
+            'success': True,
+            'enhanced_recommendations': enhanced_recommendations,
+            'ml_enhanced': entry['ml_enhanced'],
+            'stages': entry['stages'],
+            'partial': False,
+            'cached': True,
+            'model_version': models.version,
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def _store_response(self, models, key, recommendations, result):
+        """Cache the ML fields of a complete result in recommendation input order"""
+        # Map the sorted output back to input positions; identical inputs get identical fields
+        positions = {}
+        for position, rec in enumerate(recommendations):
+            positions.setdefault(self._candidate_key(rec), []).append(position)
+        enhanced_fields = [None] * len(recommendations)
+        for rec in result['enhanced_recommendations']:
+            position = positions[self._candidate_key(rec)].pop(0)
+            enhanced_fields[position] = {field: rec.get(field) for field in ENHANCED_FIELDS}
+        
+        entry = {
+            'enhanced_fields': enhanced_fields,
+            'ml_enhanced': result['ml_enhanced'],
+            'stages': result['stages']
+        }
+        self.response_cache.set(key, entry)
+        if self.response_disk_cache is not None:
+            self.response_disk_cache.set(models.version, key, entry)
+    
+    def _within_budget(self, stage, deadlines):
+        """Indices of the deadlines (None: no budget) that leave room for the stage's recent duration"""
+        cost = self.stage_costs.get(stage, 0.0)
+        now = time.monotonic()
+        rows = [idx for idx, deadline in enumerate(deadlines) if deadline is None or now + cost <= deadline]
+        
+        if len(rows) < len(deadlines):
+            # Decay the estimate of a skipped stage so a one-off slow run (a cold model) is retried later
+            self.stage_costs[stage] = cost / 2
+        return rows
+    
+    def _record_stage(self, stage, seconds):
+        """Track a moving average of how long each enhancement stage takes"""
+        previous = self.stage_costs.get(stage)
+        self.stage_costs[stage] = seconds if previous is None else 0.8 * previous + 0.2 * seconds
+    
+    @staticmethod
+    def request_deadline(input_data):
+        """The time.monotonic() deadline of a request: stamped by the server, or derived from budget_ms"""
+        if input_data.get('deadline') is not None:
+            return float(input_data['deadline'])
+        if input_data.get('budget_ms') is not None:
+            return time.monotonic() + float(input_data['budget_ms']) / 1000.0
+        return None
+    
     def get_similar_careers(self, career_id, limit=5):
         """Get similar careers using ML"""
         try:
-            self.cf_model.load_model()
-            similar_careers = self.cf_model.get_similar_careers(career_id, limit)
+            models = self.ensure_models_loaded()
+            similar_careers = models.cf_model.get_similar_careers(career_id, limit)
             
             return {
                 'success': True,
-                'similar_careers': similar_careers
+                'similar_careers': similar_careers,
+                'model_version': models.version
             }
             
         except Exception as e:
@@ -333,14 +986,14 @@ class MLIntegrationService:
                 'error': str(e)
             }
     
-    def health_check(self):
-        """Check ML system health"""
+    def health_check(self, deep=False):
+        """Check ML system health; only a deep check connects to the database"""
         try:
             health_status = {
                 'healthy': True,
                 'status': 'operational',
                 'components': {
-                    'database': False,
+                    'database': None,
                     'collaborative_filtering': False,
                     'academic_predictor': False
                 },
@@ -348,19 +1001,17 @@ class MLIntegrationService:
             }
             
             # Check database connection
-            if self.db is not None:
-                try:
-                    self.client.admin.command('ping')
-                    health_status['components']['database'] = True
-                except:
-                    pass
+            if deep:
+                health_status['components']['database'] = self.data_access.ping_database()
             
             # Check if models exist
-            cf_model_exists = os.path.exists('./models/collaborative_filtering_model.pkl')
-            ap_model_exists = os.path.exists('./models/academic_performance_models.pkl')
+            cf_model_exists = self.registry.has_model('cf')
+            ap_model_exists = self.registry.has_model('ap')
             
             health_status['components']['collaborative_filtering'] = cf_model_exists
             health_status['components']['academic_predictor'] = ap_model_exists
+            health_status['models'] = self.registry.describe()
+            health_status['caches'] = self.cache_stats()
             
             # Overall health
             models_healthy = cf_model_exists or ap_model_exists
@@ -377,50 +1028,99 @@ class MLIntegrationService:
                 'timestamp': datetime.now().isoformat()
             }
 
-def main():
-    """Main function to handle command line arguments"""
-    if len(sys.argv) < 2:
-        print(json.dumps({'error': 'No command provided'}))
-        sys.exit(1)
-    
-    command = sys.argv[1]
-    service = MLIntegrationService()
-    
-    try:
+    def handle_command(self, command, input_data=None, args=None):
+        """Dispatch a command from the CLI or the long-running server"""
+        input_data = input_data or {}
+        args = args or []
+        
         if command == 'train_models':
-            result = service.train_models()
-            print(json.dumps(result))
+            with self._training_lock:
+                if '--incremental' in args:
+                    return self.train_models_incremental()
+                return self.train_models()
+            
+        elif command == 'rescore_all':
+            with self._training_lock:
+                return self.rescore_all(
+                    resume='--resume' in args,
+                    n_jobs=int(self._option(args, '--jobs', 0)),
+                    batch_size=int(self._option(args, '--batch-size', 0)) or None
+                )
             
         elif command == 'enhance_recommendations':
-            # Read input data from stdin
-            input_data = json.loads(sys.stdin.read())
             user_data = input_data.get('user', {})
             recommendations = input_data.get('recommendations', [])
+            return self.enhance_recommendations(user_data, recommendations, self.request_deadline(input_data))
             
-            result = service.enhance_recommendations(user_data, recommendations)
-            print(json.dumps(result))
+        elif command == 'enhance_recommendations_batch':
+            requests = [
+                (request.get('user', {}), request.get('recommendations', []), self.request_deadline(request))
+                for request in input_data.get('requests', [])
+            ]
+            return {
+                'success': True,
+                'results': self.enhance_recommendations_batch(requests),
+                'timestamp': datetime.now().isoformat()
+            }
             
         elif command == 'similar_careers':
-            career_id = sys.argv[2] if len(sys.argv) > 2 else ''
-            limit = int(sys.argv[3]) if len(sys.argv) > 3 else 5
-            
-            result = service.get_similar_careers(career_id, limit)
-            print(json.dumps(result))
+            career_id = args[0] if len(args) > 0 else ''
+            limit = int(args[1]) if len(args) > 1 else 5
+            return self.get_similar_careers(career_id, limit)
             
         elif command == 'predict_trends':
-            input_data = json.loads(sys.stdin.read())
             historical_data = input_data.get('historical_data', [])
-            
-            result = service.predict_trends(historical_data)
-            print(json.dumps(result))
+            return self.predict_trends(historical_data)
             
         elif command == 'health_check':
-            result = service.health_check()
-            print(json.dumps(result))
+            return self.health_check(deep='--deep' in args)
             
-        else:
-            print(json.dumps({'error': f'Unknown command: {command}'}))
-            sys.exit(1)
+        raise ValueError(f'Unknown command: {command}')
+
+    @staticmethod
+    def _option(args, name, default=None):
+        """Value following a '--name value' command line option"""
+        if name in args and args.index(name) + 1 < len(args):
+            return args[args.index(name) + 1]
+        return default
+
+# Commands that read a JSON payload from stdin
+STDIN_COMMANDS = {'enhance_recommendations', 'enhance_recommendations_batch', 'predict_trends'}
+
+def main():
+    """Main function to handle command line arguments"""
+    if len(sys.argv) < 2:
+        print(json.dumps({'error': 'No command provided'}))
+        sys.exit(1)
+    
+    command = sys.argv[1]
+    args = sys.argv[2:]
+    profile_startup = '--profile-startup' in args
+    if profile_startup:
+        args = [arg for arg in args if arg != '--profile-startup']
+    
+    imported_at = time.perf_counter()
+    service = MLIntegrationService()
+    initialised_at = time.perf_counter()
+    
+    try:
+        if command == 'serve':
+            from ml_server import serve
+            serve(service, args)
+            return
+        
+        input_data = json.loads(sys.stdin.read()) if command in STDIN_COMMANDS else {}
+        result = service.handle_command(command, input_data, args)
+        
+        if profile_startup and isinstance(result, dict):
+            finished_at = time.perf_counter()
+            result['startup_profile'] = {
+                'import_ms': round((imported_at - STARTED_AT) * 1000, 2),
+                'init_ms': round((initialised_at - imported_at) * 1000, 2),
+                'command_ms': round((finished_at - initialised_at) * 1000, 2),
+                'heavy_modules_loaded': [name for name in HEAVY_MODULES if name in sys.modules]
+            }
+        print(json.dumps(result))
             
     except Exception as e:
         print(json.dumps({'error': str(e)}))
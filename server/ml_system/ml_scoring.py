@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Score blending shared by live enhancement and the offline re-scoring job
+"""
+import math
+import logging
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+# Only the fields re-scoring reads are pulled from MongoDB
+RESCORE_FIELDS = {
+    'user': 1,
+    'updatedAt': 1,
+    'kcseResults.meanPoints': 1,
+    'kcseResults.subjects.subject': 1,
+    'kcseResults.subjects.grade': 1,
+    'recommendations.career': 1,
+    'recommendations.match': 1,
+    'recommendations.ruleMatch': 1
+}
+
+# Models of a re-scoring worker process, loaded once by the pool initializer
+_worker_models = None
+
+
+def combine_scores(original_score, cf_score, ap_score):
+    """Blend the rule-based match (0-100) with the CF score (0-1) and the academic prediction (0-100)"""
+    final_score = original_score
+
+    if cf_score is not None:
+        # Weight: 60% original, 40% collaborative filtering
+        final_score = 0.6 * original_score + 0.4 * (cf_score * 100)
+
+    if ap_score is not None:
+        # Further adjust with academic performance prediction
+        final_score = 0.7 * final_score + 0.3 * ap_score
+
+    return min(100, max(0, final_score))
+
+
+def rule_match(rec, default=0):
+    """The rule-based score of a stored recommendation; older documents only kept the blended match"""
+    score = rec.get('ruleMatch')
+    if score is None:
+        score = rec.get('match')
+    return default if score is None else score
+
+
+def score_documents(models, documents):
+    """Re-score stored recommendation documents with one model snapshot
+
+    Returns [(_id, updatedAt, [(position, mlScore, ruleMatch), ...])] for documents with recommendations.
+    """
+    documents = [doc for doc in documents if doc.get('recommendations')]
+
+    # Academic predictions do not depend on the career, so one column covers every recommendation
+    with_kcse = [idx for idx, doc in enumerate(documents) if (doc.get('kcseResults') or {}).get('subjects')]
+    ap_scores = {}
+    if with_kcse:
+        predictions = models.ap_model.predict_batch([documents[idx]['kcseResults'] for idx in with_kcse], [''])
+        if predictions is not None:
+            ap_scores = {idx: float(predictions[row, 0]) for row, idx in enumerate(with_kcse)
+                         if not math.isnan(predictions[row, 0])}
+
+    # A stored document's careers are also the student's training row, so rated careers are scored too
+    career_id_lists = [[str(rec.get('career', '')) for rec in doc['recommendations']] for doc in documents]
+    original_lists = [[rule_match(rec) for rec in doc['recommendations']] for doc in documents]
+    cf_scores = models.cf_model.score_careers_batch(
+        [str(doc.get('user', 'unknown')) for doc in documents],
+        career_id_lists,
+        [{career_id: original / 100.0 for career_id, original in zip(career_ids, originals)}
+         for career_ids, originals in zip(career_id_lists, original_lists)],
+        exclude_rated=False
+    )
+
+    updates = []
+    for idx, doc in enumerate(documents):
+        scores = [
+            (position, round(combine_scores(original, cf_scores[idx].get(career_id), ap_scores.get(idx)), 4), original)
+            for position, (career_id, original) in enumerate(zip(career_id_lists[idx], original_lists[idx]))
+        ]
+        updates.append((doc['_id'], doc.get('updatedAt'), scores))
+
+    return updates
+
+
+def _init_rescore_worker(expected_version):
+    global _worker_models
+    from ml_integration_service import MLIntegrationService
+
+    _worker_models = MLIntegrationService().ensure_models_loaded()
+    if _worker_models.version != expected_version:
+        raise RuntimeError(f"Worker loaded model version {_worker_models.version}, expected {expected_version}")
+
+
+def _score_chunk(documents):
+    return score_documents(_worker_models, documents)
+
+
+def score_chunks(models, chunks, n_jobs=1):
+    """Yield (chunk, updates) in input order, scoring up to 2 * n_jobs chunks ahead in a process pool"""
+    logger = logging.getLogger('MLScoring')
+
+    # Daemon processes (ML server workers) may not start a pool of their own
+    if n_jobs <= 1 or multiprocessing.current_process().daemon:
+        for chunk in chunks:
+            yield chunk, score_documents(models, chunk)
+        return
+
+    logger.info(f"Scoring with {n_jobs} worker processes")
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_rescore_worker,
+                             initargs=(models.version,)) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append((chunk, executor.submit(_score_chunk, chunk)))
+            if len(pending) >= 2 * n_jobs:
+                chunk, future = pending.popleft()
+                yield chunk, future.result()
+
+        while pending:
+            chunk, future = pending.popleft()
+            yield chunk, future.result()
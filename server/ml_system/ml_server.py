@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Long-running server mode for the ML integration service
+"""
+import os
+import sys
+import json
+import time
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from datetime import datetime
+
+from ml_batching import MicroBatcher
+from ml_wire import ResponseWriter, negotiate, read_frame, supported_formats
+from ml_worker_pool import InlineDispatcher, MLWorkerPool, PoolOverloaded
+
+
+class MLServer:
+    """Serve ML commands over stdio or a Unix socket as JSON lines, or msgpack frames after a hello"""
+
+    def __init__(self, service, dispatcher=None, batcher=None):
+        self.service = service
+        self.dispatcher = dispatcher or InlineDispatcher(service)
+        self.batcher = batcher
+        self.logger = logging.getLogger('MLServer')
+        self.started_at = time.time()
+        self.requests_handled = 0
+        self.requests_failed = 0
+        self.requests_rejected = 0
+        self._stats_lock = threading.Lock()
+
+    def _record(self, failed=False, rejected=False):
+        with self._stats_lock:
+            self.requests_handled += 1
+            if failed:
+                self.requests_failed += 1
+            if rejected:
+                self.requests_rejected += 1
+
+    def handle_message(self, message, respond):
+        """Run a single request message and pass its response to respond()"""
+        request_id = message.get('id')
+        command = message.get('command', '')
+
+        if command == 'stats':
+            self._record()
+            respond({'id': request_id, 'result': self.stats()})
+            return
+
+        if command == 'hello':
+            self._record()
+            self.handle_hello(request_id, message.get('data') or {}, respond)
+            return
+
+        data = message.get('data') or {}
+        if isinstance(data, dict) and data.get('budget_ms') is not None:
+            # Start the clock on arrival so time spent queued counts against the budget
+            data = dict(data, deadline=time.monotonic() + float(data['budget_ms']) / 1000.0)
+
+        try:
+            if command == 'enhance_recommendations' and self.batcher is not None:
+                future = self.batcher.submit(data)
+            else:
+                future = self.dispatcher.submit(command, data, message.get('args') or [])
+        except PoolOverloaded as e:
+            self._record(failed=True, rejected=True)
+            respond({'id': request_id, 'result': {'success': False, 'error': str(e), 'overloaded': True}})
+            return
+
+        def on_done(done):
+            try:
+                result = done.result()
+                failed = isinstance(result, dict) and 'error' in result and not result.get('success', False)
+            except PoolOverloaded as e:
+                # The batch this request joined was rejected by the worker pool
+                self._record(failed=True, rejected=True)
+                respond({'id': request_id, 'result': {'success': False, 'error': str(e), 'overloaded': True}})
+                return
+            except Exception as e:
+                self.logger.error(f"Error handling {command}: {str(e)}")
+                result = {'error': str(e)}
+                failed = True
+
+            self._record(failed=failed)
+            respond({'id': request_id, 'result': result})
+
+        future.add_done_callback(on_done)
+
+    def handle_hello(self, request_id, data, respond):
+        """Agree on a wire format; the reply still uses the old one, everything after it the new one"""
+        wire_format = negotiate(data.get('formats'))
+        response = {'id': request_id, 'result': {
+            'success': True,
+            'format': wire_format,
+            'formats': supported_formats()
+        }}
+
+        if hasattr(respond, 'switch'):
+            respond.switch(response, wire_format)
+        else:
+            respond(dict(response, result=dict(response['result'], format='json')))
+
+    def handle_line(self, line, respond):
+        """Decode one protocol line and dispatch it"""
+        try:
+            message = json.loads(line)
+        except ValueError as e:
+            respond({'id': None, 'result': {'error': f'Invalid request: {str(e)}'}})
+            return
+
+        if not isinstance(message, dict):
+            respond({'id': None, 'result': {'error': 'Request must be a JSON object'}})
+            return
+
+        self.handle_message(message, respond)
+
+    def stats(self):
+        """Report server-level counters"""
+        with self._stats_lock:
+            return {
+                'success': True,
+                'pid': os.getpid(),
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'requests_handled': self.requests_handled,
+                'requests_failed': self.requests_failed,
+                'requests_rejected': self.requests_rejected,
+                'dispatcher': self.dispatcher.stats(),
+                'batching': self.batcher.stats() if self.batcher is not None else None,
+                'timestamp': datetime.now().isoformat()
+            }
+
+    def serve_connection(self, rfile, wfile):
+        """Serve one client on binary streams: JSON lines until a hello switches the format"""
+        respond = ResponseWriter(wfile)
+
+        while True:
+            if respond.format == 'msgpack':
+                try:
+                    message = read_frame(rfile)
+                except Exception as e:
+                    # A broken frame leaves no way to find the next one
+                    self.logger.error(f"Invalid frame, closing connection: {str(e)}")
+                    respond({'id': None, 'result': {'error': f'Invalid frame: {str(e)}'}})
+                    break
+                if message is None:
+                    break
+                if isinstance(message, dict):
+                    self.handle_message(message, respond)
+                else:
+                    respond({'id': None, 'result': {'error': 'Request must be a map'}})
+            else:
+                raw_line = rfile.readline()
+                if not raw_line:
+                    break
+                line = raw_line.decode('utf-8').strip()
+                if line:
+                    self.handle_line(line, respond)
+
+    def serve_stdio(self, stdin=None, stdout=None):
+        """Serve requests read from stdin until EOF"""
+        self.logger.info(f"ML server listening on stdio (pid {os.getpid()})")
+        self.serve_connection(stdin or sys.stdin.buffer, stdout or sys.stdout.buffer)
+
+        self.logger.info("stdin closed, shutting down ML server")
+        self.shutdown()
+
+    def shutdown(self):
+        """Flush queued batches, then stop the dispatcher"""
+        if self.batcher is not None:
+            self.batcher.shutdown()
+        self.dispatcher.shutdown()
+
+    def serve_unix_socket(self, socket_path):
+        """Serve requests on a Unix domain socket, one thread per connection"""
+        server = self
+
+        class RequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                server.serve_connection(self.rfile, self.wfile)
+
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+        with socketserver.ThreadingUnixStreamServer(socket_path, RequestHandler) as unix_server:
+            unix_server.daemon_threads = True
+            self.logger.info(f"ML server listening on {socket_path} (pid {os.getpid()})")
+            try:
+                unix_server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                self.shutdown()
+                if os.path.exists(socket_path):
+                    os.unlink(socket_path)
+
+
+def parse_serve_args(argv):
+    """Parse arguments for the serve command"""
+    parser = argparse.ArgumentParser(prog='ml_integration_service.py serve')
+    parser.add_argument('--socket', dest='socket_path', default=None,
+                        help='Listen on this Unix socket instead of stdio')
+    parser.add_argument('--workers', default=os.getenv('ML_WORKERS', '1'),
+                        help="Number of pre-forked workers, or 'auto' for one per CPU core")
+    parser.add_argument('--queue-size', type=int, default=int(os.getenv('ML_QUEUE_SIZE', '64')),
+                        help='Maximum number of requests waiting for a worker')
+    parser.add_argument('--submit-timeout', type=float, default=0.0,
+                        help='Seconds to wait for queue space before rejecting a request')
+    parser.add_argument('--batch-window-ms', type=float, default=float(os.getenv('ML_BATCH_WINDOW_MS', '2')),
+                        help='Collect enhance_recommendations requests for this long into one batch (0 disables)')
+    parser.add_argument('--batch-max-size', type=int, default=int(os.getenv('ML_BATCH_MAX_SIZE', '32')),
+                        help='Dispatch a batch as soon as it holds this many requests')
+    return parser.parse_args(argv)
+
+
+def create_dispatcher(service, options):
+    """Pick the in-process dispatcher or a pre-forked worker pool"""
+    n_workers = (os.cpu_count() or 1) if options.workers == 'auto' else int(options.workers)
+
+    if n_workers <= 1:
+        return InlineDispatcher(service)
+
+    if not hasattr(os, 'fork'):
+        logging.getLogger('MLServer').warning("fork() is not available, serving from a single process")
+        return InlineDispatcher(service)
+
+    return MLWorkerPool(
+        service,
+        n_workers=n_workers,
+        queue_size=options.queue_size,
+        submit_timeout=options.submit_timeout
+    )
+
+
+def serve(service, argv):
+    """Entry point for the serve command"""
+    options = parse_serve_args(argv)
+
+    # Keep protocol output clean: anything else printed goes to stderr
+    protocol_stdout = sys.stdout
+    sys.stdout = sys.stderr
+
+    # Load models before forking so workers share them copy-on-write
+    service.ensure_models_loaded()
+    dispatcher = create_dispatcher(service, options)
+    batcher = None
+    if options.batch_window_ms > 0 and options.batch_max_size > 1:
+        batcher = MicroBatcher(dispatcher, window_ms=options.batch_window_ms, max_size=options.batch_max_size)
+    server = MLServer(service, dispatcher, batcher)
+
+    if options.socket_path:
+        if not hasattr(socket, 'AF_UNIX'):
+            raise RuntimeError('Unix sockets are not supported on this platform, use stdio')
+        server.serve_unix_socket(options.socket_path)
+    else:
+        server.serve_stdio(sys.stdin.buffer, protocol_stdout.buffer)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Wire formats of the ML server
+
+A connection starts with one JSON object per line. A client that sends
+{"command": "hello", "data": {"formats": ["msgpack", "json"]}} is answered in JSON
+with the first format both sides support; from then on every message in both
+directions uses it. msgpack messages are framed as a 4-byte big-endian length
+followed by the payload, so neither side has to scan for a delimiter.
+
+Run this module to compare JSON and msgpack encode/decode cost by payload size.
+"""
+import json
+import time
+import struct
+import random
+import logging
+import threading
+
+try:
+    import msgpack
+except ImportError:  # optional: the server then only speaks JSON lines
+    msgpack = None
+
+FRAME_HEADER = struct.Struct('>I')
+MAX_FRAME_SIZE = 256 * 1024 * 1024
+
+
+def supported_formats():
+    """Formats this process can speak, preferred first"""
+    return ['msgpack', 'json'] if msgpack is not None else ['json']
+
+
+def negotiate(requested):
+    """The first of the client's formats that is supported here; JSON if none match"""
+    supported = supported_formats()
+    for wire_format in requested or []:
+        if wire_format in supported:
+            return wire_format
+    return 'json'
+
+
+def encode_frame(message):
+    payload = msgpack.packb(message, use_bin_type=True)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    while size:
+        chunk = stream.read(size)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frame(stream):
+    """Read one length-prefixed msgpack message from a binary stream; None at end of stream"""
+    header = _read_exactly(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+
+    (size,) = FRAME_HEADER.unpack(header)
+    if size > MAX_FRAME_SIZE:
+        raise ValueError(f"Frame of {size} bytes exceeds the {MAX_FRAME_SIZE} byte limit")
+
+    payload = _read_exactly(stream, size)
+    if payload is None:
+        raise ValueError('Stream ended inside a frame')
+    return msgpack.unpackb(payload, raw=False)
+
+
+class ResponseWriter:
+    """Thread-safe writer of responses to a binary stream in the connection's current format"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.format = 'json'
+        self.logger = logging.getLogger('MLServer')
+        self._lock = threading.Lock()
+
+    def _encode(self, response):
+        if self.format == 'msgpack':
+            return encode_frame(response)
+        return (json.dumps(response) + '\n').encode('utf-8')
+
+    def _write(self, response):
+        try:
+            self.stream.write(self._encode(response))
+            self.stream.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            self.logger.warning("Client went away before the response was written")
+
+    def __call__(self, response):
+        with self._lock:
+            self._write(response)
+
+    def switch(self, response, wire_format):
+        """Write the handshake response in the current format, then use wire_format for everything after it"""
+        with self._lock:
+            self._write(response)
+            self.format = wire_format
+
+
+def _sample_payload(n_students, recommendations_per_student=20):
+    """A batched enhance_recommendations payload of the size the Node server sends"""
+    rng = random.Random(42)
+    subjects = ['Mathematics', 'English', 'Kiswahili', 'Physics', 'Chemistry', 'Biology', 'Geography']
+    return {'requests': [
+        {
+            'user': {
+                '_id': f"{rng.getrandbits(96):024x}",
+                'kcseResults': {
+                    'meanPoints': rng.randint(1, 12),
+                    'subjects': [{'subject': subject, 'grade': rng.choice('ABCDE')} for subject in subjects]
+                }
+            },
+            'recommendations': [
+                {
+                    'id': f"{rng.getrandbits(96):024x}",
+                    'title': f"Career {rng.randint(1, 500)}",
+                    'match': rng.randint(40, 99),
+                    'keySubjects': rng.sample(subjects, 3)
+                }
+                for _ in range(recommendations_per_student)
+            ]
+        }
+        for _ in range(n_students)
+    ]}
+
+
+def _time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best * 1000
+
+
+def benchmark(sizes=(1, 10, 100, 1000), repeat=5):
+    """Encode/decode time (ms, best of repeat) and size of JSON lines vs msgpack frames"""
+    rows = []
+    for n_students in sizes:
+        message = {'id': 1, 'command': 'enhance_recommendations_batch', 'data': _sample_payload(n_students)}
+        line = (json.dumps(message) + '\n').encode('utf-8')
+        row = {
+            'students': n_students,
+            'json_bytes': len(line),
+            'json_encode_ms': round(_time(lambda: (json.dumps(message) + '\n').encode('utf-8'), repeat), 3),
+            'json_decode_ms': round(_time(lambda: json.loads(line.decode('utf-8')), repeat), 3)
+        }
+        if msgpack is not None:
+            frame = encode_frame(message)
+            row.update({
+                'msgpack_bytes': len(frame),
+                'msgpack_encode_ms': round(_time(lambda: encode_frame(message), repeat), 3),
+                'msgpack_decode_ms': round(_time(lambda: msgpack.unpackb(frame[FRAME_HEADER.size:], raw=False), repeat), 3)
+            })
+        rows.append(row)
+    return rows
+
+
+if __name__ == '__main__':
+    if msgpack is None:
+        print('msgpack is not installed; only JSON timings are shown')
+    for row in benchmark():
+        print(json.dumps(row))
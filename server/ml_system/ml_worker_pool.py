@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Pre-forked worker pool for the ML server
+"""
+import os
+import time
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future
+
+
+class PoolOverloaded(Exception):
+    """Raised when the dispatch queue is full"""
+
+
+# Commands that spend most of their time in MongoDB
+BACKGROUND_COMMANDS = {'train_models', 'rescore_all'}
+
+
+def runs_in_background(command, args):
+    return command in BACKGROUND_COMMANDS or (command == 'health_check' and '--deep' in args)
+
+
+class InlineDispatcher:
+    """Run commands in the serving process; database-bound ones go to the data-access threads"""
+
+    def __init__(self, service):
+        self.service = service
+        self.background_submitted = 0
+
+    def submit(self, command, input_data, args):
+        """Run the command now and return a completed future, or hand a database-bound command to a thread"""
+        if runs_in_background(command, args):
+            self.background_submitted += 1
+            return self.service.data_access.submit(self.service.handle_command, command, input_data, args)
+
+        future = Future()
+        try:
+            future.set_result(self.service.handle_command(command, input_data, args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def stats(self):
+        return {'mode': 'inline', 'workers': 1, 'background_submitted': self.background_submitted}
+
+    def shutdown(self):
+        """Wait for background commands so their responses are written before exit"""
+        if self.background_submitted:
+            self.service.data_access.shutdown()
+
+
+def _worker_main(worker_index, service, task_queue, result_queue):
+    """Worker loop: take tasks from the shared queue until told to stop"""
+    logger = logging.getLogger(f'MLWorker-{worker_index}')
+
+    # A MongoClient must not be shared across fork; reconnect on first use
+    service.reset_database_connection()
+
+    while True:
+        task = task_queue.get()
+        if task is None:
+            break
+
+        dispatch_id, command, input_data, args = task
+        result_queue.put(('started', worker_index, os.getpid(), dispatch_id, None, 0.0))
+
+        started = time.perf_counter()
+        try:
+            result = ('ok', service.handle_command(command, input_data, args))
+        except Exception as e:
+            logger.error(f"Error handling {command}: {str(e)}")
+            result = ('error', str(e))
+        busy_seconds = time.perf_counter() - started
+
+        result_queue.put(('done', worker_index, os.getpid(), dispatch_id, result, busy_seconds))
+
+
+class MLWorkerPool:
+    """Supervisor for N pre-forked workers sharing the loaded models copy-on-write"""
+
+    def __init__(self, service, n_workers=None, queue_size=64, submit_timeout=0.0, check_interval=0.5):
+        self.service = service
+        self.n_workers = n_workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.submit_timeout = submit_timeout
+        self.check_interval = check_interval
+        self.logger = logging.getLogger('MLWorkerPool')
+
+        self._context = multiprocessing.get_context('fork')
+        self._task_queue = self._context.Queue(maxsize=queue_size)
+        self._result_queue = self._context.Queue()
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._next_id = 0
+        self._queued = 0
+        self._rejected = 0
+        self._running = True
+        self._stopping = False
+        self._stop_supervisor = threading.Event()
+        self._started_at = time.time()
+
+        self._workers = [None] * self.n_workers
+        self._worker_stats = [self._empty_worker_stats() for _ in range(self.n_workers)]
+
+        # Fork every worker before starting any supervisor thread
+        for worker_index in range(self.n_workers):
+            self._start_worker(worker_index)
+
+        self._collector = threading.Thread(target=self._collect_results, name='MLWorkerPoolCollector', daemon=True)
+        self._collector.start()
+        self._supervisor = threading.Thread(target=self._supervise, name='MLWorkerPoolSupervisor', daemon=True)
+        self._supervisor.start()
+
+        self.logger.info(f"Started {self.n_workers} ML workers (queue size {queue_size})")
+
+    def _empty_worker_stats(self):
+        return {
+            'pid': None,
+            'requests': 0,
+            'busy_seconds': 0.0,
+            'current': None,
+            'restarts': 0,
+            'started_at': time.time()
+        }
+
+    def _start_worker(self, worker_index):
+        process = self._context.Process(
+            target=_worker_main,
+            args=(worker_index, self.service, self._task_queue, self._result_queue),
+            name=f'MLWorker-{worker_index}',
+            daemon=True
+        )
+        process.start()
+
+        self._workers[worker_index] = process
+        stats = self._worker_stats[worker_index]
+        stats['pid'] = process.pid
+        stats['started_at'] = time.time()
+
+    def submit(self, command, input_data, args):
+        """Queue a command for the next free worker, rejecting it when the queue is full"""
+        future = Future()
+
+        # Counted before the put: a worker may report 'started' before put() returns
+        with self._lock:
+            self._next_id += 1
+            dispatch_id = self._next_id
+            self._pending[dispatch_id] = future
+            self._queued += 1
+
+        try:
+            self._task_queue.put(
+                (dispatch_id, command, input_data, args),
+                block=self.submit_timeout > 0,
+                timeout=self.submit_timeout or None
+            )
+        except queue.Full:
+            with self._lock:
+                self._pending.pop(dispatch_id, None)
+                self._queued -= 1
+                self._rejected += 1
+            raise PoolOverloaded(f'ML service overloaded: {self.queue_size} requests already queued')
+
+        return future
+
+    def _collect_results(self):
+        """Resolve futures as workers report back"""
+        while self._running:
+            try:
+                event, worker_index, pid, dispatch_id, result, busy_seconds = self._result_queue.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                break
+
+            with self._lock:
+                stats = self._worker_stats[worker_index]
+                # Reports of a worker that has since been replaced
+                replaced = stats['pid'] != pid
+
+                if event == 'started':
+                    self._queued = max(0, self._queued - 1)
+                    if not replaced:
+                        stats['current'] = dispatch_id
+                        continue
+                    # The worker died before this report was read; its request died with it
+                    future = self._pending.pop(dispatch_id, None)
+                    result = ('error', 'ML worker died while handling the request')
+                else:
+                    if not replaced:
+                        stats['current'] = None
+                        stats['requests'] += 1
+                        stats['busy_seconds'] += busy_seconds
+                    future = self._pending.pop(dispatch_id, None)
+
+            if future is None:
+                continue
+
+            status, value = result
+            if status == 'ok':
+                future.set_result(value)
+            else:
+                future.set_exception(RuntimeError(value))
+
+    def _supervise(self):
+        """Check worker liveness every check_interval seconds, independent of result traffic"""
+        while not self._stop_supervisor.wait(self.check_interval):
+            self._check_workers()
+
+    def _check_workers(self):
+        for worker_index, process in enumerate(self._workers):
+            if self._stopping or process.is_alive():
+                continue
+
+            self.logger.error(f"ML worker {worker_index} (pid {process.pid}) died with code {process.exitcode}, restarting")
+
+            # Fork while holding the pool lock, so no other pool thread is inside a critical
+            # section the child would inherit half-done
+            with self._lock:
+                stats = self._worker_stats[worker_index]
+                dispatch_id = stats['current']
+                stats['current'] = None
+                stats['restarts'] += 1
+                future = self._pending.pop(dispatch_id, None) if dispatch_id is not None else None
+                self._start_worker(worker_index)
+
+            if future is not None:
+                future.set_exception(RuntimeError('ML worker died while handling the request'))
+
+    def stats(self):
+        """Report queue depth and per-worker utilisation"""
+        now = time.time()
+        with self._lock:
+            workers = []
+            for worker_index, stats in enumerate(self._worker_stats):
+                lifetime = max(now - stats['started_at'], 1e-9)
+                workers.append({
+                    'worker': worker_index,
+                    'pid': stats['pid'],
+                    'busy': stats['current'] is not None,
+                    'requests': stats['requests'],
+                    'busy_seconds': round(stats['busy_seconds'], 3),
+                    'utilisation': round(min(1.0, stats['busy_seconds'] / lifetime), 4),
+                    'restarts': stats['restarts']
+                })
+
+            return {
+                'mode': 'prefork',
+                'workers': self.n_workers,
+                'queue_size': self.queue_size,
+                'queue_depth': self._queued,
+                'in_flight': len(self._pending),
+                'rejected': self._rejected,
+                'uptime_seconds': round(now - self._started_at, 3),
+                'worker_stats': workers
+            }
+
+    def shutdown(self, timeout=30):
+        """Stop the workers once the queued requests have been answered"""
+        self._stopping = True
+        self._stop_supervisor.set()
+        self._supervisor.join()
+        for _ in self._workers:
+            self._task_queue.put(None)
+
+        deadline = time.time() + timeout
+        for process in self._workers:
+            process.join(timeout=max(0.0, deadline - time.time()))
+            if process.is_alive():
+                process.terminate()
+
+        # Let the collector deliver results the workers already reported
+        while self._pending and time.time() < deadline and self._collector.is_alive():
+            time.sleep(0.01)
+        self._running = False
+        self._collector.join(timeout=2)
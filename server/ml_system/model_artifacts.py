@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Directory-based model artifacts: memory-mapped arrays, lazily loaded estimators and a JSON manifest
+
+    <artifact_dir>/CURRENT                      name of the live version
+    <artifact_dir>/versions/<version>/manifest.json
+    <artifact_dir>/versions/<version>/*.npy     loaded with mmap_mode='r'
+    <artifact_dir>/versions/<version>/*.joblib  loaded on first use
+"""
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+from collections.abc import Mapping
+from datetime import datetime
+
+import numpy as np
+
+ARTIFACT_FORMAT = 1
+CURRENT_FILE = 'CURRENT'
+MANIFEST_FILE = 'manifest.json'
+VERSIONS_DIR = 'versions'
+KEEP_VERSIONS = int(os.getenv('ML_KEEP_MODEL_VERSIONS', '3'))
+
+
+def sha256_file(file_obj, chunk_size=1024 * 1024):
+    """Hash an open binary file from the start and rewind it"""
+    digest = hashlib.sha256()
+    file_obj.seek(0)
+    for chunk in iter(lambda: file_obj.read(chunk_size), b''):
+        digest.update(chunk)
+    file_obj.seek(0)
+    return digest.hexdigest()
+
+
+def current_file(artifact_dir):
+    return os.path.join(artifact_dir, CURRENT_FILE)
+
+
+def artifact_exists(artifact_dir):
+    return os.path.exists(current_file(artifact_dir))
+
+
+class ArtifactWriter:
+    """Write a new artifact version next to the live one and publish it with an atomic pointer swap"""
+
+    def __init__(self, artifact_dir, kind):
+        self.artifact_dir = artifact_dir
+        self.versions_dir = os.path.join(artifact_dir, VERSIONS_DIR)
+        os.makedirs(self.versions_dir, exist_ok=True)
+
+        self.temp_dir = os.path.join(self.versions_dir, f".tmp-{os.getpid()}-{time.time_ns()}")
+        os.makedirs(self.temp_dir)
+        self.manifest = {
+            'format': ARTIFACT_FORMAT,
+            'kind': kind,
+            'arrays': {},
+            'sparse': {},
+            'estimators': {},
+            'metadata': {}
+        }
+        self._digest = hashlib.sha256()
+
+    def _hash_file(self, file_name):
+        with open(os.path.join(self.temp_dir, file_name), 'rb') as f:
+            self._digest.update(f"{file_name}:{sha256_file(f)};".encode('utf-8'))
+
+    def add_array(self, name, array):
+        """Store a dense array as .npy so readers can memory-map it"""
+        array = np.ascontiguousarray(array)
+        file_name = f"{name}.npy"
+        np.save(os.path.join(self.temp_dir, file_name), array, allow_pickle=False)
+        self._hash_file(file_name)
+        self.manifest['arrays'][name] = {
+            'file': file_name,
+            'dtype': array.dtype.str,
+            'shape': list(array.shape)
+        }
+
+    def add_sparse(self, name, matrix):
+        """Store a sparse matrix as its three CSR arrays"""
+        matrix = matrix.tocsr()
+        for part in ('data', 'indices', 'indptr'):
+            self.add_array(f"{name}.{part}", getattr(matrix, part))
+        self.manifest['sparse'][name] = {'format': 'csr', 'shape': list(matrix.shape)}
+
+    def add_estimator(self, name, estimator):
+        """Store a fitted estimator in its own file so it can be loaded on its own"""
+        import joblib
+
+        file_name = f"{name}.joblib"
+        joblib.dump(estimator, os.path.join(self.temp_dir, file_name))
+        self._hash_file(file_name)
+        self.manifest['estimators'][name] = {'file': file_name}
+
+    def set_metadata(self, **metadata):
+        self.manifest['metadata'].update(metadata)
+
+    def commit(self):
+        """Finalise the version directory, point CURRENT at it and prune old versions"""
+        try:
+            metadata = json.dumps(self.manifest['metadata'], sort_keys=True)
+            self._digest.update(metadata.encode('utf-8'))
+            content_hash = self._digest.hexdigest()
+
+            version = f"{datetime.now().strftime('%Y%m%d%H%M%S')}-{content_hash[:12]}"
+            self.manifest['version'] = version
+            self.manifest['content_hash'] = content_hash
+            self.manifest['created_at'] = datetime.now().isoformat()
+
+            with open(os.path.join(self.temp_dir, MANIFEST_FILE), 'w') as f:
+                json.dump(self.manifest, f, indent=2)
+
+            version_dir = os.path.join(self.versions_dir, version)
+            if os.path.exists(version_dir):
+                # Identical content written within the same second
+                shutil.rmtree(self.temp_dir)
+            else:
+                os.rename(self.temp_dir, version_dir)
+
+            pointer = current_file(self.artifact_dir)
+            temp_pointer = f"{pointer}.{os.getpid()}.tmp"
+            with open(temp_pointer, 'w') as f:
+                f.write(version)
+            os.replace(temp_pointer, pointer)
+        except Exception:
+            shutil.rmtree(self.temp_dir, ignore_errors=True)
+            raise
+
+        self.prune(keep=version)
+        return version
+
+    def prune(self, keep):
+        """Remove all but the newest KEEP_VERSIONS versions; processes still mapping them keep their pages"""
+        versions = sorted(
+            (entry for entry in os.listdir(self.versions_dir) if not entry.startswith('.')),
+            reverse=True
+        )
+        for version in versions[KEEP_VERSIONS:]:
+            if version != keep:
+                shutil.rmtree(os.path.join(self.versions_dir, version), ignore_errors=True)
+
+
+class ArtifactReader:
+    """Read one immutable artifact version"""
+
+    def __init__(self, version_dir, mmap_mode='r'):
+        self.version_dir = version_dir
+        self.mmap_mode = mmap_mode
+        with open(os.path.join(version_dir, MANIFEST_FILE)) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest.get('format') != ARTIFACT_FORMAT:
+            raise ValueError(f"Unsupported model artifact format: {self.manifest.get('format')}")
+
+        self.version = self.manifest['version']
+        self.content_hash = self.manifest['content_hash']
+        self.metadata = self.manifest.get('metadata', {})
+
+    @classmethod
+    def open_current(cls, artifact_dir, mmap_mode='r'):
+        """Open the version CURRENT points at"""
+        with open(current_file(artifact_dir)) as f:
+            version = f.read().strip()
+        return cls(os.path.join(artifact_dir, VERSIONS_DIR, version), mmap_mode=mmap_mode)
+
+    def has(self, name):
+        return name in self.manifest['arrays'] or name in self.manifest['sparse'] or name in self.manifest['estimators']
+
+    def array(self, name, default=None):
+        """Memory-map a stored array"""
+        entry = self.manifest['arrays'].get(name)
+        if entry is None:
+            return default
+        array = np.load(os.path.join(self.version_dir, entry['file']), mmap_mode=self.mmap_mode, allow_pickle=False)
+        # A plain ndarray view of the mapping: same pages, much cheaper to index than np.memmap
+        return np.asarray(array)
+
+    def sparse(self, name, default=None):
+        """Rebuild a CSR matrix on top of its memory-mapped arrays"""
+        from scipy import sparse
+
+        entry = self.manifest['sparse'].get(name)
+        if entry is None:
+            return default
+        parts = [self.array(f"{name}.{part}") for part in ('data', 'indices', 'indptr')]
+        return sparse.csr_matrix(tuple(parts), shape=tuple(entry['shape']), copy=False)
+
+    def estimator(self, name, default=None):
+        import joblib
+
+        entry = self.manifest['estimators'].get(name)
+        if entry is None:
+            return default
+        return joblib.load(os.path.join(self.version_dir, entry['file']))
+
+    def estimators(self, prefix):
+        """Lazy name -> estimator mapping for the estimators stored as '<prefix>.<name>'"""
+        keys = {
+            key[len(prefix) + 1:]: key
+            for key in self.manifest['estimators'] if key.startswith(f"{prefix}.")
+        }
+        return LazyEstimators(self, keys)
+
+
+class LazyEstimators(Mapping):
+    """Read-only mapping that loads each estimator the first time it is looked up"""
+
+    def __init__(self, reader, keys):
+        self._reader = reader
+        self._keys = keys
+        self._loaded = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name):
+        if name not in self._keys:
+            raise KeyError(name)
+
+        estimator = self._loaded.get(name)
+        if estimator is None:
+            with self._lock:
+                estimator = self._loaded.get(name)
+                if estimator is None:
+                    estimator = self._reader.estimator(self._keys[name])
+                    self._loaded[name] = estimator
+        return estimator
+
+    def __contains__(self, name):
+        return name in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def loaded(self):
+        """Names of the estimators read from disk so far"""
+        return list(self._loaded)
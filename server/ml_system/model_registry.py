@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Versioned, hot-reloadable registry of the trained ML models
+"""
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from model_artifacts import ArtifactReader, artifact_exists, current_file, sha256_file
+
+# An immutable set of models; requests hold on to the snapshot they started with
+ModelSnapshot = namedtuple('ModelSnapshot', ['version', 'cf_model', 'ap_model', 'files', 'loaded_at'])
+
+
+def file_signature(path):
+    """Cheap change detector for a model file: (inode, size, mtime), or None if it is missing"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class ModelRegistry:
+    """Load each model artifact once and swap in new versions when retraining publishes them
+
+    Artifact directories are watched through their CURRENT pointer; legacy single-file
+    pickles are still picked up when no artifact directory exists.
+    """
+
+    def __init__(self, model_path, cf_factory, ap_factory, check_interval=None):
+        self.model_path = model_path
+        self.check_interval = float(os.getenv('ML_MODEL_CHECK_INTERVAL', '2.0')) if check_interval is None else check_interval
+        self.logger = logging.getLogger('ModelRegistry')
+
+        self.sources = {
+            'cf': (os.path.join(model_path, 'collaborative_filtering'),
+                   os.path.join(model_path, 'collaborative_filtering_model.pkl'), 'load_model'),
+            'ap': (os.path.join(model_path, 'academic_performance'),
+                   os.path.join(model_path, 'academic_performance_models.pkl'), 'load_models')
+        }
+        self.factories = {'cf': cf_factory, 'ap': ap_factory}
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._next_check = 0.0
+        self.reloads = 0
+
+    def current(self):
+        """Return the current snapshot, picking up new model files at most every check_interval seconds"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() < self._next_check:
+            return snapshot
+
+        with self._lock:
+            if self._snapshot is None or time.monotonic() >= self._next_check:
+                self._refresh()
+                self._next_check = time.monotonic() + self.check_interval
+            return self._snapshot
+
+    def peek(self):
+        """The current snapshot, or None if no models have been loaded yet; never touches disk"""
+        return self._snapshot
+
+    def refresh(self):
+        """Check the model files now and reload whatever changed"""
+        with self._lock:
+            self._refresh()
+            self._next_check = time.monotonic() + self.check_interval
+            return self._snapshot
+
+    def publish(self, cf_model=None, ap_model=None):
+        """Install freshly trained in-memory models whose files were just saved"""
+        with self._lock:
+            previous = self._snapshot
+            files = dict(previous.files) if previous else {}
+            models = {
+                'cf': previous.cf_model if previous else None,
+                'ap': previous.ap_model if previous else None
+            }
+
+            for key, model in (('cf', cf_model), ('ap', ap_model)):
+                if model is None:
+                    continue
+                try:
+                    source, files[key] = self._fingerprint(key)
+                    if not isinstance(source, ArtifactReader):
+                        source.close()
+                except (OSError, ValueError):
+                    files[key] = None
+                models[key] = model
+
+            self._install(models, files)
+            return self._snapshot
+
+    def has_model(self, key):
+        """Whether a saved model exists on disk for 'cf' or 'ap'"""
+        artifact_dir, legacy_file, _ = self.sources[key]
+        return artifact_exists(artifact_dir) or os.path.exists(legacy_file)
+
+    def _watched_path(self, key):
+        artifact_dir, legacy_file, _ = self.sources[key]
+        return current_file(artifact_dir) if artifact_exists(artifact_dir) else legacy_file
+
+    def _refresh(self):
+        previous = self._snapshot
+        files = dict(previous.files) if previous else {}
+        models = {
+            'cf': previous.cf_model if previous else None,
+            'ap': previous.ap_model if previous else None
+        }
+        changed = previous is None
+
+        for key in ('cf', 'ap'):
+            known = files.get(key)
+            signature = file_signature(self._watched_path(key))
+            if previous is not None and signature == (known['signature'] if known else None):
+                continue
+
+            model, fingerprint = self._load(key)
+            if model is None:
+                # Keep serving the previous version if the new files cannot be read
+                if previous is not None and models[key] is not None:
+                    continue
+                model = self.factories[key]()
+
+            models[key] = model
+            files[key] = fingerprint
+            changed = True
+
+        if changed:
+            self._install(models, files)
+
+    def _load(self, key):
+        """Load one model; the fingerprint always describes exactly what was loaded"""
+        _, _, loader = self.sources[key]
+        model = self.factories[key]()
+        try:
+            source, fingerprint = self._fingerprint(key)
+            if isinstance(source, ArtifactReader):
+                loaded = getattr(model, loader)(artifact=source)
+            else:
+                with source:
+                    loaded = getattr(model, loader)(source)
+            return (model, fingerprint) if loaded else (None, None)
+        except FileNotFoundError:
+            return None, None
+        except Exception as e:
+            self.logger.error(f"Error loading {key} model: {str(e)}")
+            return None, None
+
+    def _fingerprint(self, key):
+        """Open the current source of a model and describe it
+
+        Returns (source, fingerprint) where source is an ArtifactReader for artifact
+        directories, or an open legacy pickle whose bytes were hashed.
+        """
+        artifact_dir, legacy_file, _ = self.sources[key]
+
+        if artifact_exists(artifact_dir):
+            pointer = current_file(artifact_dir)
+            signature = file_signature(pointer)
+            reader = ArtifactReader.open_current(artifact_dir)
+            return reader, {
+                'path': reader.version_dir,
+                'signature': signature,
+                'mtime': datetime.fromtimestamp(signature[2] / 1e9).isoformat(),
+                'version': reader.version,
+                'content_hash': reader.content_hash
+            }
+
+        model_file = open(legacy_file, 'rb')
+        stat = os.fstat(model_file.fileno())
+        content_hash = sha256_file(model_file)
+        return model_file, {
+            'path': legacy_file,
+            'signature': (stat.st_ino, stat.st_size, stat.st_mtime_ns),
+            'mtime': datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            'version': f"legacy-{content_hash[:12]}",
+            'content_hash': content_hash
+        }
+
+    def _install(self, models, files):
+        digest = hashlib.sha256()
+        for key in ('cf', 'ap'):
+            fingerprint = files.get(key)
+            digest.update(f"{key}:{fingerprint['content_hash'] if fingerprint else 'none'};".encode('utf-8'))
+        version = digest.hexdigest()[:16]
+
+        previous = self._snapshot
+        self._snapshot = ModelSnapshot(
+            version=version,
+            cf_model=models['cf'] if models['cf'] is not None else self.factories['cf'](),
+            ap_model=models['ap'] if models['ap'] is not None else self.factories['ap'](),
+            files=files,
+            loaded_at=datetime.now().isoformat()
+        )
+
+        if previous is None or previous.version != version:
+            self.reloads += 1
+            self.logger.info(f"Serving model version {version}")
+
+    def describe(self):
+        """Report the version and source files of the current snapshot"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {'version': None, 'loaded': False}
+
+        return {
+            'version': snapshot.version,
+            'loaded': True,
+            'loaded_at': snapshot.loaded_at,
+            'reloads': self.reloads,
+            'files': {
+                key: {'version': fingerprint['version'], 'mtime': fingerprint['mtime']} if fingerprint else None
+                for key, fingerprint in snapshot.files.items()
+            }
+        }
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Pluggable cosine similarity search over embedding vectors or sparse rating rows
+"""
+import json
+import time
+import numpy as np
+from scipy import sparse
+
+
+def normalize_rows(vectors):
+    """L2-normalise rows, leaving all-zero rows as zeros; sparse input stays sparse"""
+    if sparse.issparse(vectors):
+        vectors = sparse.csr_matrix(vectors, dtype=np.float32)
+        norms = np.sqrt(np.asarray(vectors.multiply(vectors).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        return sparse.csr_matrix(sparse.diags(1.0 / norms).astype(np.float32) @ vectors)
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _as_query(vector):
+    """One normalised query row, sparse if the vector is"""
+    if sparse.issparse(vector):
+        return normalize_rows(vector[:1])
+    return normalize_rows(np.atleast_2d(vector))[0]
+
+
+def _dense(matrix):
+    return matrix.toarray() if sparse.issparse(matrix) else np.asarray(matrix)
+
+
+def _row_dots(vectors, left, right):
+    """Dot products of the row pairs (left[i], right[i])"""
+    if sparse.issparse(vectors):
+        return np.asarray(vectors[left].multiply(vectors[right]).sum(axis=1), dtype=np.float32).ravel()
+    return np.einsum('ij,ij->i', vectors[left], vectors[right])
+
+
+def top_k(candidates, scores, k):
+    """Return the k best (index, score) pairs, best first"""
+    if len(candidates) > k:
+        top = np.argpartition(-scores, k - 1)[:k]
+        candidates, scores = candidates[top], scores[top]
+    order = np.argsort(-scores, kind='stable')
+    return candidates[order], scores[order]
+
+
+def top_k_rows(similarities, k):
+    """Row-wise top k of a similarity block, best first and ties by index"""
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+    top_similarities = np.take_along_axis(similarities, top, axis=1)
+    order = np.lexsort((top, -top_similarities), axis=1)
+    return np.take_along_axis(top, order, axis=1), np.take_along_axis(top_similarities, order, axis=1)
+
+
+class ExactSearchIndex:
+    """Brute-force cosine search, used as the ground truth for other backends"""
+
+    name = 'exact'
+
+    def __init__(self):
+        self.vectors = None
+
+    def build(self, vectors):
+        """Index the given row vectors"""
+        self.vectors = normalize_rows(vectors)
+        return self
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def query(self, vector, k=10, exclude=None):
+        """Return (indices, similarities) of the k rows most similar to vector"""
+        query = _as_query(vector)
+        scores = _dense(self.vectors @ query.T).ravel() if sparse.issparse(query) else self.vectors @ query
+        candidates = np.arange(len(scores))
+
+        if exclude is not None:
+            keep = candidates != exclude
+            candidates, scores = candidates[keep], scores[keep]
+
+        return top_k(candidates, scores, k)
+
+    def query_rows(self, rows, k=10):
+        """Return (indices, similarities), one row of k per indexed row, never matching itself"""
+        rows = np.asarray(rows)
+        similarities = _dense(self.vectors[rows] @ self.vectors.T).astype(np.float32)
+        similarities[np.arange(len(rows)), rows] = -np.inf
+        return top_k_rows(similarities, k)
+
+
+class RandomProjectionLSHIndex:
+    """Random-hyperplane LSH with multi-probe lookups and exact re-ranking of the candidates"""
+
+    name = 'lsh'
+
+    def __init__(self, n_tables=8, n_bits=None, n_probes=2, random_state=42):
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.n_probes = n_probes
+        self.random_state = random_state
+        self.vectors = None
+        self.center = None
+        self.planes = None
+        self.sorted_codes = []
+        self.sorted_indices = []
+
+    def build(self, vectors):
+        """Hash every row into n_tables tables of sorted bucket codes"""
+        self.vectors = normalize_rows(vectors)
+        n_rows, n_dims = self.vectors.shape
+
+        # Aim for buckets of roughly 64 rows unless told otherwise
+        n_bits = self.n_bits or int(np.clip(np.round(np.log2(max(n_rows, 1) / 64.0)), 2, 16))
+        rng = np.random.default_rng(self.random_state)
+        self.planes = rng.standard_normal((self.n_tables, n_dims, n_bits)).astype(np.float32)
+        self._powers = (1 << np.arange(n_bits)).astype(np.int64)
+
+        # NMF factors and ratings are non-negative and bunch up in one orthant;
+        # hashing around their mean keeps the buckets balanced
+        self.center = np.asarray(self.vectors.mean(axis=0), dtype=np.float32).ravel() if n_rows \
+            else np.zeros(n_dims, dtype=np.float32)
+
+        self.sorted_codes = []
+        self.sorted_indices = []
+        for table in range(self.n_tables):
+            codes = (self._project(self.vectors, table) > 0).astype(np.int64) @ self._powers
+            order = np.argsort(codes, kind='stable')
+            self.sorted_codes.append(codes[order])
+            self.sorted_indices.append(order.astype(np.int32))
+
+        return self
+
+    def __len__(self):
+        return 0 if self.vectors is None else self.vectors.shape[0]
+
+    def _project(self, vectors, table):
+        """(vectors - center) @ planes, without densifying sparse rows"""
+        return _dense(vectors @ self.planes[table]) - self.center @ self.planes[table]
+
+    def _probe_codes(self, vectors, table):
+        """Bucket codes to probe for each row: its own bucket, then those across the closest hyperplanes"""
+        projections = self._project(vectors, table)
+        codes = (projections > 0).astype(np.int64) @ self._powers
+        closest = np.argsort(np.abs(projections), axis=1)[:, :self.n_probes]
+        return np.column_stack([codes[:, None], codes[:, None] ^ self._powers[closest]])
+
+    def _candidate_pairs(self, vectors):
+        """(query row, indexed row) pairs that share a probed bucket in any table"""
+        queries, members = [], []
+        for table in range(self.n_tables):
+            probes = self._probe_codes(vectors, table)
+            codes = self.sorted_codes[table]
+            starts = np.searchsorted(codes, probes, side='left').ravel()
+            lengths = np.searchsorted(codes, probes, side='right').ravel() - starts
+
+            # Expand every probed bucket into its members
+            ends = np.cumsum(lengths)
+            positions = np.arange(ends[-1] if len(ends) else 0) - np.repeat(ends - lengths - starts, lengths)
+            queries.append(np.repeat(np.arange(len(lengths)) // probes.shape[1], lengths))
+            members.append(self.sorted_indices[table][positions])
+
+        # Sorted by query row, then indexed row, without duplicates
+        pairs = np.sort(np.concatenate(queries).astype(np.int64) * len(self) + np.concatenate(members))
+        pairs = pairs[np.concatenate([[True], pairs[1:] != pairs[:-1]])]
+        return pairs // len(self), pairs % len(self)
+
+    def query(self, vector, k=10, exclude=None):
+        """Return (indices, similarities) of approximately the k most similar rows"""
+        query = _as_query(vector)
+        _, candidates = self._candidate_pairs(query if sparse.issparse(query) else query[None, :])
+
+        if exclude is not None:
+            candidates = candidates[candidates != exclude]
+
+        # Too few candidates to fill k: fall back to a full scan
+        if len(candidates) < k:
+            candidates = np.arange(len(self))
+            if exclude is not None:
+                candidates = candidates[candidates != exclude]
+
+        scores = _dense(self.vectors[candidates] @ query.T).ravel() if sparse.issparse(query) \
+            else self.vectors[candidates] @ query
+        return top_k(candidates, scores, k)
+
+    def query_rows(self, rows, k=10):
+        """query() for several indexed rows at once, re-ranking only the candidate pairs
+
+        Rows with fewer than k candidates are searched exhaustively.
+        """
+        rows = np.asarray(rows)
+        queries, members = self._candidate_pairs(self.vectors[rows])
+        keep = members != rows[queries]
+        queries, members = queries[keep], members[keep]
+        similarities = _row_dots(self.vectors, rows[queries], members)
+
+        # Per query row: best first, ties by index as the pairs are sorted by it.
+        # Cosine similarities lie in [-1, 1], so one float key orders both.
+        order = np.argsort(queries * 4.0 - similarities, kind='stable')
+        queries, members, similarities = queries[order], members[order], similarities[order]
+        counts = np.bincount(queries, minlength=len(rows))
+        rank = np.arange(len(queries)) - np.repeat(np.cumsum(counts) - counts, counts)
+        top = rank < k
+
+        neighbours = np.zeros((len(rows), k), dtype=np.int64)
+        neighbour_similarities = np.zeros((len(rows), k), dtype=np.float32)
+        neighbours[queries[top], rank[top]] = members[top]
+        neighbour_similarities[queries[top], rank[top]] = similarities[top]
+
+        short = np.flatnonzero(counts < k)
+        if len(short):
+            similarities = _dense(self.vectors[rows[short]] @ self.vectors.T).astype(np.float32)
+            similarities[np.arange(len(short)), rows[short]] = -np.inf
+            neighbours[short], neighbour_similarities[short] = top_k_rows(similarities, k)
+
+        return neighbours, neighbour_similarities
+
+
+SEARCH_BACKENDS = {
+    'exact': ExactSearchIndex,
+    'lsh': RandomProjectionLSHIndex
+}
+
+
+def create_search_index(backend='exact', **options):
+    """Create an empty search index for the named backend"""
+    if backend not in SEARCH_BACKENDS:
+        raise ValueError(f"Unknown similarity search backend: {backend}")
+    return SEARCH_BACKENDS[backend](**options)
+
+
+def benchmark_search_backends(vectors, k=10, n_queries=200, backends=None, random_state=0, all_rows=False):
+    """Measure recall@k against exact search and mean/p95 query latency for each backend
+
+    A result counts towards recall when it is at least as similar as the exact k-th result, so
+    ties at the cut-off are not counted as misses.
+
+    With all_rows, also times query_rows over every row in blocks of 256, as for the user neighbour lists.
+    """
+    backends = backends or list(SEARCH_BACKENDS)
+    rng = np.random.default_rng(random_state)
+    n_vectors = vectors.shape[0]
+    query_rows = rng.choice(n_vectors, size=min(n_queries, n_vectors), replace=False)
+
+    exact = ExactSearchIndex().build(vectors)
+    # The k-th best similarity of every query row
+    truth = {row: exact.query(vectors[row], k, exclude=row)[1][-1] for row in query_rows}
+
+    results = []
+    for backend in backends:
+        started = time.perf_counter()
+        index = create_search_index(backend).build(vectors)
+        build_seconds = time.perf_counter() - started
+
+        latencies = []
+        recalls = []
+        for row in query_rows:
+            started = time.perf_counter()
+            _, similarities = index.query(vectors[row], k, exclude=row)
+            latencies.append(time.perf_counter() - started)
+            recalls.append(np.sum(similarities >= truth[row] - 1e-6) / k)
+
+        latencies_ms = np.array(latencies) * 1000
+        result = {
+            'backend': backend,
+            'n_vectors': n_vectors,
+            'k': k,
+            'build_seconds': round(build_seconds, 4),
+            'recall_at_k': round(float(np.mean(recalls)), 4),
+            'mean_latency_ms': round(float(latencies_ms.mean()), 4),
+            'p95_latency_ms': round(float(np.percentile(latencies_ms, 95)), 4)
+        }
+
+        if all_rows:
+            started = time.perf_counter()
+            for start in range(0, n_vectors, 256):
+                index.query_rows(np.arange(start, min(start + 256, n_vectors)), k)
+            result['all_rows_seconds'] = round(time.perf_counter() - started, 4)
+
+        results.append(result)
+
+    return results
+
+
+def synthetic_ratings(n_users, n_careers=500, per_user=6, n_groups=50, random_state=42):
+    """Sparse user-career ratings where users in the same interest group pick from the same careers"""
+    rng = np.random.default_rng(random_state)
+    group_careers = rng.integers(0, n_careers, size=(n_groups, 4 * per_user))
+    groups = rng.integers(0, n_groups, size=n_users)
+    cols = np.take_along_axis(
+        group_careers[groups], rng.integers(0, 4 * per_user, size=(n_users, per_user)), axis=1
+    ).ravel()
+    rows = np.repeat(np.arange(n_users), per_user)
+    ratings = rng.integers(40, 100, size=n_users * per_user) / 100.0
+    matrix = sparse.csr_matrix((ratings, (rows, cols)), shape=(n_users, n_careers), dtype=np.float32)
+    matrix.sum_duplicates()
+    return matrix
+
+
+if __name__ == "__main__":
+    # Benchmark on synthetic non-negative embeddings shaped like NMF user factors,
+    # and on sparse rating rows as searched for user neighbours
+    rng = np.random.default_rng(42)
+    for n_vectors in (10000, 100000, 1000000):
+        embeddings = rng.gamma(0.5, 1.0, size=(n_vectors, 10)).astype(np.float32)
+        for result in benchmark_search_backends(embeddings):
+            print(json.dumps({'vectors': 'embeddings', **result}))
+    for n_users in (10000, 100000):
+        for result in benchmark_search_backends(synthetic_ratings(n_users), k=50, all_rows=True):
+            print(json.dumps({'vectors': 'ratings', **result}))
@@ -0,0 +1,57 @@
+import os
+import sys
+import shutil
+
+import pytest
+
+# The ML modules import each other as top-level modules, as when run from server/ml_system
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def bulk_write_accepts_sort(monkeypatch):
+    # pymongo >= 4.11 passes sort= to the bulk builder, which older mongomock releases reject
+    import mongomock
+
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update = builder.add_update
+
+    def add_update_without_sort(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+
+    monkeypatch.setattr(builder, 'add_update', add_update_without_sort)
+
+
+@pytest.fixture(scope='module')
+def trained(tmp_path_factory):
+    """Models trained once per module on the sample data"""
+    import ml_integration_service
+    from sample_data import make_database, make_documents, make_service
+
+    model_path = tmp_path_factory.mktemp('trained') / 'models'
+    careers, recommendations = make_documents()
+    patch = pytest.MonkeyPatch()
+    patch.setattr(ml_integration_service, 'MODEL_PATH', str(model_path))
+    patch.setenv('ML_TRAINING_JOBS', '1')
+    patch.setenv('ML_CV_FOLDS', '2')
+    try:
+        service = make_service(make_database(careers, recommendations))
+        assert service.train_models()['success']
+    finally:
+        patch.undo()
+    return model_path, careers, recommendations
+
+
+@pytest.fixture
+def env(trained, tmp_path, monkeypatch, bulk_write_accepts_sort):
+    """A service with its own copy of the trained models and of the sample database"""
+    import ml_integration_service
+    from sample_data import make_database, make_service
+
+    model_path, careers, recommendations = trained
+    shutil.copytree(model_path, tmp_path / 'models')
+    monkeypatch.setattr(ml_integration_service, 'MODEL_PATH', str(tmp_path / 'models'))
+    monkeypatch.setenv('ML_TRAINING_JOBS', '1')
+    monkeypatch.setenv('ML_CV_FOLDS', '2')
+    db = make_database(careers, recommendations)
+    return make_service(db), db, recommendations
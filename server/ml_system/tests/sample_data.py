@@ -0,0 +1,52 @@
+"""Generated careers and recommendation documents shared by the MongoDB-backed tests"""
+import copy
+import random
+from datetime import datetime, timedelta
+
+import mongomock
+from bson import ObjectId
+
+from ml_integration_service import MLIntegrationService
+
+SUBJECTS = ['Mathematics', 'English', 'Kiswahili', 'Physics', 'Chemistry', 'Biology', 'Geography']
+STARTED = datetime(2025, 1, 1)
+N_DOCUMENTS = 300
+
+
+def make_documents():
+    rng = random.Random(0)
+    careers = [
+        {'_id': ObjectId(), 'title': f'Career {n}', 'category': ['Technology', 'Health', 'Education'][n % 3],
+         'keySubjects': rng.sample(SUBJECTS, 2)}
+        for n in range(20)
+    ]
+    users = [ObjectId() for _ in range(60)]
+    recommendations = [
+        {
+            '_id': ObjectId(),
+            'user': users[n % len(users)],
+            'updatedAt': STARTED + timedelta(minutes=n),
+            'kcseResults': {
+                'meanPoints': rng.randint(3, 12),
+                'subjects': [{'subject': subject, 'grade': rng.choice('ABCDE')} for subject in SUBJECTS]
+            },
+            'recommendations': [
+                {'career': career['_id'], 'match': rng.randint(40, 99)} for career in rng.sample(careers, 5)
+            ]
+        }
+        for n in range(N_DOCUMENTS)
+    ]
+    return careers, recommendations
+
+
+def make_database(careers, recommendations):
+    db = mongomock.MongoClient().career_recommender
+    db.careers.insert_many(copy.deepcopy(careers))
+    db.recommendations.insert_many(copy.deepcopy(recommendations))
+    return db
+
+
+def make_service(db):
+    service = MLIntegrationService()
+    service._client, service._db, service._db_attempted = db.client, db, True
+    return service
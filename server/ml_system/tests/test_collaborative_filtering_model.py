@@ -0,0 +1,124 @@
+import random
+
+import pytest
+
+from collaborative_filtering_model import CollaborativeFilteringModel
+
+
+@pytest.fixture(scope='module')
+def model_path(tmp_path_factory):
+    """A model trained on random ratings and saved to disk"""
+    rng = random.Random(0)
+    careers = [{'_id': f'c{n}', 'title': f'Career {n}', 'category': 'x', 'keySubjects': []} for n in range(30)]
+    recommendations = [
+        {'user': f'u{n}', 'recommendations': [
+            {'career': career['_id'], 'match': rng.randint(40, 99)} for career in rng.sample(careers, 6)
+        ]}
+        for n in range(80)
+    ]
+    path = str(tmp_path_factory.mktemp('cf'))
+    model = CollaborativeFilteringModel(model_path=path, auto_load=False)
+    assert model.prepare_data(recommendations, careers)
+    assert model.train_user_based_cf()
+    assert model.train_item_based_cf()
+    assert model.train_matrix_factorization()
+    assert model.build_similar_careers()
+    assert model.save_model()
+    return path
+
+
+@pytest.fixture
+def model(model_path):
+    model = CollaborativeFilteringModel(model_path=model_path, auto_load=False)
+    assert model.load_model()
+    return model
+
+
+ALL_CAREERS = [f'c{n}' for n in range(30)]
+RATED = {'c0': 0.9, 'c1': 0.8, 'c2': 0.7}
+
+
+def test_folded_in_user_is_not_scored_on_rated_careers(model):
+    scores = model.score_careers('new-student', ALL_CAREERS, RATED)
+
+    assert scores
+    assert not set(scores) & set(RATED)
+
+
+def test_batch_matches_single_user_scoring(model):
+    users = ['u0', 'u1', 'new-a', 'new-b', 'new-c']
+    interactions = [{}, {}, RATED, {'c5': 0.6}, {}]
+
+    batch = model.score_careers_batch(users, [ALL_CAREERS] * len(users), interactions)
+
+    single = [model.score_careers(user, ALL_CAREERS, rated) for user, rated in zip(users, interactions)]
+    assert batch == pytest.approx(single)
+    assert not set(batch[2]) & set(RATED)
+    assert 'c5' not in batch[3]
+    assert batch[4] == {}
+
+
+def test_recommendations_for_folded_in_user_skip_rated_careers(model):
+    recommended = [rec['career_id'] for rec in model.get_user_recommendations('new-student', 10, interactions=RATED)]
+
+    assert recommended
+    assert not set(recommended) & set(RATED)
+
+
+def test_known_users_are_scored_without_loading_nmf(model):
+    model.score_careers_batch(['u0', 'u1'], [ALL_CAREERS] * 2, [{}, {}])
+    assert model._nmf_model is None
+
+    model.score_careers_batch(['u0', 'new-student'], [ALL_CAREERS] * 2, [{}, RATED])
+    assert model._nmf_model is not None
+
+
+def test_candidates_standing_in_for_ratings_are_scored_when_asked(model):
+    candidates = ['c0', 'c1', 'c2', 'c3']
+    interactions = {career_id: 0.7 for career_id in candidates}
+
+    assert model.score_careers_batch(['new-student'], [candidates], [interactions]) == [{}]
+
+    single = model.score_careers('new-student', candidates, interactions, exclude_rated=False)
+    batch = model.score_careers_batch(['new-student'], [candidates], [interactions], exclude_rated=False)
+    assert single
+    assert batch == [pytest.approx(single)]
+
+
+def neighbour_model(seed, tmp_path, n_users=1000, n_careers=40):
+    """A user-based model whose coarse ratings give many tied scores
+
+    The last careers are each rated by a single user, so those users have only zero-similarity neighbours.
+    """
+    rng = random.Random(seed)
+    careers = [{'_id': f'c{n}', 'title': f'Career {n}', 'category': 'x', 'keySubjects': []} for n in range(n_careers)]
+    shared = careers[:n_careers - 10]
+    recommendations = [
+        {'user': f'u{n}', 'recommendations': [
+            {'career': career['_id'], 'match': rng.choice([50, 100])} for career in rng.sample(shared, rng.randint(1, 6))
+        ]}
+        for n in range(n_users - 10)
+    ]
+    recommendations += [
+        {'user': f'isolated{n}', 'recommendations': [{'career': career['_id'], 'match': 80}]}
+        for n, career in enumerate(careers[n_careers - 10:])
+    ]
+    model = CollaborativeFilteringModel(model_path=str(tmp_path), auto_load=False)
+    assert model.prepare_data(recommendations, careers)
+    assert model.train_user_based_cf()
+    model.is_trained = True
+    return model
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_vectorized_recommendations_match_the_reference(seed, tmp_path):
+    model = neighbour_model(seed, tmp_path)
+    assert (model.user_neighbour_similarities == 0).all(axis=1).any()
+
+    for user_id in model.user_mapping:
+        vectorized = model.get_user_recommendations(user_id, 10)
+        reference = model.get_user_recommendations(user_id, 10, method='reference')
+
+        assert [rec['career_id'] for rec in vectorized] == [rec['career_id'] for rec in reference]
+        assert [rec['ml_enhanced_score'] for rec in vectorized] == \
+            pytest.approx([rec['ml_enhanced_score'] for rec in reference])
@@ -0,0 +1,33 @@
+from bson import ObjectId
+
+SIMILAR_USERS_REASON = "Similar users with comparable academic profiles also showed interest in this career"
+
+
+def candidates_of(document):
+    return [{'id': str(rec['career']), 'title': 'Career', 'match': rec['match']} for rec in document['recommendations']]
+
+
+def cf_scored(result):
+    return [rec for rec in result['enhanced_recommendations'] if SIMILAR_USERS_REASON in rec['ml_reasons']]
+
+
+def test_new_student_gets_a_cf_score_for_the_ranked_candidates(env):
+    service, _, recommendations = env
+
+    result = service.enhance_recommendations({'_id': str(ObjectId())}, candidates_of(recommendations[0]))
+
+    assert result['success'], result
+    assert result['stages']['collaborative_filtering'] == 'computed'
+    scored = cf_scored(result)
+    assert scored
+    assert any(rec['ml_enhanced_score'] != rec['match'] for rec in scored)
+
+
+def test_known_student_gets_a_cf_score_for_their_own_careers(env):
+    service, _, recommendations = env
+    document = recommendations[0]
+
+    result = service.enhance_recommendations({'_id': str(document['user'])}, candidates_of(document))
+
+    assert result['success'], result
+    assert cf_scored(result)
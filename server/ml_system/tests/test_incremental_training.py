@@ -0,0 +1,61 @@
+from datetime import timedelta
+
+from bson import ObjectId
+
+from sample_data import STARTED
+
+
+def test_incremental_training_without_changes(env):
+    service, _, _ = env
+    result = service.train_models_incremental()
+
+    assert result['success'], result
+    assert result['updated_users'] == 0
+
+
+def test_incremental_training_folds_in_new_documents(env):
+    service, db, _ = env
+    before = service.load_training_state()['high_water_mark']
+    new_user = ObjectId()
+    career = db.careers.find_one()
+    db.recommendations.insert_one({
+        '_id': ObjectId(),
+        'user': new_user,
+        'updatedAt': STARTED + timedelta(days=30),
+        'kcseResults': {'meanPoints': 10, 'subjects': [{'subject': 'Mathematics', 'grade': 'A'}]},
+        'recommendations': [{'career': career['_id'], 'match': 90}]
+    })
+
+    result = service.train_models_incremental()
+
+    assert result['success'], result
+    assert result['updated_users'] == 1
+    after = service.load_training_state()
+    assert after['mode'] == 'incremental'
+    assert after['high_water_mark']['updatedAt'] > before['updatedAt']
+    assert str(new_user) in service.ensure_models_loaded().cf_model.user_mapping
+
+    assert service.train_models_incremental()['updated_users'] == 0
+
+
+def test_incremental_training_retrains_when_careers_change(env):
+    service, db, _ = env
+    db.careers.insert_one({'_id': ObjectId(), 'title': 'New career', 'category': 'Technology', 'keySubjects': []})
+
+    result = service.train_models_incremental()
+
+    assert result['success'], result
+    assert 'updated_users' not in result
+    assert service.load_training_state()['mode'] == 'full'
+
+
+def test_incremental_training_retrains_when_a_career_is_replaced(env):
+    service, db, _ = env
+    db.careers.delete_one({'_id': db.careers.find_one()['_id']})
+    db.careers.insert_one({'_id': ObjectId(), 'title': 'New career', 'category': 'Technology', 'keySubjects': []})
+
+    result = service.train_models_incremental()
+
+    assert result['success'], result
+    assert 'updated_users' not in result
+    assert service.load_training_state()['mode'] == 'full'
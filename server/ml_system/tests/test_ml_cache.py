@@ -0,0 +1,82 @@
+import os
+import time
+
+from ml_cache import DiskCache, LRUCache
+
+
+def key(n):
+    return f"{n:064x}"
+
+
+def age(cache, namespace, n, seconds):
+    """Backdate one entry's modification time"""
+    path = cache._path(namespace, key(n))
+    mtime = time.time() - seconds
+    os.utime(path, (mtime, mtime))
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    cache.get('a')
+    cache.set('c', 3)
+
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.stats()['evictions'] == 1
+
+
+def test_disk_cache_round_trip_and_namespaces(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set('v1', key(1), {'score': 1})
+
+    assert cache.get('v1', key(1)) == {'score': 1}
+    assert cache.get('v2', key(1)) is None
+    assert cache.stats()['hits'] == 1
+
+
+def test_clear_keeps_only_the_current_version(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    cache.set('old', key(1), 1)
+    cache.set('new', key(2), 2)
+
+    cache.clear(keep='new')
+
+    assert sorted(os.listdir(tmp_path)) == ['new']
+    assert cache.get('new', key(2)) == 2
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=60)
+    cache.set('v1', key(1), 1)
+    age(cache, 'v1', 1, 120)
+
+    assert cache.get('v1', key(1)) is None
+    assert cache.stats()['expirations'] == 1
+
+
+def test_prune_removes_expired_then_oldest_entries(tmp_path):
+    cache = DiskCache(str(tmp_path), ttl=3600, max_entries=3)
+    cache.prune_every = None
+    for n in range(6):
+        cache.set('old' if n < 2 else 'new', key(n), n)
+        age(cache, 'old' if n < 2 else 'new', n, 100 - n)
+    age(cache, 'new', 5, 7200)
+
+    assert cache.prune() == 3
+
+    assert cache.get('new', key(5)) is None
+    assert [cache.get('old', key(n)) for n in (0, 1)] == [None, None]
+    assert [cache.get('new', key(n)) for n in (2, 3, 4)] == [2, 3, 4]
+    stats = cache.stats()
+    assert (stats['expirations'], stats['evictions']) == (1, 2)
+
+
+def test_writes_keep_the_directory_bounded(tmp_path):
+    cache = DiskCache(str(tmp_path), max_entries=20)
+    for n in range(100):
+        cache.set('v1', key(n), n)
+
+    assert len(cache._entries()) <= 20 + cache.prune_every
+    assert cache.stats()['evictions'] >= 100 - 20 - cache.prune_every
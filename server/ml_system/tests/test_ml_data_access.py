@@ -0,0 +1,97 @@
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+import mongomock
+
+import ml_data_access
+from ml_data_access import DataAccess, get_client
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient().career_recommender
+    started = datetime(2025, 1, 1)
+    db.recommendations.insert_many([
+        {'user': f'u{n}', 'updatedAt': started + timedelta(minutes=n), 'recommendations': [{'match': 80}]}
+        for n in range(10)
+    ])
+    return db
+
+
+@pytest.fixture
+def shared_client(monkeypatch):
+    """Fresh module state, with MongoClient replaced by mongomock and its options recorded"""
+    monkeypatch.setattr(ml_data_access, '_client', None)
+    monkeypatch.setattr(ml_data_access, '_client_uri', None)
+    monkeypatch.setattr(ml_data_access, '_client_pid', None)
+    created = []
+
+    class RecordingClient(mongomock.MongoClient):
+        def __init__(self, uri, **options):
+            super().__init__(uri)
+            self.options = options
+            created.append(self)
+
+    monkeypatch.setattr('pymongo.MongoClient', RecordingClient)
+    return created
+
+
+def test_changed_documents_are_streamed_with_only_the_projected_fields(db):
+    access = DataAccess(lambda: db)
+    cursor = access.fetch_changed_documents({'updatedAt': {'$gte': datetime(2025, 1, 1, 0, 5)}}, batch_size=2)
+
+    assert not isinstance(cursor, list)
+    documents = list(cursor)
+    assert [doc['user'] for doc in documents] == ['u5', 'u6', 'u7', 'u8', 'u9']
+    assert all(set(doc) == {'_id', 'user', 'updatedAt'} for doc in documents)
+
+
+def test_reads_without_a_database():
+    access = DataAccess(lambda: None)
+    assert list(access.fetch_changed_documents({})) == []
+    assert access.ping_database() is False
+
+
+def test_ping_database(db):
+    assert DataAccess(lambda: db).ping_database() is True
+
+
+def test_submit_connects_on_a_pool_thread(db):
+    connected_on = []
+
+    def get_db():
+        connected_on.append(threading.current_thread().name)
+        return db
+
+    access = DataAccess(get_db, max_workers=1)
+    try:
+        assert access.submit(access.ping_database).result(timeout=5) is True
+    finally:
+        access.shutdown()
+    assert connected_on[0].startswith('MLDataAccess')
+
+
+def test_one_client_per_process_and_uri(shared_client, monkeypatch):
+    uri = 'mongodb://localhost:27017/career_recommender'
+    assert get_client(uri) is get_client(uri)
+    assert len(shared_client) == 1
+
+    # A client inherited across fork() is replaced
+    monkeypatch.setattr(ml_data_access.os, 'getpid', lambda: -1)
+    assert get_client(uri) is not shared_client[0]
+    assert len(shared_client) == 2
+
+
+def test_uri_options_override_the_environment_defaults(shared_client, monkeypatch):
+    monkeypatch.setenv('ML_MONGO_MAX_POOL_SIZE', '25')
+    get_client('mongodb://localhost:27017/career_recommender?maxPoolSize=3&serverSelectionTimeoutMS=100')
+
+    options = shared_client[0].options
+    assert options['minPoolSize'] == 0
+    assert 'maxPoolSize' not in options
+    assert 'serverSelectionTimeoutMS' not in options
+
+    ml_data_access._client = None
+    get_client('mongodb://localhost:27017/career_recommender')
+    assert shared_client[1].options['maxPoolSize'] == 25
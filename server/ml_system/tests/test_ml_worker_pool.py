@@ -0,0 +1,88 @@
+import os
+import time
+import signal
+import threading
+
+import pytest
+
+from ml_worker_pool import MLWorkerPool, PoolOverloaded
+
+pytestmark = pytest.mark.skipif(not hasattr(os, 'fork'), reason='the worker pool needs fork()')
+
+
+class SleepyService:
+    """Stand-in for MLIntegrationService: 'sleep' blocks, anything else echoes its input"""
+
+    def reset_database_connection(self):
+        pass
+
+    def handle_command(self, command, input_data, args):
+        if command == 'sleep':
+            time.sleep(input_data['seconds'])
+        return {'success': True, 'command': command, 'pid': os.getpid(), 'data': input_data}
+
+
+def wait_for(predicate, timeout=10.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return False
+
+
+@pytest.fixture
+def pool():
+    pool = MLWorkerPool(SleepyService(), n_workers=2, queue_size=4, check_interval=0.05)
+    yield pool
+    pool.shutdown(timeout=5)
+
+
+def test_results_reach_their_callers(pool):
+    futures = [pool.submit('echo', {'n': n}, []) for n in range(4)]
+    assert [future.result(timeout=10)['data']['n'] for future in futures] == list(range(4))
+    assert wait_for(lambda: pool.stats()['queue_depth'] == 0)
+    assert wait_for(lambda: sum(worker['requests'] for worker in pool.stats()['worker_stats']) == 4)
+
+
+def test_queue_depth_drops_back_to_zero_after_rejections(pool):
+    futures, rejected = [], 0
+    for _ in range(20):
+        try:
+            futures.append(pool.submit('sleep', {'seconds': 0.05}, []))
+        except PoolOverloaded:
+            rejected += 1
+
+    assert rejected > 0
+    for future in futures:
+        future.result(timeout=10)
+    assert wait_for(lambda: pool.stats()['queue_depth'] == 0)
+    assert pool.stats()['rejected'] == rejected
+
+
+def test_dead_worker_fails_its_request_and_is_replaced(pool):
+    future = pool.submit('sleep', {'seconds': 30}, [])
+    assert wait_for(lambda: any(worker['busy'] for worker in pool.stats()['worker_stats']))
+    busy = next(worker for worker in pool.stats()['worker_stats'] if worker['busy'])
+
+    # Other requests keep the result queue busy; the restart must not wait for it to go quiet
+    stop = threading.Event()
+
+    def keep_busy():
+        while not stop.is_set():
+            pool.submit('echo', {}, []).result(timeout=10)
+
+    traffic = threading.Thread(target=keep_busy)
+    traffic.start()
+    try:
+        os.kill(busy['pid'], signal.SIGKILL)
+        with pytest.raises(RuntimeError, match='died'):
+            future.result(timeout=5)
+    finally:
+        stop.set()
+        traffic.join()
+
+    replaced = pool.stats()['worker_stats'][busy['worker']]
+    assert replaced['restarts'] == 1
+    assert replaced['pid'] != busy['pid']
+    assert pool.submit('echo', {}, []).result(timeout=10)['success']
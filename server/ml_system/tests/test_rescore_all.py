@@ -0,0 +1,155 @@
+import json
+from datetime import datetime
+
+from ml_scoring import score_documents
+from sample_data import N_DOCUMENTS
+
+BATCH_SIZE = 100
+
+
+def stored(db):
+    return {doc['_id']: doc['recommendations'] for doc in db.recommendations.find()}
+
+
+def failing_after(collection, n_calls, before=None):
+    """Make bulk_write raise on call n_calls, optionally running before() ahead of the first call"""
+    bulk_write = collection.bulk_write
+    calls = []
+
+    def flaky(operations, ordered=True):
+        calls.append(len(operations))
+        if before is not None and len(calls) == 1:
+            before()
+        if len(calls) == n_calls:
+            raise RuntimeError('connection reset')
+        return bulk_write(operations, ordered=ordered)
+
+    collection.bulk_write = flaky
+    return calls
+
+
+def test_rescore_blends_into_match_and_keeps_the_rule_score(env):
+    service, db, recommendations = env
+    originals = {doc['_id']: [rec['match'] for rec in doc['recommendations']] for doc in recommendations}
+
+    result = service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)
+
+    assert result['success'], result
+    assert result['processed'] == N_DOCUMENTS
+    assert result['updated'] == N_DOCUMENTS
+    assert result['conflicts'] == 0
+    for doc_id, recs in stored(db).items():
+        assert [rec['ruleMatch'] for rec in recs] == originals[doc_id]
+        assert all(rec['match'] == rec['mlScore'] for rec in recs)
+        assert all(0 <= rec['match'] <= 100 for rec in recs)
+
+
+def test_rescore_rerun_is_idempotent(env):
+    service, db, _ = env
+    assert service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)['success']
+    first = stored(db)
+
+    result = service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)
+
+    assert result['success'], result
+    assert result['updated'] == 0
+    assert stored(db) == first
+
+
+def test_rescore_writes_one_bulk_per_chunk(env):
+    service, db, _ = env
+    calls = failing_after(db.recommendations, n_calls=None)
+
+    assert service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)['success']
+    assert calls == [BATCH_SIZE] * (N_DOCUMENTS // BATCH_SIZE)
+
+
+def test_interrupted_rescore_resumes_after_the_checkpoint(env):
+    service, db, recommendations = env
+    failing_after(db.recommendations, n_calls=2)
+
+    result = service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)
+    assert not result['success']
+    with open(service.rescore_checkpoint_file()) as checkpoint_file:
+        checkpoint = json.load(checkpoint_file)
+    assert checkpoint['processed'] == BATCH_SIZE
+    assert checkpoint['last_id'] == str(recommendations[BATCH_SIZE - 1]['_id'])
+
+    calls = failing_after(db.recommendations, n_calls=None)
+    result = service.rescore_all(resume=True, n_jobs=1, batch_size=BATCH_SIZE)
+
+    assert result['success'], result
+    assert result['resumed']
+    assert result['processed'] == N_DOCUMENTS
+    assert calls == [BATCH_SIZE] * (N_DOCUMENTS // BATCH_SIZE - 1)
+    assert all('mlScore' in rec for recs in stored(db).values() for rec in recs)
+
+
+def test_resume_starts_over_when_the_models_changed(env):
+    service, db, recommendations = env
+    service.save_rescore_checkpoint({'last_id': str(recommendations[-1]['_id']), 'model_version': 'old', 'processed': 5})
+
+    result = service.rescore_all(resume=True, n_jobs=1, batch_size=BATCH_SIZE)
+
+    assert result['success'], result
+    assert not result['resumed']
+    assert result['processed'] == N_DOCUMENTS
+
+
+def test_document_changed_during_rescore_is_skipped(env):
+    service, db, recommendations = env
+    changed = recommendations[-1]['_id']
+    failing_after(db.recommendations, n_calls=None, before=lambda: db.recommendations.update_one(
+        {'_id': changed}, {'$set': {'updatedAt': datetime(2030, 1, 1)}}
+    ))
+
+    result = service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)
+
+    assert result['success'], result
+    assert result['conflicts'] == 1
+    assert result['updated'] == N_DOCUMENTS - 1
+    assert all('mlScore' not in rec for rec in stored(db)[changed])
+
+
+def test_rescore_includes_the_cf_score(env, monkeypatch):
+    service, db, recommendations = env
+    assert service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)['success']
+
+    # The same documents scored with the academic prediction alone
+    models = service.ensure_models_loaded()
+    monkeypatch.setattr(models.cf_model, 'score_careers_batch',
+                        lambda user_ids, *args, **kwargs: [{} for _ in user_ids])
+    academic_only = {doc_id: [score for _, score, _ in scores]
+                     for doc_id, _, scores in score_documents(models, recommendations)}
+
+    written = stored(db)
+    with_cf = sum(
+        rec['mlScore'] != score
+        for doc_id, scores in academic_only.items()
+        for rec, score in zip(written[doc_id], scores)
+    )
+    assert with_cf > N_DOCUMENTS
+
+
+def training_inputs(service, chunks):
+    """The CF interaction matrix and academic training rows built from recommendation chunks"""
+    cf_model = service.create_cf_model()
+    cf_model.begin_data(service.load_careers_from_db())
+    ap_model = service.create_ap_model()
+    ap_model.begin_data()
+    for chunk in chunks:
+        assert cf_model.add_recommendations(chunk)
+        assert ap_model.add_recommendations(chunk)
+    assert cf_model.finish_data()
+    return cf_model.user_item_matrix, ap_model.finish_data(deduplicate=False)
+
+
+def test_training_after_rescore_learns_from_the_rule_score(env):
+    service, _, recommendations = env
+    assert service.rescore_all(n_jobs=1, batch_size=BATCH_SIZE)['success']
+
+    matrix, training_data = training_inputs(service, service.stream_recommendations())
+    expected_matrix, expected_data = training_inputs(service, [recommendations])
+
+    assert (matrix != expected_matrix).nnz == 0
+    assert training_data['match_score'].tolist() == expected_data['match_score'].tolist()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+from collaborative_filtering_model import CollaborativeFilteringModel
+from similarity_search import (
+    ExactSearchIndex, RandomProjectionLSHIndex, benchmark_search_backends, synthetic_ratings
+)
+
+
+@pytest.fixture(scope='module')
+def ratings():
+    return synthetic_ratings(2000, n_careers=200)
+
+
+@pytest.fixture(scope='module')
+def embeddings():
+    return np.random.default_rng(0).gamma(0.5, 1.0, size=(2000, 10)).astype(np.float32)
+
+
+@pytest.mark.parametrize('vectors', ['ratings', 'embeddings'])
+def test_exact_query_rows_match_single_queries(vectors, request):
+    vectors = request.getfixturevalue(vectors)
+    index = ExactSearchIndex().build(vectors)
+    rows = np.array([0, 7, 1999])
+
+    neighbours, similarities = index.query_rows(rows, 20)
+
+    for row, found, found_similarities in zip(rows, neighbours, similarities):
+        expected, expected_similarities = index.query(vectors[row], 20, exclude=row)
+        assert row not in found
+        assert found_similarities == pytest.approx(expected_similarities, abs=1e-6)
+
+
+@pytest.mark.parametrize('vectors, options', [
+    ('ratings', {'n_bits': 5, 'n_tables': 16}),
+    ('embeddings', {})
+])
+def test_lsh_neighbours_are_close_to_exact(vectors, options, request):
+    vectors = request.getfixturevalue(vectors)
+    rows = np.arange(300)
+    _, exact = ExactSearchIndex().build(vectors).query_rows(rows, 20)
+
+    neighbours, similarities = RandomProjectionLSHIndex(**options).build(vectors).query_rows(rows, 20)
+
+    assert not (neighbours == rows[:, None]).any()
+    # Ties at the cut-off may be broken either way, so compare against the exact 20th similarity
+    assert np.mean(similarities >= exact[:, -1:] - 1e-6) > 0.95
+    assert (np.diff(similarities, axis=1) <= 1e-6).all()
+
+
+def test_benchmark_reports_every_backend(embeddings):
+    results = benchmark_search_backends(embeddings, k=10, n_queries=20, all_rows=True)
+
+    assert [result['backend'] for result in results] == ['exact', 'lsh']
+    assert results[0]['recall_at_k'] == 1.0
+    assert all(result['all_rows_seconds'] > 0 for result in results)
+
+
+def test_model_neighbours_from_the_lsh_backend(ratings, tmp_path):
+    careers = [{'_id': f'c{n}', 'title': f'Career {n}', 'category': 'x', 'keySubjects': []} for n in range(200)]
+    rows, cols = ratings.nonzero()
+    recommendations = [{'user': f'u{n}', 'recommendations': []} for n in range(ratings.shape[0])]
+    for row, col, rating in zip(rows, cols, ratings.data):
+        recommendations[row]['recommendations'].append({'career': f'c{col}', 'match': float(rating) * 100})
+
+    models = {}
+    for backend in ('exact', 'lsh'):
+        model = CollaborativeFilteringModel(model_path=str(tmp_path), auto_load=False, n_neighbours=10,
+                                            search_backend=backend)
+        assert model.prepare_data(recommendations, careers)
+        assert model.train_user_based_cf()
+        model.is_trained = True
+        models[backend] = model
+
+    exact, lsh = models['exact'], models['lsh']
+    assert lsh.user_neighbours.shape == exact.user_neighbours.shape
+    assert np.mean(lsh.user_neighbour_similarities >= exact.user_neighbour_similarities[:, -1:] - 1e-6) > 0.9
+    assert lsh.get_user_recommendations('u0', 10)
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+
+import ml_integration_service
+from sample_data import N_DOCUMENTS, make_database, make_documents, make_service
+
+BATCH_SIZE = 64
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    """A service over the sample documents, stored with the fields training does not read"""
+    monkeypatch.setattr(ml_integration_service, 'MODEL_PATH', str(tmp_path / 'models'))
+    careers, recommendations = make_documents()
+    for doc in recommendations:
+        doc['reasons'] = ['Strong in Mathematics'] * 5
+        for rec in doc['recommendations']:
+            rec['improvementSuggestions'] = [{'subject': 'Physics', 'targetGrade': 'A'}]
+            rec['reasons'] = ['Matches your subjects']
+    return make_service(make_database(careers, recommendations))
+
+
+def test_documents_are_streamed_in_projected_chunks(service):
+    chunks = list(service.stream_recommendations(batch_size=BATCH_SIZE))
+
+    assert [len(chunk) for chunk in chunks] == [BATCH_SIZE] * (N_DOCUMENTS // BATCH_SIZE) + [N_DOCUMENTS % BATCH_SIZE]
+    for doc in (doc for chunk in chunks for doc in chunk):
+        assert 'reasons' not in doc
+        assert set(doc['recommendations'][0]) == {'career', 'match'}
+        assert set(doc['kcseResults']['subjects'][0]) == {'subject', 'grade'}
+
+
+def test_streamed_training_data_matches_the_full_documents(service):
+    careers = list(service.db.careers.find())
+    documents = list(service.db.recommendations.find())
+
+    cf_list = service.create_cf_model()
+    assert cf_list.prepare_data(documents, careers)
+    ap_frame = service.create_ap_model().prepare_data(documents)
+
+    cf_stream = service.create_cf_model()
+    ap_stream = service.create_ap_model()
+    cf_stream.begin_data(service.load_careers_from_db())
+    ap_stream.begin_data()
+    for chunk in service.stream_recommendations(batch_size=BATCH_SIZE):
+        assert cf_stream.add_recommendations(chunk)
+        assert ap_stream.add_recommendations(chunk)
+    assert cf_stream.finish_data()
+
+    assert cf_stream.user_mapping == cf_list.user_mapping
+    assert cf_stream.career_mapping == cf_list.career_mapping
+    assert cf_stream.career_content == cf_list.career_content
+    assert (cf_stream.user_item_matrix != cf_list.user_item_matrix).nnz == 0
+    pd.testing.assert_frame_equal(ap_stream.finish_data(), ap_frame)
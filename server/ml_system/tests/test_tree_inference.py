@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+
+from academic_performance_predictor import AcademicPerformancePredictor
+from tree_inference import FlatTreeEnsemble, check_parity
+
+
+@pytest.fixture(scope='module')
+def data():
+    # Shaped like the academic features: mean points and ten subject grades, standardised
+    rng = np.random.default_rng(42)
+    X = rng.integers(1, 13, size=(3000, 11)).astype(np.float64)
+    y = X[:, 0] * 6 + X[:, 1] * 2 + rng.normal(0, 5, len(X))
+    X = (X - X.mean(axis=0)) / X.std(axis=0)
+    return X, y
+
+
+@pytest.fixture(scope='module', params=['random_forest', 'gradient_boosting'])
+def model(request, data):
+    X, y = data
+    if request.param == 'random_forest':
+        model = RandomForestRegressor(n_estimators=20, max_depth=12, random_state=0)
+    else:
+        model = GradientBoostingRegressor(n_estimators=30, random_state=0)
+    return model.fit(X[:1000], y[:1000])
+
+
+def test_float64_matches_sklearn(model, data):
+    X, _ = data
+    assert check_parity(model, X, dtype=np.float64) < 1e-9
+
+
+def test_float32_matches_sklearn_within_rounding(model, data):
+    X, _ = data
+    assert check_parity(model, X, dtype=np.float32) < 1e-3
+
+
+def test_single_rows_match_the_batch(model, data):
+    X, _ = data
+    compiled = FlatTreeEnsemble.from_sklearn(model)
+    batch = compiled.predict(X[:50])
+    assert np.array_equal(batch, np.concatenate([compiled.predict(row[np.newaxis]) for row in X[:50]]))
+
+
+def test_arrays_round_trip(model, data):
+    X, _ = data
+    compiled = FlatTreeEnsemble.from_sklearn(model)
+    restored = FlatTreeEnsemble.from_arrays(*compiled.to_arrays())
+    assert np.array_equal(compiled.predict(X), restored.predict(X))
+
+
+def test_wrong_feature_count_is_rejected(model):
+    with pytest.raises(ValueError):
+        FlatTreeEnsemble.from_sklearn(model).predict(np.zeros((2, 3)))
+
+
+def test_large_batches_fall_back_to_sklearn(tmp_path, data):
+    X, y = data
+    predictor = AcademicPerformancePredictor(model_path=str(tmp_path), auto_load=False, compiled_max_rows=100)
+    predictor.models = {'random_forest': RandomForestRegressor(n_estimators=10, random_state=0).fit(X[:500], y[:500])}
+    predictor.export_compiled_models()
+
+    compiled = predictor.compiled_models['random_forest']
+    calls = []
+    predict = compiled.predict
+    compiled.predict = lambda rows: calls.append(len(rows)) or predict(rows)
+
+    small = predictor._predict_rows(X[:100])
+    large = predictor._predict_rows(X[:101])
+    assert calls == [100]
+    assert np.allclose(small, large[:100])
@@ -33,11 +33,22 @@ def main():
         service = MLIntegrationService()
         
         # Train models
-        result = service.train_models()
+        if '--incremental' in sys.argv[1:]:
+            result = service.train_models_incremental()
+        else:
+            result = service.train_models()
         
         if result['success']:
             logger.info("✅ Training completed successfully!")
             logger.info(f"Message: {result['message']}")
+            
+            # Refresh the stored scores with the new models
+            if '--rescore' in sys.argv[1:]:
+                rescore_result = service.rescore_all()
+                if rescore_result['success']:
+                    logger.info(f"✅ Re-scored {rescore_result['processed']} recommendation records")
+                else:
+                    logger.error(f"Re-scoring failed: {rescore_result.get('error', 'Unknown error')}")
         else:
             logger.error("❌ Training failed!")
             logger.error(f"Error: {result.get('error', 'Unknown error')}")
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Flat-array inference for fitted sklearn tree ensembles, with no sklearn on the serving path
+"""
+import json
+import time
+import numpy as np
+
+# Marker stored in the feature array for leaf nodes (sklearn uses -2)
+LEAF = -2
+
+
+class FlatTreeEnsemble:
+    """A random forest or gradient boosting regressor compiled into flat node arrays
+
+    Every tree's nodes are concatenated into shared feature/threshold/left/right/value
+    arrays, so a batch of rows descends all trees at once, one level per step.
+    """
+
+    ARRAYS = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+
+    def __init__(self, feature, threshold, left, right, value, roots, aggregate='mean',
+                 base_value=0.0, scale=1.0, max_depth=0, n_features=0):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.aggregate = aggregate
+        self.base_value = base_value
+        self.scale = scale
+        self.max_depth = max_depth
+        self.n_features = n_features
+
+        # Fancy indexing is markedly faster with native-width indices
+        self._feature = np.asarray(feature, dtype=np.intp)
+        self._children = np.stack([left, right], axis=1).ravel().astype(np.intp)
+        self._roots = np.asarray(roots, dtype=np.intp)
+
+    @classmethod
+    def from_sklearn(cls, model, dtype=np.float64):
+        """Compile a fitted RandomForestRegressor or GradientBoostingRegressor"""
+        dtype = np.dtype(dtype)
+
+        if hasattr(model, 'estimators_') and hasattr(model, 'learning_rate'):
+            # Gradient boosting: init prediction + learning_rate * sum of stage trees
+            trees = [stage[0].tree_ for stage in model.estimators_]
+            aggregate, scale = 'sum', float(model.learning_rate)
+            if model.init_ == 'zero':
+                base_value = 0.0
+            elif hasattr(model.init_, 'constant_'):
+                base_value = float(np.ravel(model.init_.constant_)[0])
+            else:
+                raise ValueError('Only constant or zero initial estimators can be compiled')
+        elif hasattr(model, 'estimators_'):
+            trees = [estimator.tree_ for estimator in model.estimators_]
+            aggregate, scale, base_value = 'mean', 1.0, 0.0
+        else:
+            raise ValueError(f'{type(model).__name__} is not a supported tree ensemble')
+
+        if any(tree.n_outputs != 1 for tree in trees):
+            raise ValueError('Only single-output regressors can be compiled')
+
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees])
+        n_nodes = int(offsets[-1])
+        feature = np.empty(n_nodes, dtype=np.int32)
+        threshold = np.empty(n_nodes, dtype=dtype)
+        left = np.empty(n_nodes, dtype=np.int32)
+        right = np.empty(n_nodes, dtype=np.int32)
+        value = np.empty(n_nodes, dtype=dtype)
+
+        for tree, offset in zip(trees, offsets[:-1]):
+            nodes = slice(offset, offset + tree.node_count)
+            own = np.arange(offset, offset + tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left == -1
+
+            feature[nodes] = np.where(is_leaf, LEAF, tree.feature)
+            threshold[nodes] = cls._round_thresholds(tree.threshold, dtype)
+            left[nodes] = np.where(is_leaf, own, tree.children_left + offset)
+            right[nodes] = np.where(is_leaf, own, tree.children_right + offset)
+            value[nodes] = tree.value[:, 0, 0]
+
+        return cls(
+            feature=feature,
+            threshold=threshold,
+            left=left,
+            right=right,
+            value=value,
+            roots=offsets[:-1].astype(np.int32),
+            aggregate=aggregate,
+            base_value=base_value,
+            scale=scale,
+            max_depth=max(tree.max_depth for tree in trees),
+            n_features=int(model.n_features_in_)
+        )
+
+    @staticmethod
+    def _round_thresholds(thresholds, dtype):
+        """Cast thresholds without changing any split decision for float32 inputs
+
+        sklearn compares float32 features against float64 thresholds. Rounding a
+        threshold down to the largest float32 not above it keeps x <= t identical.
+        """
+        if dtype == np.float64:
+            return thresholds
+        rounded = thresholds.astype(dtype)
+        too_high = rounded.astype(np.float64) > thresholds
+        rounded[too_high] = np.nextafter(rounded[too_high], dtype.type(-np.inf))
+        return rounded
+
+    @property
+    def n_trees(self):
+        return len(self.roots)
+
+    def predict(self, X, block_size=4096):
+        """Predict a batch of rows"""
+        # Trees were fitted on float32 features, exactly as sklearn evaluates them
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError(f'Expected {self.n_features} features, got shape {X.shape}')
+
+        predictions = np.empty(len(X), dtype=np.float64)
+        for start in range(0, len(X), block_size):
+            block = X[start:start + block_size]
+            leaf_values = self.value[self._leaves(block)].astype(np.float64)
+
+            if self.aggregate == 'mean':
+                predictions[start:start + block_size] = leaf_values.mean(axis=1)
+            else:
+                predictions[start:start + block_size] = self.base_value + self.scale * leaf_values.sum(axis=1)
+
+        return predictions
+
+    def _leaves(self, X):
+        """Walk every row down every tree; returns the (rows, trees) leaf indices
+
+        Leaves point back at themselves, so pairs that reached one can keep stepping
+        harmlessly; the working set is only compacted once enough of them have.
+        """
+        n_rows, n_trees = len(X), self.n_trees
+        values = np.ascontiguousarray(X).ravel()
+
+        leaves = np.tile(self._roots, n_rows)
+        active = None
+        row_offsets = np.repeat(np.arange(n_rows) * X.shape[1], n_trees)
+        nodes = leaves.copy()
+
+        for _ in range(self.max_depth):
+            feature = self._feature[nodes]
+            internal = feature != LEAF
+            n_internal = np.count_nonzero(internal)
+            if n_internal == 0:
+                break
+
+            if n_internal < 0.75 * len(nodes):
+                if active is None:
+                    leaves[:] = nodes
+                    active = np.flatnonzero(internal)
+                else:
+                    leaves[active] = nodes
+                    active = active[internal]
+                nodes, feature, row_offsets = nodes[internal], feature[internal], row_offsets[internal]
+
+            # Leaves read a meaningless feature value but step back onto themselves
+            go_right = values[row_offsets + feature] > self.threshold[nodes]
+            nodes = self._children[2 * nodes + go_right]
+
+        if active is None:
+            leaves[:] = nodes
+        else:
+            leaves[active] = nodes
+        return leaves.reshape(n_rows, n_trees)
+
+    def to_arrays(self):
+        """Node arrays and scalar parameters, for storing in a model artifact"""
+        arrays = {name: getattr(self, name) for name in self.ARRAYS}
+        params = {
+            'aggregate': self.aggregate,
+            'base_value': self.base_value,
+            'scale': self.scale,
+            'max_depth': int(self.max_depth),
+            'n_features': int(self.n_features)
+        }
+        return arrays, params
+
+    @classmethod
+    def from_arrays(cls, arrays, params):
+        return cls(**{name: arrays[name] for name in cls.ARRAYS}, **params)
+
+
+def check_parity(model, X, dtype=np.float64):
+    """Maximum absolute difference between model.predict and the compiled evaluator"""
+    compiled = FlatTreeEnsemble.from_sklearn(model, dtype=dtype)
+    return float(np.max(np.abs(model.predict(X) - compiled.predict(X))))
+
+
+def benchmark_inference(model, X, batch_sizes=(1, 20, 1000, 10000), repeats=20, dtype=np.float64):
+    """Mean latency of model.predict and the compiled evaluator for several batch sizes"""
+    compiled = FlatTreeEnsemble.from_sklearn(model, dtype=dtype)
+    results = []
+
+    for batch_size in batch_sizes:
+        batch = X[:batch_size]
+        timings = {}
+        for name, predict in (('sklearn', model.predict), ('compiled', compiled.predict)):
+            predict(batch)
+            started = time.perf_counter()
+            for _ in range(repeats):
+                predict(batch)
+            timings[name] = (time.perf_counter() - started) / repeats * 1000
+
+        results.append({
+            'model': type(model).__name__,
+            'dtype': np.dtype(dtype).name,
+            'batch_size': len(batch),
+            'sklearn_ms': round(timings['sklearn'], 4),
+            'compiled_ms': round(timings['compiled'], 4),
+            'speedup': round(timings['sklearn'] / max(timings['compiled'], 1e-9), 2)
+        })
+
+    return results
+
+
+if __name__ == "__main__":
+    # Parity and latency on synthetic data shaped like the academic features
+    from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
+    from sklearn.preprocessing import StandardScaler
+
+    rng = np.random.default_rng(42)
+    X = rng.integers(1, 13, size=(20000, 11)).astype(np.float64)
+    y = X[:, 0] * 6 + X[:, 1] * 2 + rng.normal(0, 5, len(X))
+    X = StandardScaler().fit_transform(X)
+
+    for model in (RandomForestRegressor(n_estimators=100, random_state=42),
+                  GradientBoostingRegressor(n_estimators=100, random_state=42)):
+        model.fit(X[:5000], y[:5000])
+        for dtype in (np.float64, np.float32):
+            print(json.dumps({
+                'model': type(model).__name__,
+                'dtype': np.dtype(dtype).name,
+                'max_abs_difference': check_parity(model, X, dtype=dtype)
+            }))
+        for result in benchmark_inference(model, X):
+            print(json.dumps(result))
@@ -41,6 +41,12 @@ const RecommendationSchema = new mongoose.Schema(
           type: Boolean,
           default: false,
         },
+        // Rule-based score before ML blending; offline re-scoring blends it into match and mlScore
+        ruleMatch: {
+          type: Number,
+          min: 0,
+          max: 100,
+        },
         mlScore: {
           type: Number,
           min: 0,
@@ -29,6 +29,7 @@ import requestLogger from './middleware/requestLogger.js';
 
 // Import new ML routes
 import mlRecommendationRoutes from './routes/mlRecommendationRoutes.js';
+import { stopMLDaemon } from './utils/mlHelper.js';
 
 // Load environment variables
 dotenv.config();
@@ -167,11 +168,27 @@ const connectDB = async () => {
 // Start server
 const PORT = process.env.PORT || 5000;
 connectDB().then(() => {
-  app.listen(PORT, () => {
+  const server = app.listen(PORT, () => {
     console.log(
       `Server running in ${process.env.NODE_ENV} mode on port ${PORT}`
     );
   });
+
+  // Stop accepting requests, let the ML daemon finish what it has, then exit
+  const shutdown = (signal) => {
+    console.log(`${signal} received, shutting down`);
+    stopMLDaemon();
+    server.close(() => {
+      mongoose.connection.close(false).finally(() => process.exit(0));
+    });
+    setTimeout(() => process.exit(0), 10000).unref();
+  };
+
+  process.once('SIGTERM', () => shutdown('SIGTERM'));
+  process.once('SIGINT', () => shutdown('SIGINT'));
 });
 
+// Any other exit (process.exit, fatal error) must not leave the daemon behind
+process.on('exit', () => stopMLDaemon({ force: true }));
+
 export default app;
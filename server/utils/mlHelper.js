@@ -6,41 +6,87 @@ import fs from 'fs';
 const __filename = fileURLToPath(import.meta.url);
 const __dirname = path.dirname(__filename);
 
+const mlSystemDir = path.join(__dirname, '../ml_system');
+const pythonScript = path.join(mlSystemDir, 'ml_integration_service.py');
+
+// Commands that are answered by the long-lived ML daemon. Training runs in
+// its own process so it never blocks request handling.
+const DAEMON_COMMANDS = new Set([
+  'enhance_recommendations',
+  'similar_careers',
+  'predict_trends',
+  'health_check',
+]);
+
+const isDaemonEnabled = () => process.env.ML_DAEMON !== 'false';
+
+// Commands that read or rewrite every stored recommendation and can run for minutes
+const LONG_RUNNING_COMMANDS = new Set(['train_models', 'rescore_all']);
+
+// How long a caller waits for an ML answer before falling back; 0 waits
+// indefinitely. Long-running commands only time out when
+// ML_LONG_RUNNING_TIMEOUT_MS is set.
+const getTimeoutMs = (command) =>
+  LONG_RUNNING_COMMANDS.has(command)
+    ? Number(process.env.ML_LONG_RUNNING_TIMEOUT_MS) || 0
+    : Number(process.env.ML_TIMEOUT_MS) || 5000;
+
+const timeoutError = (source, timeoutMs) =>
+  Object.assign(new Error(`${source} timed out after ${timeoutMs}ms`), {
+    timedOut: true,
+  });
+
+const startTimer = (timeoutMs, onTimeout) =>
+  timeoutMs > 0 ? setTimeout(onTimeout, timeoutMs) : null;
+
 /**
- * Call Python ML service with command and data
+ * Latency budget for enhance_recommendations; stages that would overrun it are skipped
  */
-export const callMLService = (command, data = null, args = []) => {
-  return new Promise((resolve, reject) => {
-    const pythonScript = path.join(
-      __dirname,
-      '../ml_system/ml_integration_service.py'
-    );
+export const getMLBudgetMs = () => Number(process.env.ML_BUDGET_MS) || 300;
 
-    // Windows-compatible Python execution
-    const pythonExecutable =
-      process.platform === 'win32'
-        ? path.join(__dirname, '../ml_system/ml_env/Scripts/python.exe')
-        : path.join(__dirname, '../ml_system/ml_env/bin/python');
-
-    // Fallback to system python if virtual env python doesn't exist
-    const pythonCommand = fs.existsSync(pythonExecutable)
-      ? pythonExecutable
-      : 'python';
-
-    const pythonArgs = [pythonScript, command, ...args];
-
-    const pythonProcess = spawn(pythonCommand, pythonArgs, {
-      cwd: path.join(__dirname, '../ml_system'),
-      env: {
-        ...process.env,
-        PYTHONPATH: path.join(__dirname, '../ml_system'),
-        PATH: process.env.PATH,
-      },
-    });
+/**
+ * Resolve the Python executable for the ML system
+ */
+const getPythonCommand = () => {
+  // Windows-compatible Python execution
+  const pythonExecutable =
+    process.platform === 'win32'
+      ? path.join(mlSystemDir, 'ml_env/Scripts/python.exe')
+      : path.join(mlSystemDir, 'ml_env/bin/python');
+
+  // Fallback to system python if virtual env python doesn't exist
+  return fs.existsSync(pythonExecutable) ? pythonExecutable : 'python';
+};
+
+/**
+ * Spawn the ML service script with the given arguments
+ */
+const spawnMLProcess = (args) =>
+  spawn(getPythonCommand(), [pythonScript, ...args], {
+    cwd: mlSystemDir,
+    env: {
+      ...process.env,
+      PYTHONPATH: mlSystemDir,
+      PATH: process.env.PATH,
+    },
+  });
+
+/**
+ * Run a single ML command in a fresh Python process
+ */
+const runMLProcess = (command, data = null, args = []) => {
+  return new Promise((resolve, reject) => {
+    const pythonProcess = spawnMLProcess([command, ...args]);
 
     let output = '';
     let errorOutput = '';
 
+    const timeoutMs = getTimeoutMs(command);
+    const timer = startTimer(timeoutMs, () => {
+      pythonProcess.kill();
+      reject(timeoutError('ML process', timeoutMs));
+    });
+
     pythonProcess.stdout.on('data', (data) => {
       output += data.toString();
     });
@@ -50,6 +96,7 @@ export const callMLService = (command, data = null, args = []) => {
     });
 
     pythonProcess.on('close', (code) => {
+      clearTimeout(timer);
       if (code !== 0) {
         console.error(`Python script failed with code ${code}: ${errorOutput}`);
         reject(new Error(`Python script failed: ${errorOutput}`));
@@ -66,6 +113,7 @@ export const callMLService = (command, data = null, args = []) => {
     });
 
     pythonProcess.on('error', (error) => {
+      clearTimeout(timer);
       console.error(`Failed to start Python process: ${error}`);
       reject(new Error(`Failed to start Python process: ${error.message}`));
     });
@@ -79,7 +127,247 @@ export const callMLService = (command, data = null, args = []) => {
 };
 
 /**
- * Check if ML system is available
+ * Optional msgpack codec for the daemon protocol; JSON lines are used without it
+ */
+let msgpackModule = null;
+
+const loadMsgpack = () => {
+  if (process.env.ML_WIRE_FORMAT === 'json') return Promise.resolve(null);
+  if (!msgpackModule) {
+    msgpackModule = import('@msgpack/msgpack').catch(() => null);
+  }
+  return msgpackModule;
+};
+
+// Apply JSON.stringify's value rules (toJSON, dropped undefined, null for
+// NaN) so both wire formats deliver the same data to Python
+const toPlain = (value) => {
+  if (value === null || value === undefined) return value;
+  if (typeof value === 'object' && typeof value.toJSON === 'function') {
+    return toPlain(value.toJSON());
+  }
+  if (Array.isArray(value)) {
+    return value.map((item) => {
+      const plain = toPlain(item);
+      return plain === undefined ? null : plain;
+    });
+  }
+  if (typeof value === 'object') {
+    const plain = {};
+    for (const [key, item] of Object.entries(value)) {
+      const converted = toPlain(item);
+      if (converted !== undefined) plain[key] = converted;
+    }
+    return plain;
+  }
+  if (typeof value === 'number' && !Number.isFinite(value)) return null;
+  if (typeof value === 'function' || typeof value === 'symbol') return undefined;
+  return value;
+};
+
+const FRAME_HEADER_BYTES = 4;
+
+/**
+ * Incremental decoder for daemon output: JSON lines, or length-prefixed
+ * msgpack frames once reader.codec is set. Messages are decoded as soon as
+ * their last byte arrives, without re-scanning earlier chunks.
+ */
+const createMessageReader = (onMessage) => {
+  const reader = { codec: null };
+  let chunks = [];
+  let buffered = 0;
+  let needed = 0;
+
+  reader.push = (chunk) => {
+    chunks.push(chunk);
+    buffered += chunk.length;
+    if (buffered < needed) return;
+    if (!reader.codec && !chunk.includes(0x0a)) return;
+
+    const buffer = chunks.length === 1 ? chunks[0] : Buffer.concat(chunks, buffered);
+    let offset = 0;
+    needed = 0;
+
+    while (offset < buffer.length) {
+      if (!reader.codec) {
+        const end = buffer.indexOf(0x0a, offset);
+        if (end === -1) break;
+        const line = buffer.toString('utf8', offset, end).trim();
+        offset = end + 1;
+        if (!line) continue;
+        try {
+          onMessage(JSON.parse(line));
+        } catch (error) {
+          console.error(`Failed to parse ML daemon output: ${line}`);
+        }
+      } else {
+        if (buffer.length - offset < FRAME_HEADER_BYTES) {
+          needed = FRAME_HEADER_BYTES;
+          break;
+        }
+        const size = buffer.readUInt32BE(offset);
+        if (buffer.length - offset < FRAME_HEADER_BYTES + size) {
+          needed = FRAME_HEADER_BYTES + size;
+          break;
+        }
+        const start = offset + FRAME_HEADER_BYTES;
+        offset = start + size;
+        onMessage(reader.codec.decode(buffer.subarray(start, offset)));
+      }
+    }
+
+    const rest = buffer.subarray(offset);
+    chunks = rest.length ? [rest] : [];
+    buffered = rest.length;
+  };
+
+  return reader;
+};
+
+/**
+ * Persistent ML daemon on stdio: JSON lines, upgraded to msgpack frames
+ * when both sides support it
+ */
+let daemon = null;
+
+const startDaemon = () => {
+  const daemonProcess = spawnMLProcess(['serve']);
+  const state = { process: daemonProcess, pending: new Map(), nextId: 1, codec: null };
+
+  const reader = createMessageReader((message) => {
+    const request = state.pending.get(message.id);
+    if (!request) return;
+
+    state.pending.delete(message.id);
+    clearTimeout(request.timer);
+    request.resolve(message.result);
+  });
+  daemonProcess.stdout.on('data', (chunk) => reader.push(chunk));
+
+  state.send = (message) => {
+    if (!state.codec) {
+      state.process.stdin.write(JSON.stringify(message) + '\n');
+      return;
+    }
+    const payload = state.codec.encode(toPlain(message));
+    const header = Buffer.alloc(FRAME_HEADER_BYTES);
+    header.writeUInt32BE(payload.byteLength);
+    state.process.stdin.write(
+      Buffer.concat([header, Buffer.from(payload.buffer, payload.byteOffset, payload.byteLength)])
+    );
+  };
+
+  // Requests wait for the handshake, so nothing is sent in the wrong format
+  state.ready = loadMsgpack().then((codec) => {
+    if (!codec) return;
+
+    return new Promise((resolve) => {
+      const id = state.nextId++;
+      const done = (result) => {
+        // The reply is the last JSON line; switch before the next byte is read
+        if (result && result.format === 'msgpack') {
+          state.codec = codec;
+          reader.codec = codec;
+        }
+        resolve();
+      };
+      state.pending.set(id, { resolve: done, reject: () => resolve() });
+      state.send({ id, command: 'hello', data: { formats: ['msgpack', 'json'] } });
+    });
+  });
+
+  // The daemon logs to stderr; surface it for troubleshooting
+  daemonProcess.stderr.on('data', (data) => {
+    if (process.env.ML_DAEMON_DEBUG === 'true') {
+      process.stderr.write(`[ml-daemon] ${data}`);
+    }
+  });
+
+  const failPending = (error) => {
+    if (daemon === state) daemon = null;
+    for (const request of state.pending.values()) {
+      clearTimeout(request.timer);
+      request.reject(error);
+    }
+    state.pending.clear();
+  };
+
+  daemonProcess.stdin.on('error', (error) => {
+    failPending(new Error(`ML daemon stdin error: ${error.message}`));
+  });
+
+  daemonProcess.on('error', (error) => {
+    console.error(`Failed to start ML daemon: ${error}`);
+    failPending(new Error(`Failed to start ML daemon: ${error.message}`));
+  });
+
+  daemonProcess.on('close', (code) => {
+    if (code !== 0) {
+      console.error(`ML daemon exited with code ${code}`);
+    }
+    failPending(new Error(`ML daemon exited with code ${code}`));
+  });
+
+  return state;
+};
+
+const callMLDaemon = (command, data = null, args = []) => {
+  if (!daemon) {
+    daemon = startDaemon();
+  }
+
+  const state = daemon;
+  return new Promise((resolve, reject) => {
+    const id = state.nextId++;
+    // A late answer is dropped: the daemon keeps serving other requests
+    const timeoutMs = getTimeoutMs(command);
+    const timer = startTimer(timeoutMs, () => {
+      state.pending.delete(id);
+      reject(timeoutError('ML daemon', timeoutMs));
+    });
+    state.pending.set(id, { resolve, reject, timer });
+    state.ready.then(() => {
+      if (state.pending.has(id)) state.send({ id, command, data, args });
+    });
+  });
+};
+
+/**
+ * Stop the ML daemon if it is running. Closing stdin lets it answer the
+ * requests it already has before exiting; with force it is killed instead.
+ */
+export const stopMLDaemon = ({ force = false } = {}) => {
+  if (daemon) {
+    if (force) {
+      daemon.process.kill();
+    } else {
+      daemon.process.stdin.end();
+    }
+    daemon = null;
+  }
+};
+
+/**
+ * Call Python ML service with command and data
+ */
+export const callMLService = async (command, data = null, args = []) => {
+  if (isDaemonEnabled() && DAEMON_COMMANDS.has(command)) {
+    try {
+      return await callMLDaemon(command, data, args);
+    } catch (error) {
+      // Retrying a slow call in a fresh process would only double the wait
+      if (error.timedOut) throw error;
+      console.error(
+        `ML daemon call failed, falling back to one-off process: ${error.message}`
+      );
+    }
+  }
+
+  return runMLProcess(command, data, args);
+};
+
+/**
+ * Check if ML system is available (shallow: no database ping, no model loading)
  */
 export const isMLSystemAvailable = async () => {
   try {
@@ -92,11 +380,11 @@ export const isMLSystemAvailable = async () => {
 };
 
 /**
- * Get ML system status
+ * Get ML system status, including the database connection
  */
 export const getMLSystemStatus = async () => {
   try {
-    return await callMLService('health_check');
+    return await callMLService('health_check', null, ['--deep']);
   } catch (error) {
     return {
       healthy: false,